@@ -0,0 +1,7 @@
+"""Micro-benchmarks of the hot paths, in asv's format so asv can run them too.
+
+Every ``Time*`` class in a ``bench_*`` module is a group of benchmarks. Its
+``time_*`` methods are timed after ``setup`` ran, once for every value in the
+class's ``params`` if it has any. ``python -m benchmarks`` runs them and
+compares them against a saved baseline.
+"""
@@ -0,0 +1,105 @@
+import argparse
+import importlib
+import json
+import platform
+import statistics
+import sys
+import timeit
+from collections.abc import Iterator
+from pathlib import Path
+
+from loguru import logger
+
+# Saved runs, one JSON file per name. Timings only compare on the machine that made them, so they aren't committed
+RESULTS = Path(__file__).with_name("results")
+
+
+def discover(pattern: str | None) -> Iterator[tuple[str, type, str, object]]:
+    """Every benchmark as (name, class, method name, param), filtered to names containing ``pattern``."""
+    for path in sorted(Path(__file__).parent.glob("bench_*.py")):
+        module = importlib.import_module(f"benchmarks.{path.stem}")
+        for class_name, cls in vars(module).items():
+            if not class_name.startswith("Time") or not isinstance(cls, type):
+                continue
+
+            for method in sorted(name for name in vars(cls) if name.startswith("time_")):
+                for param in getattr(cls, "params", [None]):
+                    name = f"{path.stem.removeprefix('bench_')}.{class_name}.{method}"
+                    if param is not None:
+                        name += f"({param})"
+                    if pattern is None or pattern in name:
+                        yield name, cls, method, param
+
+
+def measure(cls: type, method: str, param, repeat: int) -> list[float]:
+    """Seconds per call of each repeat, every repeat runs for at least 0.2s."""
+    args = () if param is None else (param,)
+    benchmark = cls()
+    if hasattr(benchmark, "setup"):
+        benchmark.setup(*args)
+    try:
+        timer = timeit.Timer(lambda: getattr(benchmark, method)(*args))
+        number, _ = timer.autorange()
+        return [total / number for total in timer.repeat(repeat, number)]
+    finally:
+        if hasattr(benchmark, "teardown"):
+            benchmark.teardown(*args)
+
+
+def human(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the hot paths against a baseline")
+    parser.add_argument("--filter", "-k", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="Timed repeats of every benchmark")
+    parser.add_argument("--save", metavar="NAME", help="Save the results as a baseline called NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against the baseline called NAME")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Fraction a benchmark may slow down by before it counts as a regression"
+    )
+
+    args = parser.parse_args()
+    # The server logs every move it handles
+    logger.remove()
+
+    baseline = {}
+    if args.compare:
+        baseline = json.loads((RESULTS / f"{args.compare}.json").read_text())["benchmarks"]
+
+    benchmarks = list(discover(args.filter))
+    width = max((len(name) for name, *_ in benchmarks), default=0)
+    results = {}
+    regressions = 0
+    for name, cls, method, param in benchmarks:
+        timings = measure(cls, method, param, args.repeat)
+        results[name] = {"median": statistics.median(timings), "min": min(timings)}
+
+        line = f"{name:<{width}}  median {human(results[name]['median']):>9}  min {human(results[name]['min']):>9}"
+        if name in baseline:
+            # Minimums are the least affected by whatever else the machine was doing
+            ratio = results[name]["min"] / baseline[name]["min"]
+            line += f"  {ratio:6.2f}x"
+            if ratio > 1 + args.threshold:
+                line += "  slower"
+                regressions += 1
+            elif ratio < 1 / (1 + args.threshold):
+                line += "  faster"
+        print(line, flush=True)
+
+    if args.save:
+        RESULTS.mkdir(exist_ok=True)
+        machine = {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor()}
+        (RESULTS / f"{args.save}.json").write_text(json.dumps({"machine": machine, "benchmarks": results}, indent=2))
+
+    if args.compare:
+        print(f"{regressions} of {len(results)} benchmarks are more than {args.threshold:.0%} slower than {args.compare}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
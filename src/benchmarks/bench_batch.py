@@ -0,0 +1,37 @@
+import numpy as np
+
+from benchmarks.bench_board import random_boards
+from lib.batch import BoardBatch
+from lib.bitboard import BitboardConnectFour
+
+
+class TimeBatch:
+    """Whole batches against calling the bitboard once per board, for the same positions."""
+
+    params = [100, 10_000]
+    param_names = ["boards"]
+
+    def setup(self, boards: int):
+        # Repeats a small set of positions, building thousands of boards in Python would dominate the setup
+        positions = random_boards(100)
+        self.boards = [positions[i % len(positions)] for i in range(boards)]
+        self.batch = BoardBatch.from_boards(self.boards)
+        self.bitboards = [BitboardConnectFour.from_board(board) for board in self.boards]
+        self.cols = np.random.default_rng(0).integers(0, 7, boards)
+
+    def time_winners(self, boards: int):
+        self.batch.winners()
+
+    def time_winners_each(self, boards: int):
+        for bitboard in self.bitboards:
+            bitboard.check_win()
+
+    def time_legal_moves(self, boards: int):
+        self.batch.legal_moves()
+
+    def time_drop(self, boards: int):
+        """Drop into a copy, so every call sees the same boards."""
+        BoardBatch(self.batch.red.copy(), self.batch.yellow.copy()).drop(self.cols, 1)
+
+    def time_from_boards(self, boards: int):
+        BoardBatch.from_boards(self.boards)
@@ -0,0 +1,62 @@
+import random
+
+from lib.connect_four import ConnectCell, ConnectFour
+
+# Columns played from an empty board, alternating colors starting with red
+POSITIONS = {
+    "empty": [],
+    "midgame": [3, 3, 2, 4, 4, 2, 5, 1, 1, 0, 6, 5],
+    # Every column but the last is full and nobody connected four
+    "full": [0, 1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 2, 3, 2, 3, 2, 3, 3, 2, 3, 2, 3, 2, 4, 5, 4, 5, 4, 5, 5, 4, 5, 4, 5, 4],
+}
+
+
+def make_board(position: str) -> ConnectFour:
+    board = ConnectFour()
+    for i, col in enumerate(POSITIONS[position]):
+        board.drop_piece(col, ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW)
+    return board
+
+
+def random_boards(count: int, seed: int = 0) -> list[ConnectFour]:
+    """Boards after random games that stop at a random move, some of them won and some full."""
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        board = ConnectFour()
+        color = ConnectCell.RED
+        for _ in range(rng.randrange(board.rows * board.cols + 1)):
+            columns = [col for col in range(board.cols) if board.can_play(col)]
+            if not columns:
+                break
+            result = board.drop_piece(rng.choice(columns), color)
+            if result.winner:
+                break
+            color = ConnectCell.YELLOW if color == ConnectCell.RED else ConnectCell.RED
+        boards.append(board)
+    return boards
+
+
+class TimeBoard:
+    params = list(POSITIONS)
+    param_names = ["position"]
+
+    def setup(self, position: str):
+        self.board = make_board(position)
+        self.col = 6 if position == "full" else 3
+        self.color = ConnectCell.RED if self.board.moves % 2 == 0 else ConnectCell.YELLOW
+
+    def time_drop_piece(self, position: str):
+        """Drop a piece and take it back, so every call sees the same board."""
+        result = self.board.drop_piece(self.col, self.color)
+        self.board.set_piece(result.row, self.col, ConnectCell.EMPTY)
+
+    def time_check_win(self, position: str):
+        self.board.check_win()
+
+    def time_can_play(self, position: str):
+        for col in range(self.board.cols):
+            self.board.can_play(col)
+
+    def time_construct(self, position: str):
+        ConnectFour(board=[list(column) for column in self.board.board])
@@ -0,0 +1,105 @@
+import uuid
+
+from benchmarks.bench_board import make_board
+from lib.codec import BINARY_CODEC, JSON_CODEC, LENGTH
+from lib.connect_four import ConnectCell
+from lib.data import Game, Player
+from lib.packets import (
+    PACKET_MAPPING,
+    ConnectionLost,
+    ConnectRequest,
+    ConnectResponse,
+    Encoding,
+    Error,
+    FoundGame,
+    GameOver,
+    Matchmake,
+    Move,
+    MoveApplied,
+    Packet,
+    Packets,
+    Ping,
+    Pong,
+    Resume,
+    ResumeResponse,
+    Spectate,
+    SpectateResponse,
+    SyncGame,
+    SyncRequest,
+)
+
+
+def make_game() -> Game:
+    red = Player(name="red", id=uuid.uuid4(), addr=("127.0.0.1", 5000))
+    yellow = Player(name="yellow", id=uuid.uuid4(), addr=("127.0.0.1", 5001))
+    return Game(game_id="lobby", red_player=red, yellow_player=yellow, turn=red.id, board=make_board("midgame"), seq=12)
+
+
+def make_packet(packet_type: Packets) -> Packet:
+    """A packet of the type with every field filled in, games are in the middle of play."""
+    game = make_game()
+    return {
+        Packets.ERROR: lambda: Error(message="It is not your turn"),
+        Packets.CONNECT_REQUEST: lambda: ConnectRequest(game_id="lobby", username="red", encoding=Encoding.BINARY),
+        Packets.CONNECT_RESPONSE: lambda: ConnectResponse(
+            player=game.red_player, game=game, encoding=Encoding.BINARY, resume_token=f"{game.red_player.id}.{'0' * 64}"
+        ),
+        Packets.SYNC_GAME: lambda: SyncGame(game=game),
+        Packets.FOUND_GAME: FoundGame,
+        Packets.MOVE: lambda: Move(game_id="lobby", index=3, player=game.red_player),
+        Packets.GAME_OVER: lambda: GameOver(game=game, winner=game.red_player),
+        Packets.CONNECT_LOST: ConnectionLost,
+        Packets.MOVE_APPLIED: lambda: MoveApplied(
+            game_id="lobby", index=3, row=2, color=ConnectCell.RED, turn=game.yellow_player.id, seq=13
+        ),
+        Packets.SYNC_REQUEST: lambda: SyncRequest(game_id="lobby"),
+        Packets.SPECTATE: lambda: Spectate(game_id="lobby", encoding=Encoding.BINARY),
+        Packets.SPECTATE_RESPONSE: lambda: SpectateResponse(game=game, encoding=Encoding.BINARY),
+        Packets.MATCHMAKE: lambda: Matchmake(username="red", bucket=3, encoding=Encoding.BINARY),
+        Packets.RESUME: lambda: Resume(
+            game_id="lobby", token=f"{game.red_player.id}.{'0' * 64}", seq=12, encoding=Encoding.BINARY
+        ),
+        Packets.RESUME_RESPONSE: lambda: ResumeResponse(player=game.red_player, encoding=Encoding.BINARY),
+        Packets.PING: Ping,
+        Packets.PONG: Pong,
+    }[packet_type]()
+
+
+class TimePackets:
+    params = [packet_type.name for packet_type in PACKET_MAPPING]
+    param_names = ["packet"]
+
+    def setup(self, name: str):
+        self.packet = make_packet(Packets[name])
+        self.json = self.packet.to_json()
+        self.binary = BINARY_CODEC.encode(self.packet)[LENGTH.size :]
+
+    def time_to_json(self, name: str):
+        self.packet.to_json()
+
+    def time_from_json(self, name: str):
+        Packet.from_json(self.json)
+
+    def time_json_encode(self, name: str):
+        JSON_CODEC.encode(self.packet)
+
+    def time_binary_encode(self, name: str):
+        BINARY_CODEC.encode(self.packet)
+
+    def time_binary_decode(self, name: str):
+        BINARY_CODEC.decode(self.binary)
+
+
+class TimeModels:
+    def setup(self):
+        self.game = make_game()
+        self.fields = self.game.model_dump()
+
+    def time_game(self):
+        Game(**self.fields)
+
+    def time_game_validate(self):
+        Game.model_validate(self.fields)
+
+    def time_player(self):
+        Player(name="red", id=self.game.red_player.id, addr=("127.0.0.1", 5000))
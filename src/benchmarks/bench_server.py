@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.data import Game, Player
+from lib.packets import Encoding, Move
+from lib.codec import CODECS
+from server import ConnectFourServer
+
+
+class SinkWriter:
+    """StreamWriter that throws away everything written to it."""
+
+    def __init__(self, addr):
+        self.addr = addr
+
+    def write(self, data: bytes):
+        pass
+
+    def get_extra_info(self, name):
+        return self.addr if name == "peername" else None
+
+    def close(self):
+        pass
+
+    async def drain(self):
+        pass
+
+
+class TimeHandleMove:
+    params = [encoding.name for encoding in Encoding]
+    param_names = ["encoding"]
+
+    def setup(self, encoding: str):
+        self.loop = asyncio.new_event_loop()
+        self.server = ConnectFourServer()
+        self.red_writer = SinkWriter(("127.0.0.1", 1))
+        self.yellow_writer = SinkWriter(("127.0.0.1", 2))
+
+        red = Player(name="red", id=uuid.uuid4(), addr=self.red_writer.addr)
+        red._writer = self.red_writer
+        yellow = Player(name="yellow", id=uuid.uuid4(), addr=self.yellow_writer.addr)
+        yellow._writer = self.yellow_writer
+
+        self.game = Game(game_id="bench", red_player=red, yellow_player=yellow, turn=red.id, board=ConnectFour())
+        self.server.registry.add_game(self.game)
+        for player in (red, yellow):
+            self.server.registry.join(self.game, player)
+            self.loop.run_until_complete(self.open_outbox(player._writer, CODECS[Encoding[encoding]]))
+
+        self.move = Move(game_id="bench", index=3, player=red)
+
+    def teardown(self, encoding: str):
+        for outbox in self.server.outboxes.values():
+            outbox.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    async def open_outbox(self, writer, codec):
+        self.server.follow(writer, self.game).codec = codec
+
+    async def play(self):
+        await self.server.handle_move(self.red_writer, self.move)
+        # Take the move back so every call plays the same one
+        self.game.board.set_piece(0, 3, ConnectCell.EMPTY)
+        self.game.turn = self.game.red_player.id
+
+    def time_handle_move(self, encoding: str):
+        """Validate, apply and broadcast a move to both players, including the event loop's overhead."""
+        self.loop.run_until_complete(self.play())
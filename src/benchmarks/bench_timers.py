@@ -0,0 +1,39 @@
+import asyncio
+
+from lib.timers import TimerWheel
+
+
+def _nothing():
+    pass
+
+
+class TimeTimerWheel:
+    """Rescheduling a timeout per connection, on the wheel and with the event loop's own timers."""
+
+    params = [1_000, 100_000]
+    param_names = ["timers"]
+
+    def setup(self, timers: int):
+        self.wheel = TimerWheel(tick=1.0)
+        self.timers = [self.wheel.schedule(60 + i % 60, _nothing) for i in range(timers)]
+        self.loop = asyncio.new_event_loop()
+        self.handles = [self.loop.call_later(60 + i % 60, _nothing) for i in range(timers)]
+
+    def teardown(self, timers: int):
+        for handle in self.handles:
+            handle.cancel()
+        self.loop.close()
+
+    def time_reschedule(self, timers: int):
+        for i, timer in enumerate(self.timers):
+            timer.cancel()
+            self.timers[i] = self.wheel.schedule(60, _nothing)
+
+    def time_reschedule_loop(self, timers: int):
+        for i, handle in enumerate(self.handles):
+            handle.cancel()
+            self.handles[i] = self.loop.call_later(60, _nothing)
+
+    def time_tick(self, timers: int):
+        """A tick with nothing due, it only looks at one slot."""
+        self.wheel.advance()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from lib.book import generate_book, write_book
+from lib.solver import Solver
+
+logger.remove(0)
+logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level> - {message}", level="INFO", colorize=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve opening positions into a memory mappable book")
+    parser.add_argument("--output", "-o", type=Path, default=Path("opening.book"), help="Path to write the book to")
+    parser.add_argument("--depth", "-d", type=int, default=8, help="Number of plies from the empty board to include")
+    parser.add_argument("--time-budget", type=float, default=60, help="Seconds to spend on each position before skipping it")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+
+    args = parser.parse_args()
+
+    solver = Solver(args.rows, args.cols)
+    start = time.monotonic()
+
+    def entries():
+        for count, entry in enumerate(generate_book(solver, args.depth, args.time_budget), start=1):
+            if count % 100 == 0:
+                logger.info("Solved {} positions in {:.0f}s", count, time.monotonic() - start)
+            yield entry
+
+    count = write_book(args.output, args.rows, args.cols, entries())
+    logger.info("Wrote {} positions to {} in {:.0f}s", count, args.output, time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,118 @@
 #!/usr/bin/env python3
-from lib.packets import Packet, ConnectRequest, ConnectResponse, Error, FoundGame, SyncGame, Move, GameOver, ConnectionLost
+from lib.packets import (
+    Packet,
+    ConnectRequest,
+    ConnectResponse,
+    Encoding,
+    Error,
+    FoundGame,
+    SyncGame,
+    Move,
+    GameOver,
+    ConnectionLost,
+    MoveApplied,
+    SyncRequest,
+    Spectate,
+    SpectateResponse,
+    Matchmake,
+    Resume,
+    ResumeResponse,
+    Ping,
+    Pong,
+)
+from lib.data import GameState
+from lib.codec import CODECS, JSON_CODEC
+from lib.logs import configure as configure_logging, enabled
+from lib.tls import ResumingContext, client_context
 import asyncio
 import argparse
 from loguru import logger
 from aioconsole import ainput
 from rich import print
-import sys
 import ssl
 from pathlib import Path
 import os
 
-logger.remove(0)
-logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level> - {message}", level="INFO", colorize=True)
+configure_logging()
+
+# Tries at taking the player's place again after the connection dropped, a second apart
+RECONNECT_ATTEMPTS = 10
+RECONNECT_DELAY = 1.0
 
 
 class ConnectFourClient:
-    def __init__(self, host: str, port: int, ssl_cert: Path):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        ssl_cert: Path,
+        bot: bool = False,
+        encoding: Encoding = Encoding.BINARY,
+        bucket: int | None = None,
+        resume: tuple[str, str] | None = None,
+    ):
         self.reader = None
         self.writer = None
+        # TLS state of the connection, kept to resume its session after the connection is gone
+        self.ssl_object = None
         self.host = host
         self.port = port
         self.game = None
         self.player = None
         self.ssl_context = None
         self.ssl_cert = ssl_cert
+        self.bot = bot
+        self.encoding = encoding
+        # Rating bucket to find a random opponent in, None to join a lobby by its game id
+        self.bucket = bucket
+        # Game id and resume token of a game to take the player's place in again, None to join as a new player
+        self.resume = resume
+        # Lets a new connection take the player's place after this one drops
+        self.resume_token = None
+        # Every connection starts out as JSON until the server accepts the requested encoding
+        self.codec = JSON_CODEC
 
     async def connect(self):
-        if self.ssl_cert:
-            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            self.ssl_context.load_verify_locations(self.ssl_cert)
-            self.ssl_context.verify_mode = ssl.CERT_REQUIRED
-            self.ssl_context.check_hostname = False
+        if self.ssl_cert and self.ssl_context is None:
+            self.ssl_context = client_context(self.ssl_cert)
+        # A reconnect resumes the TLS session of the connection it replaces, skipping the certificate exchange
+        if isinstance(self.ssl_context, ResumingContext):
+            self.ssl_context.remember(self.ssl_object)
 
         self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        self.ssl_object = self.writer.get_extra_info("ssl_object")
         logger.info("Connected to {}:{}", self.host, self.port)
 
     async def get_packet(self):
-        data = await self.reader.readline()
-        if not data:
-            logger.info("Connection to server closed")
-            self.writer.close()
-            return await self.writer.wait_closed()
+        """Next packet from the server, answering any Ping on the way."""
+        while True:
+            try:
+                data = await self.codec.read_frame(self.reader)
+            except ConnectionError:
+                data = None
+            if not data:
+                logger.info("Connection to server closed")
+                self.writer.close()
+                try:
+                    await self.writer.wait_closed()
+                except (ConnectionError, ssl.SSLError):
+                    pass
+                return None
+
+            packet = self.codec.decode(data)
+            if enabled.debug:
+                logger.debug("Received {packet_type}", packet_type=packet.packet_type.name)
+            if not isinstance(packet, Ping):
+                return packet
 
-        packet = Packet.from_json(data)
-        logger.debug("Received packet from server {}", packet.packet_type)
-        return packet
+            try:
+                await self.send(Pong(), wait=False)
+            except ConnectionError:
+                # The next read notices the connection is gone
+                pass
 
     async def send(self, packet: Packet, wait=True):
-        self.writer.write(packet.to_json().encode() + b"\n")
+        self.writer.write(self.codec.encode(packet))
         await self.writer.drain()
 
         if wait:
@@ -58,15 +123,24 @@ class ConnectFourClient:
 
         while not registered:
             username = await ainput("Username: ")
-            game_id = await ainput("Game ID: ")
+            if self.bucket is None:
+                response = await self.connect_request(username, await ainput("Game ID: "))
+            else:
+                self.show("Looking for an opponent")
+                response = await self.matchmake(username)
 
-            response = await self.connect_request(username, game_id)
+            if response is None:
+                return False
             if isinstance(response, ConnectResponse):
                 self.player = response.player
                 self.game = response.game
+                self.resume_token = response.resume_token
                 registered = True
+                logger.info("Joined lobby {0}, --resume {0} {1} takes your place again", self.game.game_id, self.resume_token)
             elif isinstance(response, Error):
-                logger.error(f"Error while match making: {response}")
+                logger.error("Error while match making: {}", response.message)
+
+        return True
 
     async def wait_for_game(self):
         while True:
@@ -74,8 +148,10 @@ class ConnectFourClient:
 
             if isinstance(packet, FoundGame):
                 return True
+            if packet is None or isinstance(packet, ConnectionLost):
+                break
 
-            logger.warning("Unexpected packet while waiting for game: {}", packet)
+            logger.warning("Unexpected {} while waiting for game", packet.packet_type.name)
 
         return False
 
@@ -92,80 +168,112 @@ class ConnectFourClient:
                 print("Enter a valid column")
                 continue
 
-            if not self.game.board.drop_piece(move, self.player.get_color(self.game)):
+            if not self.game.board.can_play(move):
                 print(f"The piece cannot be dropped in column {move}")
                 continue
 
             return move
 
+    async def apply_move(self, packet: MoveApplied) -> bool:
+        """Apply a move to the local game, returns False and asks for a SyncGame when a move was missed."""
+        if packet.seq <= self.game.seq:
+            # Already part of a SyncGame we received
+            return True
+
+        if packet.seq != self.game.seq + 1:
+            logger.warning("Missed moves {} to {}, requesting a sync", self.game.seq + 1, packet.seq - 1)
+            await self.send(SyncRequest(game_id=self.game.game_id), wait=False)
+            return False
+
+        self.game.board.set_piece(packet.row, packet.index, packet.color)
+        self.game.turn = packet.turn
+        self.game.seq = packet.seq
+        return True
+
+    def render(self):
+        """Redraw the players and the board."""
+        os.system("clear")
+        opponent = self.game.yellow_player if self.game.red_player.id == self.player.id else self.game.red_player
+        print("[bold]Players:[/bold]")
+        print(self.player.get_color(self.game), "[bold]" + self.player.name + "[/bold]")
+        print(opponent.get_color(self.game), opponent.name)
+        print(self.game.board)
+
+    def show(self, message: str):
+        print(message)
+
     async def game_loop(self):
         get_packet = True
+        # A read still running from the last turn, cancelling it could drop a partly read frame
+        packet_task = None
         while True:
-            logger.debug("Waiting for a packet")
             if get_packet:
-                packet = await self.get_packet()
-                if packet is None:
-                    break
+                packet = await (packet_task or self.get_packet())
+                packet_task = None
             else:
                 get_packet = True
 
+            # Nothing else matches a dropped connection, once resumed the turn carries on
+            if packet is None and not await self.reconnect():
+                self.show("Connection to the server lost")
+                break
+
             if isinstance(packet, ConnectionLost):
-                print("Connection to opponent lost, aborting game")
+                self.show("Connection to opponent lost, aborting game")
                 break
 
             if isinstance(packet, SyncGame):
                 self.game = packet.game
 
-            os.system("clear")
-            opponent = self.game.yellow_player if self.game.red_player.id == self.player.id else self.game.red_player
-            print("[bold]Players:[/bold]")
-            print(self.player.get_color(self.game), "[bold]" + self.player.name + "[/bold]")
-            print(opponent.get_color(self.game), opponent.name)
+            if isinstance(packet, MoveApplied) and not await self.apply_move(packet):
+                continue
 
             if isinstance(packet, GameOver):
                 self.game = packet.game
+                self.render()
 
-                print(self.game.board)
-
-                if self.player.id == packet.winner.id:
-                    print("You won!")
+                if packet.winner is None:
+                    self.show("It's a draw!")
+                elif self.player.id == packet.winner.id:
+                    self.show("You won!")
                 else:
-                    print("Sorry you lost :(")
+                    self.show("Sorry you lost :(")
 
                 break
 
-            print(self.game.board)
+            self.render()
 
             if self.game.turn == self.player.id:
-                packet_task = asyncio.create_task(self.get_packet())
+                packet_task = packet_task or asyncio.create_task(self.get_packet())
                 move_task = asyncio.create_task(self.get_move())
-                tasks = [packet_task, move_task]
 
-                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                await asyncio.wait([packet_task, move_task], return_when=asyncio.FIRST_COMPLETED)
+
+                if packet_task.done():
+                    packet = packet_task.result()
+                    packet_task = None
+                    get_packet = False
+                    if enabled.debug:
+                        logger.debug(
+                            "Received {packet_type} while making a move", packet_type=packet and packet.packet_type.name
+                        )
 
-                for p in pending:
-                    p.cancel()
+                    move_task.cancel()
                     try:
-                        await p
+                        await move_task
                     except asyncio.CancelledError:
                         pass
-
-                for d in done:
-                    if d == tasks[0]:
-                        packet = d.result()
-                        get_packet = False
-                        logger.debug("Packet recieved while making move: {}", packet)
-
-                    elif d == tasks[1]:
-                        move = d.result()
-                        logger.info("Made move: {}", move)
-                        await self.send(
-                            Move(index=move, player=self.player, game_id=self.game.game_id),
-                            wait=False,
-                        )
+                else:
+                    move = move_task.result()
+                    logger.info("Made move: {}", move)
+                    try:
+                        await self.send(Move(index=move, player=self.player, game_id=self.game.game_id), wait=False)
+                    except ConnectionError:
+                        # The next read notices too, the move is asked for again once resumed
+                        logger.warning("Connection dropped before the move was sent")
 
             else:
-                print("Waiting for the next player!")
+                self.show("Waiting for the next player!")
 
         try:
             self.writer.close()
@@ -173,21 +281,114 @@ class ConnectFourClient:
         except ssl.SSLError:
             pass
 
+    async def reconnect(self) -> bool:
+        """Take the player's place in the game again on a new connection."""
+        if self.resume_token is None or self.game is None:
+            return False
+
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            self.show(f"Connection lost, reconnecting ({attempt}/{RECONNECT_ATTEMPTS})")
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self.connect()
+                return await self.resume_game(self.game.game_id, self.resume_token)
+            except OSError as e:
+                logger.warning("Couldn't reconnect: {}", e)
+        return False
+
+    async def resume_game(self, game_id: str, token: str) -> bool:
+        self.codec = JSON_CODEC
+        seq = self.game.seq if self.game is not None else None
+        response = await self.send(Resume(game_id=game_id, token=token, seq=seq, encoding=self.encoding))
+        if not isinstance(response, ResumeResponse):
+            logger.error("Can't resume lobby {}: {}", game_id, getattr(response, "message", response))
+            return False
+
+        self.codec = CODECS[response.encoding]
+        self.player = response.player
+        self.resume_token = token
+        logger.info("Resumed lobby {}", game_id)
+        return True
+
     async def play(self):
         await self.connect()
 
-        await self.register()
+        if self.resume is not None:
+            # The server follows up with the whole game
+            if await self.resume_game(*self.resume):
+                await self.game_loop()
+            return
+
+        if not await self.register():
+            return
 
-        print("Waiting for opponent")
-        await self.wait_for_game()
+        self.show("Waiting for opponent")
+        if not await self.wait_for_game():
+            self.show("Connection lost before the game started")
+            return
 
         logger.info("Game started")
         await self.game_loop()
 
+    async def spectate(self, game_id: str):
+        await self.connect()
+
+        response = await self.send(Spectate(game_id=game_id, encoding=self.encoding))
+        if not isinstance(response, SpectateResponse):
+            logger.error("Can't spectate lobby {}: {}", game_id, getattr(response, "message", response))
+            return
+
+        self.codec = CODECS[response.encoding]
+        self.game = response.game
+        result = None
+
+        while True:
+            os.system("clear")
+            print(f"[bold]Spectating {game_id}[/bold]")
+            for player in (self.game.red_player, self.game.yellow_player):
+                if player is not None:
+                    print(player.get_color(self.game), player.name)
+            print(self.game.board)
+
+            if result is not None or self.game.state == GameState.FINISHED:
+                print(result or "Game over")
+                break
+
+            packet = await self.get_packet()
+            if packet is None or isinstance(packet, ConnectionLost):
+                print("Game ended")
+                break
+
+            if isinstance(packet, SyncGame):
+                self.game = packet.game
+
+            if isinstance(packet, MoveApplied):
+                await self.apply_move(packet)
+
+            if isinstance(packet, GameOver):
+                self.game = packet.game
+                result = "It's a draw!" if packet.winner is None else f"{packet.winner.name} won!"
+
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except ssl.SSLError:
+            pass
+
     async def connect_request(self, username, game_id):
-        packet = ConnectRequest(game_id=game_id, username=username)
+        packet = ConnectRequest(game_id=game_id, username=username, bot=self.bot, encoding=self.encoding)
+
+        response = await self.send(packet)
+        if isinstance(response, ConnectResponse):
+            self.codec = CODECS[response.encoding]
+        return response
 
-        return await self.send(packet)
+    async def matchmake(self, username):
+        # The server only answers once an opponent was found
+        response = await self.send(Matchmake(username=username, bucket=self.bucket, encoding=self.encoding))
+        if isinstance(response, ConnectResponse):
+            self.codec = CODECS[response.encoding]
+        return response
 
 
 async def main():
@@ -196,10 +397,48 @@ async def main():
     parser.add_argument("--port", "-p", type=int, default=60000, help="Server port")
     parser.add_argument("--ssl-cert", type=Path, default=Path("certs/fullchain.pem"), help="SSL certificate path")
     parser.add_argument("--ssl", action=argparse.BooleanOptionalAction, default=True, help="Options to enable or disable SSL")
+    parser.add_argument("--bot", action="store_true", help="Play against the server's bot")
+    parser.add_argument("--spectate", metavar="GAME_ID", help="Watch a game instead of playing")
+    parser.add_argument(
+        "--matchmake",
+        metavar="BUCKET",
+        type=int,
+        nargs="?",
+        const=0,
+        help="Play a random opponent from the given rating bucket instead of joining a lobby",
+    )
+    parser.add_argument(
+        "--binary", action=argparse.BooleanOptionalAction, default=True, help="Ask for the binary protocol instead of JSON"
+    )
+    parser.add_argument(
+        "--resume",
+        metavar=("GAME_ID", "TOKEN"),
+        nargs=2,
+        help="Take your place again in a game you lost the connection to, the token is logged when you join",
+    )
+    parser.add_argument("--debug", type=str, default="INFO", help="Logging debug level")
+    parser.add_argument(
+        "--log-queue",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Write logs from a background thread, they may then show up out of order with the board",
+    )
 
     args = parser.parse_args()
-    connect_four = ConnectFourClient(args.host, args.port, args.ssl_cert if args.ssl else None)
-    await connect_four.play()
+    configure_logging(args.debug, args.log_queue)
+    connect_four = ConnectFourClient(
+        args.host,
+        args.port,
+        args.ssl_cert if args.ssl else None,
+        args.bot,
+        Encoding.BINARY if args.binary else Encoding.JSON,
+        args.matchmake,
+        args.resume,
+    )
+    if args.spectate:
+        await connect_four.spectate(args.spectate)
+    else:
+        await connect_four.play()
 
 
 if __name__ == "__main__":
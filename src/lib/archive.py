@@ -0,0 +1,377 @@
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+from uuid import UUID
+
+from loguru import logger
+
+DATA_MAGIC = b"C4AD"
+INDEX_MAGIC = b"C4AI"
+VERSION = 2
+
+# magic, version, at the start of every data and index file
+FILE_HEADER = struct.Struct("<4sBxxx")
+# Index entry of one chunk: offset in the data file, compressed length, crc32, games,
+# earliest and latest end time, number of player keys following it
+BLOCK = struct.Struct("<QIIIIII")
+# Hash of a player's name, the index keeps them sorted per chunk
+PLAYER_KEY = struct.Struct("<Q")
+
+# Games compressed together, bigger chunks compress better but queries decompress whole chunks
+CHUNK_GAMES = 4096
+# A new segment is started once the data file is this big
+SEGMENT_BYTES = 256 * 1024 * 1024
+
+
+class ArchivedGame(NamedTuple):
+    game_id: str
+    red_id: UUID
+    red_name: str
+    yellow_id: UUID
+    yellow_name: str
+    # ConnectCell value of the winner, EMPTY for a draw
+    winner: int
+    # ConnectCell value of the color that moved first, the colors alternate from there
+    first: int
+    rows: int
+    cols: int
+    # Unix seconds
+    started: int
+    ended: int
+    # Column of every move
+    moves: bytes
+
+
+_LOW_NIBBLE = bytes(byte & 0xF for byte in range(256))
+_HIGH_NIBBLE = bytes(byte >> 4 for byte in range(256))
+
+
+def player_key(name: str) -> int:
+    """Index key of a player. Ids are new for every game, so players are found by name."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little")
+
+
+def pack_moves(moves: bytes) -> bytes:
+    """Two columns per byte, the first in the low nibble."""
+    padded = moves + b"\0" if len(moves) % 2 else moves
+    return bytes(low | (high << 4) for low, high in zip(padded[::2], padded[1::2]))
+
+
+def unpack_moves(data: bytes, count: int) -> bytes:
+    moves = bytearray(2 * len(data))
+    moves[::2] = data.translate(_LOW_NIBBLE)
+    moves[1::2] = data.translate(_HIGH_NIBBLE)
+    return bytes(moves[:count])
+
+
+def _strings(values: list[str]) -> bytes:
+    encoded = [value.encode() for value in values]
+    return struct.pack(f"<{len(encoded)}H", *map(len, encoded)) + b"".join(encoded)
+
+
+def encode_chunk(games: list[ArchivedGame]) -> bytes:
+    """The games column by column, so every column compresses on its own terms."""
+    count = len(games)
+    bytes_column = struct.Struct(f"<{count}B").pack
+    columns = [
+        struct.pack("<I", count),
+        bytes_column(*(game.winner for game in games)),
+        bytes_column(*(game.first for game in games)),
+        bytes_column(*(game.rows for game in games)),
+        bytes_column(*(game.cols for game in games)),
+        bytes_column(*(len(game.moves) for game in games)),
+        struct.pack(f"<{count}I", *(game.started for game in games)),
+        # End times as durations, they are small and mostly alike
+        struct.pack(f"<{count}I", *(game.ended - game.started for game in games)),
+        b"".join(game.red_id.bytes for game in games),
+        b"".join(game.yellow_id.bytes for game in games),
+        _strings([game.game_id for game in games]),
+        _strings([game.red_name for game in games]),
+        _strings([game.yellow_name for game in games]),
+        b"".join(pack_moves(game.moves) for game in games),
+    ]
+    return b"".join(columns)
+
+
+def decode_chunk(data: bytes) -> list[ArchivedGame]:
+    (count,) = struct.unpack_from("<I", data)
+    offset = 4
+
+    def column(format: str, size: int) -> tuple:
+        nonlocal offset
+        values = struct.unpack_from(f"<{count}{format}", data, offset)
+        offset += count * size
+        return values
+
+    def ids() -> list[UUID]:
+        nonlocal offset
+        values = [UUID(bytes=data[offset + 16 * i : offset + 16 * (i + 1)]) for i in range(count)]
+        offset += 16 * count
+        return values
+
+    def strings() -> list[str]:
+        nonlocal offset
+        values = []
+        for length in column("H", 2):
+            values.append(data[offset : offset + length].decode())
+            offset += length
+        return values
+
+    winners, firsts, rows, cols, lengths = (column("B", 1) for _ in range(5))
+    started, durations = column("I", 4), column("I", 4)
+    red_ids, yellow_ids = ids(), ids()
+    game_ids, red_names, yellow_names = strings(), strings(), strings()
+
+    # Every game's moves start on a whole byte, so the column unpacks at once and is cut up after
+    moves = unpack_moves(data[offset:], 2 * (len(data) - offset))
+    offset = 0
+    games = []
+    for i in range(count):
+        start, offset = offset, offset + lengths[i] + lengths[i] % 2
+        games.append(
+            ArchivedGame(
+                game_ids[i],
+                red_ids[i],
+                red_names[i],
+                yellow_ids[i],
+                yellow_names[i],
+                winners[i],
+                firsts[i],
+                rows[i],
+                cols[i],
+                started[i],
+                started[i] + durations[i],
+                moves[start : start + lengths[i]],
+            )
+        )
+    return games
+
+
+class Block(NamedTuple):
+    """Where a chunk is and what the index knows about it."""
+
+    offset: int
+    length: int
+    crc: int
+    games: int
+    first_ended: int
+    last_ended: int
+    # Offset of the chunk's sorted player keys in the index file, and how many there are
+    keys_offset: int
+    keys: int
+
+
+def _data_path(directory: Path, segment: int) -> Path:
+    return directory / f"games-{segment:08d}.c4a"
+
+
+def _index_path(directory: Path, segment: int) -> Path:
+    return directory / f"games-{segment:08d}.idx"
+
+
+def _segments(directory: Path) -> list[int]:
+    return sorted(int(path.stem.removeprefix("games-")) for path in directory.glob("games-*.c4a"))
+
+
+def _blocks(index: bytes | mmap.mmap, data_size: int) -> Iterator[Block]:
+    """Every whole block of an index whose chunk is all there, stopping at a torn one."""
+    offset = FILE_HEADER.size
+    while offset + BLOCK.size <= len(index):
+        chunk_offset, length, crc, games, first_ended, last_ended, keys = BLOCK.unpack_from(index, offset)
+        keys_offset = offset + BLOCK.size
+        end = keys_offset + keys * PLAYER_KEY.size
+        if end > len(index) or chunk_offset + length > data_size:
+            return
+        yield Block(chunk_offset, length, crc, games, first_ended, last_ended, keys_offset, keys)
+        offset = end
+
+
+class ArchiveWriter:
+    """Appends finished games to a directory of segments, a chunk at a time.
+
+    Each segment is a data file of zlib compressed chunks and an index file with a block
+    per chunk: where it is, its time range and the sorted keys of every player in it.
+    Chunks are written with the data first and the index after, both fsynced, so after a
+    crash the index only ever names whole chunks and opening the writer trims any torn tail.
+
+    Compressing and writing happen on a thread of their own, :meth:`append` only buffers.
+    """
+
+    def __init__(self, directory: Path, chunk_games: int = CHUNK_GAMES, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.chunk_games = chunk_games
+        self.segment_bytes = segment_bytes
+        self.pending: list[ArchivedGame] = []
+
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="archive")
+        self._futures: set[Future] = set()
+
+        directory.mkdir(parents=True, exist_ok=True)
+        segments = _segments(directory)
+        self.segment = segments[-1] if segments else 0
+        self._data, self._index = self._open(self.segment)
+
+    def _open(self, segment: int):
+        data = open(_data_path(self.directory, segment), "a+b")
+        index = open(_index_path(self.directory, segment), "a+b")
+        for file, magic in ((data, DATA_MAGIC), (index, INDEX_MAGIC)):
+            file.seek(0)
+            header = file.read(FILE_HEADER.size)
+            if not header:
+                file.write(FILE_HEADER.pack(magic, VERSION))
+                file.flush()
+            elif header != FILE_HEADER.pack(magic, VERSION):
+                raise ValueError(f"{file.name} is not a version {VERSION} archive")
+
+        # Drop whatever a crash left after the last chunk the index names in full
+        index.seek(0)
+        data_end = index_end = FILE_HEADER.size
+        for block in _blocks(index.read(), os.fstat(data.fileno()).st_size):
+            data_end = block.offset + block.length
+            index_end = block.keys_offset + block.keys * PLAYER_KEY.size
+        for file, end in ((data, data_end), (index, index_end)):
+            if os.fstat(file.fileno()).st_size != end:
+                logger.warning("Archive {} ends in a torn chunk, truncating it", file.name)
+                file.truncate(end)
+        return data, index
+
+    def append(self, game: ArchivedGame):
+        if game.cols > 16:
+            raise ValueError(f"Columns of a {game.cols} column board don't fit in a nibble")
+
+        self.pending.append(game)
+        if len(self.pending) >= self.chunk_games:
+            self.flush()
+
+    def flush(self) -> Future | None:
+        """Hand the buffered games to the writer thread, returns a future done once they are on disk."""
+        if not self.pending:
+            return None
+
+        games, self.pending = self.pending, []
+        future = self._executor.submit(self._write, games)
+        self._futures.add(future)
+        future.add_done_callback(self._written)
+        return future
+
+    def _written(self, future: Future):
+        self._futures.discard(future)
+        if future.exception() is not None:
+            logger.opt(exception=future.exception()).error("Failed to archive games")
+
+    def _write(self, games: list[ArchivedGame]):
+        compressed = zlib.compress(encode_chunk(games))
+        # The file position is wherever _open left it, the size is what counts
+        if os.fstat(self._data.fileno()).st_size >= self.segment_bytes:
+            self._data.close()
+            self._index.close()
+            self.segment += 1
+            self._data, self._index = self._open(self.segment)
+
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(compressed)
+        self._data.flush()
+        os.fsync(self._data.fileno())
+
+        keys = sorted({player_key(name) for game in games for name in (game.red_name, game.yellow_name)})
+        ended = [game.ended for game in games]
+        block = BLOCK.pack(offset, len(compressed), zlib.crc32(compressed), len(games), min(ended), max(ended), len(keys))
+        self._index.write(block + b"".join(map(PLAYER_KEY.pack, keys)))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+
+    def close(self):
+        """Write everything buffered and wait for it."""
+        self.flush()
+        self._executor.shutdown()
+        self._data.close()
+        self._index.close()
+
+
+class ArchiveReader:
+    """Streams games out of an archive, memory mapping every segment.
+
+    Time ranges are matched against the index blocks and players against their sorted
+    keys, so only chunks that can hold a match are ever decompressed. The reader sees the
+    chunks that were written when it was opened.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._maps: list[tuple[mmap.mmap, mmap.mmap, list[Block]]] = []
+        for segment in _segments(directory):
+            data_path, index_path = _data_path(directory, segment), _index_path(directory, segment)
+            if not index_path.exists() or index_path.stat().st_size <= FILE_HEADER.size:
+                continue
+
+            with open(data_path, "rb") as data_file, open(index_path, "rb") as index_file:
+                data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+                index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if index[: FILE_HEADER.size] != FILE_HEADER.pack(INDEX_MAGIC, VERSION):
+                raise ValueError(f"{index_path} is not a version {VERSION} archive index")
+            self._maps.append((data, index, list(_blocks(index, len(data)))))
+
+    def __len__(self) -> int:
+        return sum(block.games for _, _, blocks in self._maps for block in blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for data, index, _ in self._maps:
+            data.close()
+            index.close()
+        self._maps.clear()
+
+    @staticmethod
+    def _has_key(index: mmap.mmap, block: Block, key: int) -> bool:
+        keys = _KeyView(index, block)
+        position = bisect_left(keys, key)
+        return position < block.keys and keys[position] == key
+
+    def games(self, player: str | None = None, since: int | None = None, until: int | None = None) -> Iterator[ArchivedGame]:
+        """Games the player named ``player`` played in that ended between ``since`` and ``until`` unix seconds, all optional."""
+        key = None if player is None else player_key(player)
+        for data, index, blocks in self._maps:
+            for block in blocks:
+                if since is not None and block.last_ended < since or until is not None and block.first_ended > until:
+                    continue
+                if key is not None and not self._has_key(index, block, key):
+                    continue
+
+                compressed = data[block.offset : block.offset + block.length]
+                if zlib.crc32(compressed) != block.crc:
+                    raise ValueError(f"Archive chunk at {block.offset} of {data} is corrupt")
+
+                for game in decode_chunk(zlib.decompress(compressed)):
+                    if player is not None and player not in (game.red_name, game.yellow_name):
+                        continue
+                    if since is not None and game.ended < since or until is not None and game.ended > until:
+                        continue
+                    yield game
+
+
+class _KeyView:
+    """The sorted player keys of a block as a sequence bisect can search without reading them all."""
+
+    __slots__ = ("block", "index")
+
+    def __init__(self, index: mmap.mmap, block: Block):
+        self.index = index
+        self.block = block
+
+    def __len__(self) -> int:
+        return self.block.keys
+
+    def __getitem__(self, position: int) -> int:
+        return PLAYER_KEY.unpack_from(self.index, self.block.keys_offset + position * PLAYER_KEY.size)[0]
@@ -0,0 +1,145 @@
+import json
+
+from lib.connect_four import Board, ConnectCell, ConnectFour, DropResult
+
+
+class BitboardConnectFour:
+    """Connect Four board stored as one integer bitboard per color.
+
+    Each column uses ``rows + 1`` bits, the extra bit being an always empty
+    sentinel at the top of the column. Cell ``(row, col)`` maps to bit
+    ``col * (rows + 1) + row``, so vertical, horizontal and both diagonal
+    neighbours are a shift of ``1``, ``rows + 1``, ``rows + 2`` and ``rows``
+    away and a four in a row can be found with three shift-and-mask steps.
+    """
+
+    __slots__ = ("_bottom_masks", "_column_masks", "_height", "cols", "mask", "moves", "red", "rows", "yellow")
+
+    def __init__(self, rows: int = 6, cols: int = 7) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.red = 0
+        self.yellow = 0
+        self.mask = 0
+        self.moves = 0
+
+        self._height = rows + 1
+        column = (1 << rows) - 1
+        self._column_masks = tuple(column << (col * self._height) for col in range(cols))
+        self._bottom_masks = tuple(1 << (col * self._height) for col in range(cols))
+
+    @classmethod
+    def from_board(cls, board: ConnectFour) -> "BitboardConnectFour":
+        bitboard = cls(rows=board.rows, cols=board.cols)
+        bitboard.load_cells(board.board)
+        return bitboard
+
+    def to_board(self) -> ConnectFour:
+        return ConnectFour(rows=self.rows, cols=self.cols, board=self.cells())
+
+    def load_cells(self, board: Board):
+        for col, column in enumerate(board):
+            for row, cell in enumerate(column):
+                if cell == ConnectCell.RED:
+                    self.red |= self._bit(row, col)
+                elif cell == ConnectCell.YELLOW:
+                    self.yellow |= self._bit(row, col)
+
+        self.mask = self.red | self.yellow
+        self.moves = self.mask.bit_count()
+
+    def cells(self) -> Board:
+        return [[self.get_piece(row, col) for row in range(self.rows)] for col in range(self.cols)]
+
+    def to_json(self) -> str:
+        return json.dumps({"rows": self.rows, "cols": self.cols, "board": self.cells()})
+
+    @classmethod
+    def from_json(cls, data) -> "BitboardConnectFour":
+        data = json.loads(data)
+        bitboard = cls(rows=data["rows"], cols=data["cols"])
+        bitboard.load_cells(data["board"])
+        return bitboard
+
+    def _bit(self, row: int, col: int) -> int:
+        return 1 << (col * self._height + row)
+
+    def _check_column(self, col: int, action: str):
+        if not 0 <= col < self.cols:
+            raise IndexError(f"Attempted to {action} col index {col} in a board with {self.cols}")
+
+    def _check_bounds(self, row: int, col: int, action: str):
+        if not 0 <= row < self.rows:
+            raise IndexError(f"Attempted to {action} row index {row} in a board with {self.rows}")
+
+        self._check_column(col, action)
+
+    def get_piece(self, row: int, col: int) -> ConnectCell:
+        self._check_bounds(row, col, "get")
+
+        bit = self._bit(row, col)
+        if self.red & bit:
+            return ConnectCell.RED
+        if self.yellow & bit:
+            return ConnectCell.YELLOW
+        return ConnectCell.EMPTY
+
+    def set_piece(self, row: int, col: int, color: ConnectCell):
+        self._check_bounds(row, col, "set")
+
+        bit = self._bit(row, col)
+        self.red &= ~bit
+        self.yellow &= ~bit
+
+        if color == ConnectCell.RED:
+            self.red |= bit
+        elif color == ConnectCell.YELLOW:
+            self.yellow |= bit
+
+        self.mask = self.red | self.yellow
+        self.moves = self.mask.bit_count()
+
+    def can_play(self, col: int) -> bool:
+        self._check_column(col, "check")
+        return bool(self._column_masks[col] & ~self.mask)
+
+    def drop_piece(self, col: int, color: ConnectCell) -> DropResult | None:
+        self._check_column(col, "drop in")
+        if color not in (ConnectCell.RED, ConnectCell.YELLOW):
+            raise ValueError(f"Can't drop a {color.name} piece")
+
+        # Lowest empty cell of the column, isolated with the two's complement trick
+        free = self._column_masks[col] & ~self.mask
+        if not free:
+            return None
+
+        move = free & -free
+        if color == ConnectCell.RED:
+            self.red |= move
+            pieces = self.red
+        else:
+            self.yellow |= move
+            pieces = self.yellow
+
+        self.mask |= move
+        self.moves += 1
+
+        # Only the mover's pieces can have formed a new line
+        winner = color if self._aligned(pieces) else None
+        row = move.bit_length() - 1 - col * self._height
+        return DropResult(row, winner, winner is None and self.moves == self.rows * self.cols)
+
+    def _aligned(self, pieces: int) -> bool:
+        height = self._height
+        for shift in (1, height, height + 1, height - 1):
+            pairs = pieces & (pieces >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def check_win(self) -> ConnectCell | None:
+        if self._aligned(self.red):
+            return ConnectCell.RED
+        if self._aligned(self.yellow):
+            return ConnectCell.YELLOW
+        return None
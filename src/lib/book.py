@@ -0,0 +1,177 @@
+import mmap
+import struct
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.solver import Solver
+
+MAGIC = b"C4BK"
+VERSION = 1
+
+# magic, version, rows, cols, entry count
+HEADER = struct.Struct("<4sBBBxI")
+# canonical key, score, column in the canonical orientation
+RECORD = struct.Struct("<QbB")
+
+
+class BookEntry(NamedTuple):
+    column: int
+    score: int
+
+
+class BookGeometry:
+    """Key and mirroring helpers for one board size, using the bitboard layout of the solver."""
+
+    __slots__ = ("bottom", "cols", "column_masks", "height", "rows")
+
+    def __init__(self, rows: int, cols: int):
+        if (rows + 1) * cols > 64:
+            raise ValueError(f"A {rows}x{cols} board doesn't fit in a 64 bit book key")
+
+        self.rows = rows
+        self.cols = cols
+        self.height = rows + 1
+        self.column_masks = tuple(((1 << self.height) - 1) << (col * self.height) for col in range(cols))
+        self.bottom = sum(1 << (col * self.height) for col in range(cols))
+
+    def key(self, current: int, mask: int) -> int:
+        return current + mask + self.bottom
+
+    def mirror(self, bits: int) -> int:
+        result = 0
+        for col in range(self.cols):
+            column = (bits & self.column_masks[col]) >> (col * self.height)
+            result |= column << ((self.cols - 1 - col) * self.height)
+        return result
+
+    def canonical(self, current: int, mask: int) -> tuple[int, bool]:
+        """Smaller of the position's key and its mirror image's key, and whether it was the mirror."""
+        key = self.key(current, mask)
+        mirrored = self.key(self.mirror(current), self.mirror(mask))
+        return (mirrored, True) if mirrored < key else (key, False)
+
+
+class OpeningBook:
+    """Read only view of a book file, memory mapped so every process shares the same pages.
+
+    Records are fixed width and sorted by key, so lookups are a binary search directly
+    over the mapping without loading anything into Python objects up front.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"{self.path} is too small to be an opening book")
+
+        magic, version, rows, cols, count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} opening book")
+
+        if len(self._mmap) != HEADER.size + count * RECORD.size:
+            self.close()
+            raise ValueError(f"{self.path} is truncated")
+
+        self.rows = rows
+        self.cols = cols
+        self.count = count
+        self.geometry = BookGeometry(rows, cols)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _find(self, key: int) -> tuple[int, int] | None:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            found, score, column = RECORD.unpack_from(self._mmap, HEADER.size + middle * RECORD.size)
+            if found == key:
+                return score, column
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup_position(self, current: int, mask: int) -> BookEntry | None:
+        key, mirrored = self.geometry.canonical(current, mask)
+        found = self._find(key)
+        if found is None:
+            return None
+
+        score, column = found
+        return BookEntry(self.cols - 1 - column if mirrored else column, score)
+
+    def lookup(self, board: ConnectFour | BitboardConnectFour, color: ConnectCell) -> BookEntry | None:
+        if isinstance(board, ConnectFour):
+            board = BitboardConnectFour.from_board(board)
+
+        if (board.rows, board.cols) != (self.rows, self.cols):
+            return None
+
+        current = board.red if color == ConnectCell.RED else board.yellow
+        return self.lookup_position(current, board.mask)
+
+
+def generate_book(solver: Solver, depth: int, time_budget: float | None = None) -> Iterator[tuple[int, BookEntry]]:
+    """Solve every position up to ``depth`` plies from the empty board, folding mirror images together.
+
+    Yields ``(canonical key, entry)`` pairs with the column in the canonical orientation.
+    Positions the solver can't finish within ``time_budget`` are left out of the book.
+    Each position is a new search, so estimates left in the table by earlier ones are ignored.
+    """
+    geometry = BookGeometry(solver.rows, solver.cols)
+    frontier = {geometry.key(0, 0): (0, 0)}
+
+    for ply in range(depth + 1):
+        next_frontier = {}
+        for key, (current, mask) in sorted(frontier.items()):
+            result = solver.search_position(current, mask, time_budget)
+            if result.solved:
+                # Estimates lie strictly between whole scores, only exact ones may go in the book
+                if not result.score.is_integer():
+                    raise AssertionError(f"Solved position {key:#x} has a heuristic score {result.score}")
+                yield key, BookEntry(result.column, int(result.score))
+
+            if ply == depth:
+                continue
+
+            possible = solver.possible(mask)
+            if solver.winning_cells(current, mask) & possible:
+                # Games end here, nothing to expand
+                continue
+
+            for col in range(solver.cols):
+                move = possible & solver.column_masks[col]
+                if move:
+                    child_current, child_mask = current ^ mask, mask | move
+                    child_key, mirrored = geometry.canonical(child_current, child_mask)
+                    if mirrored:
+                        child_current, child_mask = geometry.mirror(child_current), geometry.mirror(child_mask)
+                    next_frontier[child_key] = (child_current, child_mask)
+
+        frontier = next_frontier
+
+
+def write_book(path: Path, rows: int, cols: int, entries: Iterable[tuple[int, BookEntry]]) -> int:
+    records = sorted(entries)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, rows, cols, len(records)))
+        file.writelines(RECORD.pack(key, entry.score, entry.column) for key, entry in records)
+    return len(records)
@@ -0,0 +1,303 @@
+import asyncio
+import struct
+import types
+import typing
+import uuid
+from enum import IntEnum
+from typing import Any
+
+from pydantic import BaseModel
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.packets import PACKET_MAPPING, Encoding, Packet, Packets
+
+# Frame length prefix, frames are therefore limited to 64KB
+LENGTH = struct.Struct("<H")
+
+U8 = struct.Struct("<B")
+I8 = struct.Struct("<b")
+U16 = struct.Struct("<H")
+I32 = struct.Struct("<i")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+
+CELLS = tuple(ConnectCell)
+# Every possible packed byte unpacked into its four cells
+UNPACKED = tuple(tuple(CELLS[(byte >> shift) & 0b11] for shift in (0, 2, 4, 6)) for byte in range(256))
+# Number of occupied cells in every possible packed byte
+OCCUPIED = bytes(sum(cell != ConnectCell.EMPTY for cell in cells) for cells in UNPACKED)
+
+
+class JsonCodec:
+    """Newline delimited JSON, the original protocol and the fallback for every connection."""
+
+    encoding = Encoding.JSON
+
+    def encode(self, packet: Packet) -> bytes:
+        return packet.to_json().encode() + b"\n"
+
+    def decode(self, data: bytes) -> Packet:
+        return Packet.from_json(data)
+
+    async def read_frame(self, reader: asyncio.StreamReader) -> bytes:
+        return await reader.readline()
+
+
+class Reader:
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, format: struct.Struct):
+        (value,) = format.unpack_from(self.data, self.offset)
+        self.offset += format.size
+        return value
+
+    def take(self, size: int) -> bytes:
+        if self.offset + size > len(self.data):
+            raise ValueError("Packet is truncated")
+        data = self.data[self.offset : self.offset + size]
+        self.offset += size
+        return data
+
+
+# A field is written by appending to a bytearray and read back from a Reader
+Writer = typing.Callable[[bytearray, Any], None]
+ReaderFunction = typing.Callable[[Reader], Any]
+
+
+def _struct_field(format: struct.Struct) -> tuple[Writer, ReaderFunction]:
+    def write(out: bytearray, value):
+        out += format.pack(value)
+
+    def read(reader: Reader):
+        return reader.unpack(format)
+
+    return write, read
+
+
+def _write_bool(out: bytearray, value: bool):
+    out += U8.pack(value)
+
+
+def _read_bool(reader: Reader) -> bool:
+    return reader.unpack(U8) != 0
+
+
+def _write_str(out: bytearray, value: str):
+    data = value.encode()
+    out += U16.pack(len(data))
+    out += data
+
+
+def _read_str(reader: Reader) -> str:
+    return reader.take(reader.unpack(U16)).decode()
+
+
+def _write_uuid(out: bytearray, value: uuid.UUID):
+    out += value.bytes
+
+
+def _read_uuid(reader: Reader) -> uuid.UUID:
+    return uuid.UUID(bytes=reader.take(16))
+
+
+def _write_tuple(out: bytearray, value: tuple):
+    # Addresses are (host, port) or (host, port, flowinfo, scope_id), so allow both ints and strings
+    out += U8.pack(len(value))
+    for item in value:
+        if isinstance(item, int):
+            out += U8.pack(0)
+            out += I64.pack(item)
+        else:
+            out += U8.pack(1)
+            _write_str(out, str(item))
+
+
+def _read_tuple(reader: Reader) -> tuple:
+    return tuple(reader.unpack(I64) if reader.unpack(U8) == 0 else _read_str(reader) for _ in range(reader.unpack(U8)))
+
+
+def _write_board(out: bytearray, board: ConnectFour):
+    """Rows, cols, then every cell column by column at 2 bits each, the same values as ConnectCell."""
+    out += U8.pack(board.rows)
+    out += U8.pack(board.cols)
+
+    cells = [cell for column in board.board for cell in column]
+    cells += [ConnectCell.EMPTY] * (-len(cells) % 4)
+    out += bytes(cells[i] | cells[i + 1] << 2 | cells[i + 2] << 4 | cells[i + 3] << 6 for i in range(0, len(cells), 4))
+
+
+def _read_board(reader: Reader) -> ConnectFour:
+    rows = reader.unpack(U8)
+    cols = reader.unpack(U8)
+    packed = reader.take((rows * cols + 3) // 4)
+
+    cells = [cell for byte in packed for cell in UNPACKED[byte]]
+    board = [cells[col * rows : (col + 1) * rows] for col in range(cols)]
+    moves = sum(OCCUPIED[byte] for byte in packed)
+    return _BOARD({"rows": rows, "cols": cols, "board": board, "moves": moves})
+
+
+def _constructor(model: type[BaseModel]) -> typing.Callable[[dict], BaseModel]:
+    """Like ``model.model_construct`` for a dict holding every field, without its per call field lookups."""
+    private = {name: attribute.get_default() for name, attribute in model.__private_attributes__.items()}
+
+    def construct(values: dict) -> BaseModel:
+        instance = model.__new__(model)
+        object.__setattr__(instance, "__dict__", values)
+        object.__setattr__(instance, "__pydantic_fields_set__", set(values))
+        object.__setattr__(instance, "__pydantic_extra__", None)
+        object.__setattr__(instance, "__pydantic_private__", dict(private) if private else None)
+        return instance
+
+    return construct
+
+
+_BOARD = _constructor(ConnectFour)
+
+
+def _enum_field(enum: type[IntEnum]) -> tuple[Writer, ReaderFunction]:
+    def write(out: bytearray, value):
+        out += I8.pack(value)
+
+    def read(reader: Reader):
+        return enum(reader.unpack(I8))
+
+    return write, read
+
+
+def _optional_field(field: tuple[Writer, ReaderFunction]) -> tuple[Writer, ReaderFunction]:
+    write_value, read_value = field
+
+    def write(out: bytearray, value):
+        if value is None:
+            out += U8.pack(0)
+        else:
+            out += U8.pack(1)
+            write_value(out, value)
+
+    def read(reader: Reader):
+        return read_value(reader) if reader.unpack(U8) else None
+
+    return write, read
+
+
+def _model_field(model: type[BaseModel], skip: tuple[str, ...] = ()) -> tuple[Writer, ReaderFunction]:
+    """Fields in declaration order, ``skip`` fields aren't sent and are decoded as their defaults."""
+    fields = [(name, _field(info.annotation)) for name, info in model.model_fields.items() if name not in skip]
+    defaults = {name: model.model_fields[name].default for name in skip}
+    construct = _constructor(model)
+
+    def write(out: bytearray, value: BaseModel):
+        for name, (write_value, _) in fields:
+            write_value(out, getattr(value, name))
+
+    def read(reader: Reader):
+        # Every value was read with a fixed type already, skip pydantic validation
+        values = dict(defaults)
+        for name, (_, read_value) in fields:
+            values[name] = read_value(reader)
+        return construct(values)
+
+    return write, read
+
+
+def _field(annotation) -> tuple[Writer, ReaderFunction]:
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) != 1:
+            raise TypeError(f"Can't encode union {annotation}")
+        return _optional_field(_field(args[0]))
+
+    if annotation is ConnectFour:
+        return _write_board, _read_board
+    if isinstance(annotation, type) and issubclass(annotation, IntEnum):
+        return _enum_field(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _model_field(annotation)
+    if annotation is bool:
+        return _write_bool, _read_bool
+    if annotation is int:
+        return _struct_field(I32)
+    if annotation is float:
+        return _struct_field(F64)
+    if annotation is str:
+        return _write_str, _read_str
+    if annotation is uuid.UUID:
+        return _write_uuid, _read_uuid
+    if annotation is tuple or origin is tuple:
+        return _write_tuple, _read_tuple
+
+    raise TypeError(f"Can't encode fields of type {annotation}")
+
+
+class BinaryCodec:
+    """Length prefixed binary frames laid out from each packet's field annotations.
+
+    A frame is a little endian ``u16`` length followed by the payload: one signed
+    byte for the :class:`Packets` type, then every field in declaration order with a
+    fixed width encoding (``i32`` ints, ``u16`` length prefixed strings, 16 byte UUIDs,
+    a presence byte before optional values) and boards packed at 2 bits per cell.
+    Decoding builds the models with ``model_construct`` so no pydantic validation runs.
+    """
+
+    encoding = Encoding.BINARY
+
+    def __init__(self):
+        self._fields: dict[Packets, tuple[Writer, ReaderFunction]] = {}
+
+    def _packet_field(self, packet_type: Packets) -> tuple[Writer, ReaderFunction]:
+        if packet_type not in self._fields:
+            packet_class = PACKET_MAPPING.get(packet_type)
+            if packet_class is None:
+                raise ValueError("packet_type not included in PACKET_MAPPING")
+            self._fields[packet_type] = _model_field(packet_class, skip=("packet_type",))
+        return self._fields[packet_type]
+
+    def encode(self, packet: Packet) -> bytes:
+        write, _ = self._packet_field(packet.packet_type)
+
+        out = bytearray(LENGTH.size)
+        out += I8.pack(packet.packet_type)
+        write(out, packet)
+
+        if len(out) - LENGTH.size > 0xFFFF:
+            raise ValueError("Packet is too large for a binary frame")
+        LENGTH.pack_into(out, 0, len(out) - LENGTH.size)
+        return bytes(out)
+
+    def decode(self, data: bytes) -> Packet:
+        reader = Reader(data)
+        try:
+            packet_type = Packets(reader.unpack(I8))
+            _, read = self._packet_field(packet_type)
+            packet = read(reader)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Packet is not valid binary: {e}")
+
+        if reader.offset != len(data):
+            raise ValueError("Packet has trailing data")
+        return packet
+
+    async def read_frame(self, reader: asyncio.StreamReader) -> bytes:
+        """Payload of the next frame, or empty bytes once the connection is closed."""
+        try:
+            (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            return await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return b""
+
+
+Codec = JsonCodec | BinaryCodec
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+
+CODECS = {
+    Encoding.JSON: JSON_CODEC,
+    Encoding.BINARY: BINARY_CODEC,
+}
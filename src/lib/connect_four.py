@@ -1,5 +1,5 @@
 from enum import IntEnum
-from typing import Optional
+from typing import NamedTuple, Optional
 from pydantic import BaseModel
 
 
@@ -26,23 +26,44 @@ class ConnectCell(IntEnum):
 
 Board = list[list[ConnectCell]]
 
+# Number of pieces in a line needed to win
+CONNECT = 4
+
+# Row/col steps for the horizontal, vertical and both diagonal lines through a cell
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1))
+
+
+class DropResult(NamedTuple):
+    # Row the piece landed in
+    row: int
+    # Color that completed a line with this move, if any
+    winner: ConnectCell | None
+    # Board is full and nobody won
+    draw: bool
+
 
 class ConnectFour(BaseModel):
     rows: int
     cols: int
     board: Board
+    # Number of occupied cells, kept up to date by set_piece so draws are O(1)
+    moves: int = 0
 
     def __init__(
         self,
         rows: int = 6,
         cols: int = 7,
         board: Board = None,
+        moves: int | None = None,
         **args,
     ) -> None:
         if board is None:
             board = [[ConnectCell.EMPTY for _ in range(rows)] for _ in range(cols)]
 
-        super().__init__(rows=rows, cols=cols, board=board, **args)
+        if moves is None:
+            moves = sum(cell != ConnectCell.EMPTY for column in board for cell in column)
+
+        super().__init__(rows=rows, cols=cols, board=board, moves=moves, **args)
 
     def __rich__(self):
         from rich.table import Table
@@ -72,12 +93,47 @@ class ConnectFour(BaseModel):
         if col >= self.cols:
             raise IndexError(f"Attempted to set col index {col} in a board with {self.cols}")
 
+        previous = self.board[col][row]
+        if previous == ConnectCell.EMPTY and color != ConnectCell.EMPTY:
+            self.moves += 1
+        elif previous != ConnectCell.EMPTY and color == ConnectCell.EMPTY:
+            self.moves -= 1
+
         self.board[col][row] = color
 
-    def drop_piece(self, col: int, color: ConnectCell) -> bool:
-        for i in range(self.rows):
-            if self.get_piece(i, col) == ConnectCell.EMPTY:
-                self.set_piece(i, col, color)
+    def can_play(self, col: int) -> bool:
+        return self.get_piece(self.rows - 1, col) == ConnectCell.EMPTY
+
+    def drop_piece(self, col: int, color: ConnectCell) -> DropResult | None:
+        for row in range(self.rows):
+            if self.get_piece(row, col) == ConnectCell.EMPTY:
+                self.set_piece(row, col, color)
+
+                winner = color if self.is_winning_cell(row, col) else None
+                return DropResult(row, winner, winner is None and self.moves == self.rows * self.cols)
+        return None
+
+    def _run_length(self, row: int, col: int, row_step: int, col_step: int, color: ConnectCell) -> int:
+        length = 0
+        row, col = row + row_step, col + col_step
+        while 0 <= row < self.rows and 0 <= col < self.cols and self.board[col][row] == color:
+            length += 1
+            row, col = row + row_step, col + col_step
+        return length
+
+    def is_winning_cell(self, row: int, col: int) -> bool:
+        """Check only the four lines passing through (row, col) for a connect of that cell's color."""
+        color = self.get_piece(row, col)
+        if color == ConnectCell.EMPTY:
+            return False
+
+        for row_step, col_step in DIRECTIONS:
+            length = (
+                1
+                + self._run_length(row, col, row_step, col_step, color)
+                + self._run_length(row, col, -row_step, -col_step, color)
+            )
+            if length >= CONNECT:
                 return True
         return False
 
@@ -96,8 +152,12 @@ class ConnectFour(BaseModel):
                 if row + 3 < self.rows and all(self.get_piece(row + i, col) == piece for i in range(4)):
                     return piece
 
-                if row + 3 < self.rows and col + 3 < self.cols and all(self.get_piece(row + i, col + i) for i in range(4)):
+                if (
+                    row + 3 < self.rows
+                    and col + 3 < self.cols
+                    and all(self.get_piece(row + i, col + i) == piece for i in range(4))
+                ):
                     return piece
 
-                if row - 3 < self.rows and col + 3 < self.cols and all(self.get_piece(row - i, col + i) for i in range(4)):
+                if row - 3 >= 0 and col + 3 < self.cols and all(self.get_piece(row - i, col + i) == piece for i in range(4)):
                     return piece
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from uuid import UUID
-from lib.connect_four import ConnectFour, ConnectCell
+from lib.connect_four import ConnectFour, ConnectCell, DropResult
 from typing import Optional
 from enum import IntEnum
 import asyncio
@@ -34,3 +34,14 @@ class Game(BaseModel):
     yellow_player: Optional[Player]
     turn: UUID | None
     board: ConnectFour
+    # Number of moves applied by the server, MoveApplied packets carry it so clients can spot missed moves
+    seq: int = 0
+
+    def play(self, index: int) -> tuple[ConnectCell, DropResult | None]:
+        """Drop the piece of the player to move in a column and pass the turn, the column should be playable."""
+        color = ConnectCell.RED if self.turn == self.red_player.id else ConnectCell.YELLOW
+        result = self.board.drop_piece(index, color)
+
+        self.turn = self.yellow_player.id if color == ConnectCell.RED else self.red_player.id
+        self.seq += 1
+        return color, result
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import secrets
+import struct
+import zlib
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from pathlib import Path
+from typing import BinaryIO
+
+from loguru import logger
+
+from lib.codec import BINARY_CODEC, LENGTH, U16
+from lib.data import Game
+from lib.packets import SyncGame
+
+MAGIC = b"C4SN"
+VERSION = 1
+
+# magic, version, first journal segment the snapshot doesn't include
+SNAPSHOT_HEADER = struct.Struct("<4sBxxxI")
+# length of the body, crc32 of the kind byte and body
+RECORD_HEADER = struct.Struct("<II")
+# column, the game's seq after the move
+MOVE = struct.Struct("<BI")
+
+# Games encoded before the snapshot yields to the event loop
+SNAPSHOT_CHUNK = 256
+
+
+class Record(IntEnum):
+    # The game as it started, a binary SyncGame
+    START = 0
+    # Game id, column and seq of a move
+    MOVE = 1
+    # Game id of a game that ended or was removed
+    END = 2
+
+
+def _game_id(game_id: str) -> bytes:
+    data = game_id.encode()
+    return U16.pack(len(data)) + data
+
+
+def _encode_game(game: Game) -> bytes:
+    return BINARY_CODEC.encode(SyncGame(game=game))[LENGTH.size :]
+
+
+def _decode_game(data: bytes) -> Game:
+    return BINARY_CODEC.decode(data).game
+
+
+def read_records(data: bytes) -> Iterator[tuple[Record, bytes]]:
+    """Every intact record, stopping at the first torn or corrupt one a crash left behind."""
+    offset = 0
+    while offset < len(data):
+        if offset + RECORD_HEADER.size + 1 > len(data):
+            logger.warning("Journal ends in a torn record, ignoring {} bytes", len(data) - offset)
+            return
+
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        record = data[start : start + 1 + length]
+        if len(record) != 1 + length or zlib.crc32(record) != crc:
+            logger.warning("Journal record at {} is corrupt, ignoring {} bytes", offset, len(data) - offset)
+            return
+
+        yield Record(record[0]), record[1:]
+        offset = start + 1 + length
+
+
+def replay(games: dict[str, Game], kind: Record, body: bytes):
+    """Apply a record to ``games``, moves that are already part of a game are skipped."""
+    if kind == Record.START:
+        game = _decode_game(body)
+        games[game.game_id] = game
+        return
+
+    (length,) = U16.unpack_from(body)
+    game_id = body[U16.size : U16.size + length].decode()
+    if kind == Record.END:
+        games.pop(game_id, None)
+        return
+
+    index, seq = MOVE.unpack_from(body, U16.size + length)
+    game = games.get(game_id)
+    if game is None or seq != game.seq + 1:
+        return
+
+    _, result = game.play(index)
+    if result is None or result.winner or result.draw:
+        # Finished games aren't restored, a full column means the journal doesn't match the game
+        games.pop(game_id)
+
+
+class Journal:
+    """Append-only log of started games, moves and ended games, plus snapshots of every live game.
+
+    Appending only adds the record to a buffer. A writer task hands the buffer to a thread
+    that writes and fsyncs it, and everything appended during that fsync is committed by
+    the next one, so the event loop never waits on the disk. A crash loses at most the
+    records that weren't fsynced yet.
+
+    The directory holds a ``snapshot`` and numbered journal segments. A snapshot names the
+    first segment it doesn't include, taking one starts a new segment and deletes the rest.
+    Replaying a move checks the game's seq, so a game encoded after its segment was
+    closed isn't moved twice.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.segment = 0
+        self.pending = bytearray()
+        # Records appended since the last snapshot
+        self.records = 0
+
+        # One thread, so batches and snapshots hit the disk in the order they were submitted
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="journal")
+        # Only used from the executor's thread
+        self._file: BinaryIO | None = None
+        self._file_segment = -1
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _path(self, segment: int) -> Path:
+        return self.directory / f"journal-{segment:08d}.log"
+
+    def _segments(self) -> list[int]:
+        return sorted(int(path.stem.removeprefix("journal-")) for path in self.directory.glob("journal-*.log"))
+
+    def recover(self) -> list[Game]:
+        """Games that were live when the journal was last written, call before appending anything."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        games: dict[str, Game] = {}
+
+        first = 0
+        snapshot = self.directory / "snapshot"
+        if snapshot.exists():
+            data = snapshot.read_bytes()
+            magic, version, first = SNAPSHOT_HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{snapshot} is not a version {VERSION} snapshot")
+
+            offset = SNAPSHOT_HEADER.size
+            while offset < len(data):
+                (length,) = LENGTH.unpack_from(data, offset)
+                game = _decode_game(data[offset + LENGTH.size : offset + LENGTH.size + length])
+                games[game.game_id] = game
+                offset += LENGTH.size + length
+
+        segments = self._segments()
+        for segment in segments:
+            if segment >= first:
+                for kind, body in read_records(self._path(segment).read_bytes()):
+                    replay(games, kind, body)
+
+        # Never append to a segment that may end in a torn record
+        self.segment = max([first, *(segment + 1 for segment in segments)])
+        return list(games.values())
+
+    def secret(self) -> bytes:
+        """Key resume tokens are signed with, kept next to the journal so tokens outlive a restart."""
+        path = self.directory / "secret"
+        if path.exists():
+            return path.read_bytes()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        secret = secrets.token_bytes(32)
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(secret)
+        return secret
+
+    def _append(self, kind: Record, body: bytes):
+        record = bytes((kind,)) + body
+        self.pending += RECORD_HEADER.pack(len(body), zlib.crc32(record))
+        self.pending += record
+        self.records += 1
+        self._ready.set()
+
+    def started(self, game: Game):
+        self._append(Record.START, _encode_game(game))
+
+    def moved(self, game: Game, index: int):
+        self._append(Record.MOVE, _game_id(game.game_id) + MOVE.pack(index, game.seq))
+
+    def ended(self, game_id: str):
+        self._append(Record.END, _game_id(game_id))
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write and fsync everything appended so far."""
+        if not self.pending:
+            return
+
+        data, self.pending = bytes(self.pending), bytearray()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write, self.segment, data)
+
+    def _write(self, segment: int, data: bytes):
+        if self._file_segment != segment:
+            self._close_file()
+            self._file = open(self._path(segment), "ab")
+            self._file_segment = segment
+
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_segment = -1
+
+    async def snapshot(self, games: list[Game]):
+        """Write the started games to a new snapshot and delete the journal it replaces.
+
+        Encoding yields to the event loop every few games, so a large snapshot doesn't stall it.
+        """
+        data, self.pending = bytes(self.pending), bytearray()
+        covered = self.segment
+        self.segment += 1
+        self.records = 0
+
+        frames = bytearray()
+        for i, game in enumerate(games):
+            if game.turn is not None:
+                frames += BINARY_CODEC.encode(SyncGame(game=game))
+            if i % SNAPSHOT_CHUNK == SNAPSHOT_CHUNK - 1:
+                await asyncio.sleep(0)
+
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._snapshot, covered, data, bytes(frames))
+
+    def _snapshot(self, covered: int, data: bytes, frames: bytes):
+        if data:
+            self._write(covered, data)
+        self._close_file()
+
+        temporary = self.directory / "snapshot.tmp"
+        with open(temporary, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(MAGIC, VERSION, covered + 1))
+            file.write(frames)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.directory / "snapshot")
+
+        # Make the rename durable before the segments it replaces are gone
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+        for segment in self._segments():
+            if segment <= covered:
+                self._path(segment).unlink()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_file)
+        self._executor.shutdown()
@@ -0,0 +1,64 @@
+import queue
+import sys
+import threading
+from typing import TextIO
+
+from loguru import logger
+
+FORMAT = "<green>{time}</green> <level>{level}</level> - {message}"
+
+
+class Enabled:
+    """Whether anything logged at debug level is kept, check it before logging on the packet path.
+
+    A call loguru drops still costs ten times an attribute lookup, and ``opt(lazy=True)``
+    costs more still as it creates a logger on every call.
+    """
+
+    __slots__ = ("debug",)
+
+    def __init__(self):
+        self.debug = False
+
+
+enabled = Enabled()
+
+
+class QueuedSink:
+    """Hands formatted messages to a thread that writes them, so a slow terminal, pipe or disk never blocks the event loop.
+
+    loguru's own ``enqueue=True`` pickles every record through a pipe for other processes, which costs more than the write.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, message: str):
+        self.queue.put(message)
+
+    def run(self):
+        while (message := self.queue.get()) is not None:
+            self.stream.write(message)
+            if self.queue.empty():
+                self.stream.flush()
+
+    def stop(self):
+        """Write everything still queued, loguru calls this when the sink is removed and at exit."""
+        self.queue.put(None)
+        self.thread.join()
+
+
+def configure(level: str | int = "INFO", queued: bool = False, json: bool = False):
+    """Log to stderr from ``level`` up, ``json`` writes every record with its fields as a line of JSON."""
+    if isinstance(level, str):
+        level = level.upper()
+
+    logger.remove()
+    sink = QueuedSink(sys.stderr) if queued else sys.stderr
+    logger.add(sink, format=FORMAT, level=level, colorize=not json, serialize=json)
+
+    no = level if isinstance(level, int) else logger.level(level).no
+    enabled.debug = no <= logger.level("DEBUG").no
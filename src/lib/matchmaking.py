@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+
+class Ticket:
+    __slots__ = ("bucket", "enqueued", "key", "value")
+
+    def __init__(self, key: Hashable, bucket: int, enqueued: float, value: Any):
+        self.key = key
+        self.bucket = bucket
+        self.enqueued = enqueued
+        # Whatever the caller needs once the ticket is paired
+        self.value = value
+
+
+class Matchmaker:
+    """Pairs waiting players from a FIFO queue per rating bucket.
+
+    Joining pairs straight away with whoever waited longest in the same bucket, so a
+    join, a pairing and leaving the queue are all O(1) dict operations. A ticket
+    that waited ``widen_after`` seconds may also be paired with the neighbouring
+    buckets, one more bucket either side for every further ``widen_after`` seconds,
+    once :meth:`widen` is called.
+    """
+
+    def __init__(self, widen_after: float = 10.0):
+        self.widen_after = widen_after
+        self.queues: dict[int, OrderedDict[Hashable, Ticket]] = {}
+        self.tickets: dict[Hashable, Ticket] = {}
+
+    def __len__(self) -> int:
+        return len(self.tickets)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.tickets
+
+    def join(self, key: Hashable, bucket: int = 0, value: Any = None, now: float | None = None) -> Ticket | None:
+        """Queue ``key``, returns the ticket it was paired with if anyone was waiting in its bucket."""
+        if key in self.tickets:
+            raise ValueError("Already queued")
+
+        if queue := self.queues.get(bucket):
+            return self._pop(queue)
+
+        ticket = Ticket(key, bucket, time.monotonic() if now is None else now, value)
+        self.queues.setdefault(bucket, OrderedDict())[key] = ticket
+        self.tickets[key] = ticket
+        return None
+
+    def leave(self, key: Hashable) -> Ticket | None:
+        if (ticket := self.tickets.pop(key, None)) is None:
+            return None
+
+        queue = self.queues[ticket.bucket]
+        del queue[key]
+        if not queue:
+            del self.queues[ticket.bucket]
+        return ticket
+
+    def _head(self, bucket: int) -> Ticket:
+        queue = self.queues[bucket]
+        return queue[next(iter(queue))]
+
+    def _pop(self, queue: OrderedDict[Hashable, Ticket]) -> Ticket:
+        _, ticket = queue.popitem(last=False)
+        del self.tickets[ticket.key]
+        if not queue:
+            del self.queues[ticket.bucket]
+        return ticket
+
+    def widen(self, now: float | None = None) -> list[tuple[Ticket, Ticket]]:
+        """Pair tickets that waited long enough with the closest bucket in reach, longest waiting first."""
+        now = time.monotonic() if now is None else now
+        pairs = []
+
+        for ticket in sorted((self._head(bucket) for bucket in self.queues), key=lambda ticket: ticket.enqueued):
+            if ticket.key not in self.tickets:
+                # Already paired with an earlier ticket
+                continue
+
+            reach = int((now - ticket.enqueued) // self.widen_after)
+            if reach == 0:
+                break
+
+            buckets = [bucket for bucket in self.queues if bucket != ticket.bucket and abs(bucket - ticket.bucket) <= reach]
+            if not buckets:
+                continue
+
+            closest = min(buckets, key=lambda bucket: (abs(bucket - ticket.bucket), self._head(bucket).enqueued))
+            partner = self._pop(self.queues[closest])
+            pairs.append((self.leave(ticket.key), partner))
+
+        return pairs
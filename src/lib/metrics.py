@@ -0,0 +1,169 @@
+import asyncio
+import bisect
+import math
+from collections.abc import Callable, Iterator
+
+from loguru import logger
+
+# Upper bounds of the default histogram buckets in seconds, from 10µs to 1s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Longest request line and headers read from a scraper
+MAX_REQUEST = 8 * 1024
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # Metrics without labels are reported from the start, labelled ones once a label was seen
+        self.values: dict[tuple, float] = {} if labels else {(): 0}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), function: Callable[[], float] | None = None):
+        super().__init__(name, help, labels)
+        # Read when scraped instead of being kept up to date
+        self.function = function
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.function is not None:
+            yield f"{self.name} {_number(self.function())}"
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Observations per bucket, only summed up into cumulative counts when scraped
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self) -> Iterator[str]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{self.name}_bucket{{le="{_number(bound)}"}} {total}'
+        yield f"{self.name}_sum {_number(self.sum)}"
+        yield f"{self.name}_count {total}"
+
+
+class NullMetric:
+    """Stands in for every metric while metrics are disabled, so instrumented code costs a no-op call."""
+
+    def inc(self, *labels, amount: float = 1):
+        pass
+
+    def dec(self, *labels, amount: float = 1):
+        pass
+
+    def set(self, value: float, *labels):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+NULL_METRIC = NullMetric()
+
+
+class Metrics:
+    """Metrics of one process, exposed in Prometheus' text format.
+
+    A disabled instance hands out :data:`NULL_METRIC` for everything, instrumented
+    code doesn't have to check whether metrics are on.
+    """
+
+    def __init__(self, enabled: bool = True, namespace: str = "connectfour"):
+        self.enabled = enabled
+        self.namespace = namespace
+        self.metrics: list[Counter | Gauge | Histogram] = []
+
+    def _add(self, metric):
+        if not self.enabled:
+            return NULL_METRIC
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}_total", help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = (), function: Callable[[], float] | None = None) -> Gauge:
+        return self._add(Gauge(f"{self.namespace}_{name}", help, labels, function))
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", help, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    async def handle_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        method, _, rest = request.partition(b" ")
+        path = rest.split(b" ", 1)[0]
+        if method != b"GET" or path not in (b"/", b"/metrics"):
+            status, body, content_type = "404 Not Found", b"Not found\n", "text/plain"
+        else:
+            status, body, content_type = "200 OK", self.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+
+        headers = f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+        writer.write(f"HTTP/1.1 {status}\r\n{headers}\r\n".encode() + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def serve(self, host: str, port: int) -> asyncio.Server:
+        """Serve the metrics over HTTP on ``host:port`` for Prometheus to scrape."""
+        server = await asyncio.start_server(self.handle_scrape, host, port, limit=MAX_REQUEST)
+        logger.info("Serving metrics on http://{}:{}/metrics", *server.sockets[0].getsockname()[:2])
+        return server
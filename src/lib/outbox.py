@@ -0,0 +1,209 @@
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from enum import StrEnum
+
+from loguru import logger
+
+from lib.codec import JSON_CODEC, Codec
+from lib.logs import enabled
+
+# Seconds a closing connection gets to flush its queue before it is aborted
+CLOSE_TIMEOUT = 5.0
+
+# asyncio only keeps weak references to tasks, outboxes that were closed and forgotten
+# by the server must stay alive until they finished flushing
+_running: set[asyncio.Task] = set()
+
+
+class SlowClientPolicy(StrEnum):
+    # Abort the connection, the client has to connect again
+    DISCONNECT = "disconnect"
+    # Throw away queued state updates and send the latest state once the client catches up
+    COALESCE = "coalesce"
+    # Throw away state updates until the client catches up, it asks for a sync when it notices the gap
+    DROP = "drop"
+
+
+# Queue entry standing for the latest state, encoded when it is written
+SNAPSHOT = (None, True)
+
+
+class Outbox:
+    """Encoded packets waiting to be written to one connection by its own task.
+
+    :meth:`put` never blocks. While the connection keeps up packets are written
+    straight to the transport, otherwise they wait in a queue the task drains with
+    ``await writer.drain()``. A connection is behind once ``limit`` packets or
+    ``high_water`` bytes are waiting, ``policy`` then decides what happens to it.
+    Coalescing needs ``snapshot``, which returns the latest state encoded with the
+    outbox's codec, without it the packets are dropped instead.
+
+    Only packets put as ``droppable`` (state updates a snapshot replaces) are ever
+    dropped or coalesced. Anything else, like a response or the end of a game, is
+    queued regardless and keeps its place relative to the snapshot.
+    """
+
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        codec: Codec = JSON_CODEC,
+        snapshot: Callable[[Codec], bytes] | None = None,
+        limit: int | None = None,
+        high_water: int = 64 * 1024,
+        policy: SlowClientPolicy = SlowClientPolicy.COALESCE,
+    ):
+        self.writer = writer
+        self.codec = codec
+        self.snapshot = snapshot
+        self.limit = limit
+        self.high_water = high_water
+        self.policy = policy
+
+        # Encoded packets and whether they may be dropped, SNAPSHOT entries are encoded when written
+        self.queue: deque[tuple[bytes | None, bool]] = deque()
+        self.queued_bytes = 0
+        self.closing = False
+        self.draining = False
+        # Times the connection fell behind and its queue was replaced by a snapshot or dropped
+        self.coalesced = 0
+        self.dropped = 0
+
+        self.transport = getattr(writer, "transport", None)
+        if self.transport is not None:
+            # Keep the transport's own buffer under the same mark so drain() pushes back in time
+            self.transport.set_write_buffer_limits(high=high_water)
+
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._abort_handle: asyncio.TimerHandle | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        _running.add(self._task)
+        self._task.add_done_callback(_running.discard)
+
+    @property
+    def stale(self) -> bool:
+        """Whether the latest state is waiting to be sent in place of dropped updates."""
+        return SNAPSHOT in self.queue
+
+    def _buffered(self) -> int:
+        return self.transport.get_write_buffer_size() if self.transport is not None else 0
+
+    def backlog(self) -> int:
+        """Bytes waiting to be sent, in the queue and in the transport's buffer."""
+        return self.queued_bytes + self._buffered()
+
+    def _behind(self) -> bool:
+        if self.limit is not None and len(self.queue) >= self.limit:
+            return True
+        return self.backlog() >= self.high_water
+
+    def put(self, data: bytes, droppable: bool = False):
+        """Queue ``data``, which the slow client policy may throw away if ``droppable``."""
+        if self.closing:
+            return
+
+        if not (self.draining or self.queue) and self._buffered() < self.high_water:
+            # Nothing waiting and the transport keeps up, skip the queue
+            self.writer.write(data)
+            self._ready.set()
+            return
+
+        if (droppable or self.policy == SlowClientPolicy.DISCONNECT) and self._behind():
+            self.fall_behind()
+            return
+
+        self.queue.append((data, droppable))
+        self.queued_bytes += len(data)
+        self._ready.set()
+
+    def fall_behind(self):
+        if enabled.debug:
+            logger.debug("{addr} fell behind, {policy}", addr=self.writer.get_extra_info("peername"), policy=self.policy)
+        if self.policy == SlowClientPolicy.DISCONNECT:
+            return self.abort()
+
+        if self.policy == SlowClientPolicy.COALESCE and self.snapshot is not None:
+            self._replace_updates(snapshot=True)
+            self.coalesced += 1
+        else:
+            self._replace_updates(snapshot=False)
+            self.dropped += 1
+        self._ready.set()
+
+    def _replace_updates(self, snapshot: bool):
+        """Take the droppable packets out of the queue, putting one snapshot where the first of them was."""
+        kept = deque()
+        for entry in self.queue:
+            if not entry[1]:
+                kept.append(entry)
+            elif snapshot:
+                kept.append(SNAPSHOT)
+                snapshot = False
+        if snapshot:
+            kept.append(SNAPSHOT)
+
+        self.queue = kept
+        self.queued_bytes = sum(len(data) for data, _ in kept if data is not None)
+
+    def resync(self):
+        """Send the full state next, dropping the updates it already includes."""
+        if self.snapshot is None:
+            return
+
+        self._replace_updates(snapshot=True)
+        self._ready.set()
+
+    def close(self):
+        """Write whatever is queued then close the connection, aborting it if that takes too long."""
+        if self.closing:
+            return
+
+        self.closing = True
+        self._ready.set()
+        if self._task is None:
+            self.start()
+        self._abort_handle = asyncio.get_running_loop().call_later(CLOSE_TIMEOUT, self.abort)
+
+    def abort(self):
+        """Drop the connection straight away, even if the peer stopped reading."""
+        self.closing = True
+        self.cancel()
+        if self.transport is not None:
+            self.transport.abort()
+        else:
+            self.writer.close()
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+
+                self.draining = True
+                # Flush anything put() wrote straight to the transport
+                await self.writer.drain()
+                while self.queue:
+                    data, _ = self.queue.popleft()
+                    if data is None:
+                        data = self.snapshot(self.codec)
+                    else:
+                        self.queued_bytes -= len(data)
+                    self.writer.write(data)
+                    await self.writer.drain()
+                self.draining = False
+
+                if self.closing:
+                    break
+        except (ConnectionError, RuntimeError) as e:
+            logger.debug("Outbox for {} stopped: {}", self.writer.get_extra_info("peername"), e)
+        finally:
+            if self._abort_handle is not None:
+                self._abort_handle.cancel()
+            self.writer.close()
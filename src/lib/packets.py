@@ -1,6 +1,9 @@
 from enum import IntEnum
 from pydantic import BaseModel, Field
 from lib.data import Player, Game
+from lib.connect_four import ConnectCell
+from typing import Optional
+from uuid import UUID
 import json
 
 
@@ -13,6 +16,22 @@ class Packets(IntEnum):
     MOVE = 4
     GAME_OVER = 5
     CONNECT_LOST = 6
+    MOVE_APPLIED = 7
+    SYNC_REQUEST = 8
+    SPECTATE = 9
+    SPECTATE_RESPONSE = 10
+    MATCHMAKE = 11
+    RESUME = 12
+    RESUME_RESPONSE = 13
+    PING = 14
+    PONG = 15
+
+
+class Encoding(IntEnum):
+    # Newline delimited JSON, every connection starts with it
+    JSON = 0
+    # Length prefixed frames from lib.codec
+    BINARY = 1
 
 
 class Packet(BaseModel):
@@ -49,6 +68,10 @@ class ConnectRequest(Packet):
     game_id: str
     # Player name
     username: str
+    # Play against a server side bot instead of waiting for a second player
+    bot: bool = False
+    # Encoding the client wants for every packet after the ConnectResponse
+    encoding: Encoding = Encoding.JSON
 
 
 class ConnectResponse(Packet):
@@ -56,6 +79,10 @@ class ConnectResponse(Packet):
     # Clients player
     player: Player
     game: Game
+    # Encoding the server switched the connection to, JSON when the requested one isn't supported
+    encoding: Encoding = Encoding.JSON
+    # Secret that lets a new connection take this player's place after the connection drops
+    resume_token: Optional[str] = None
 
 
 class Error(Packet):
@@ -78,13 +105,86 @@ class Move(Packet):
 class GameOver(Packet):
     packet_type: Packets = Packets.GAME_OVER
     game: Game
-    winner: Player
+    # None when the game ended in a draw
+    winner: Optional[Player] = None
 
 
 class ConnectionLost(Packet):
     packet_type: Packets = Packets.CONNECT_LOST
 
 
+class MoveApplied(Packet):
+    packet_type: Packets = Packets.MOVE_APPLIED
+    game_id: str
+    # Column and row the piece landed in
+    index: int
+    row: int
+    color: ConnectCell
+    # Player to move next
+    turn: UUID
+    # Game.seq after this move, anything but the client's seq + 1 means a move was missed
+    seq: int
+
+
+class SyncRequest(Packet):
+    packet_type: Packets = Packets.SYNC_REQUEST
+    game_id: str
+
+
+class Spectate(Packet):
+    packet_type: Packets = Packets.SPECTATE
+    # Lobby to watch
+    game_id: str
+    # Encoding the client wants for every packet after the SpectateResponse
+    encoding: Encoding = Encoding.JSON
+
+
+class Matchmake(Packet):
+    """Join the queue for a game against whoever else is waiting, answered by a ConnectResponse once paired."""
+
+    packet_type: Packets = Packets.MATCHMAKE
+    username: str
+    # Players are paired within a bucket first, then with neighbouring buckets the longer they wait
+    bucket: int = 0
+    encoding: Encoding = Encoding.JSON
+
+
+class SpectateResponse(Packet):
+    packet_type: Packets = Packets.SPECTATE_RESPONSE
+    game: Game
+    encoding: Encoding = Encoding.JSON
+
+
+class Resume(Packet):
+    """Take a player's place again after its connection dropped, answered by a ResumeResponse."""
+
+    packet_type: Packets = Packets.RESUME
+    game_id: str
+    # resume_token from the ConnectResponse
+    token: str
+    # Game.seq the client last saw, it is sent the moves after it or the whole game when they're gone or it has None
+    seq: Optional[int] = None
+    encoding: Encoding = Encoding.JSON
+
+
+class ResumeResponse(Packet):
+    """Always JSON, followed by the MoveApplied packets the client missed or a SyncGame."""
+
+    packet_type: Packets = Packets.RESUME_RESPONSE
+    player: Player
+    encoding: Encoding = Encoding.JSON
+
+
+class Ping(Packet):
+    """Sent to a connection that went quiet, answered by a Pong to show it is still there."""
+
+    packet_type: Packets = Packets.PING
+
+
+class Pong(Packet):
+    packet_type: Packets = Packets.PONG
+
+
 PACKET_MAPPING = {
     Packets.ERROR: Error,
     Packets.CONNECT_REQUEST: ConnectRequest,
@@ -94,4 +194,13 @@ PACKET_MAPPING = {
     Packets.MOVE: Move,
     Packets.GAME_OVER: GameOver,
     Packets.CONNECT_LOST: ConnectionLost,
+    Packets.MOVE_APPLIED: MoveApplied,
+    Packets.SYNC_REQUEST: SyncRequest,
+    Packets.SPECTATE: Spectate,
+    Packets.SPECTATE_RESPONSE: SpectateResponse,
+    Packets.MATCHMAKE: Matchmake,
+    Packets.RESUME: Resume,
+    Packets.RESUME_RESPONSE: ResumeResponse,
+    Packets.PING: Ping,
+    Packets.PONG: Pong,
 }
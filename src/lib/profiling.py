@@ -0,0 +1,217 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Protocol
+
+from loguru import logger
+
+# Phases a packet goes through on the server, in order
+PHASES = ("read", "parse", "handle", "serialize", "write")
+
+
+class PacketTrace:
+    """Seconds one packet spent in each phase, serialize and write include everything sent in response."""
+
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    def time(self, phase: str, function: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.phases[phase] += time.perf_counter() - started
+
+    def handled(self) -> float:
+        """Seconds the server spent on the packet, reading it includes waiting for the client and isn't counted."""
+        return sum(seconds for phase, seconds in self.phases.items() if phase != "read")
+
+
+# Trace of the packet the current connection's task is handling, sends made while handling it are added to it
+TRACE: ContextVar[PacketTrace | None] = ContextVar("trace", default=None)
+
+
+class SlowPacketTracer:
+    """Logs every packet the server spent more than ``threshold`` seconds on, with the time of each phase.
+
+    Without a threshold no packet is traced.
+    """
+
+    def __init__(self, threshold: float | None = None):
+        self.threshold = threshold
+
+    def start(self) -> PacketTrace | None:
+        if self.threshold is None:
+            return None
+
+        trace = PacketTrace()
+        TRACE.set(trace)
+        return trace
+
+    def finish(self, trace: PacketTrace | None, addr: tuple, packet) -> bool:
+        """Log the trace if the packet was slow and return whether it was."""
+        if trace is None:
+            return False
+
+        TRACE.set(None)
+        if packet is None or trace.handled() < self.threshold:
+            return False
+
+        name = packet.packet_type.name if packet else "bad packet"
+        phases = " ".join(f"{phase} {seconds * 1000:.2f}ms" for phase, seconds in trace.phases.items())
+        logger.warning("Slow {} from {} took {:.2f}ms: {}", name, addr, trace.handled() * 1000, phases)
+        return True
+
+
+class ProfileHook(Protocol):
+    """Collects profiling data from :meth:`start` until :meth:`stop`."""
+
+    # File extension of what dump writes
+    suffix: str
+
+    def start(self): ...
+
+    def stop(self): ...
+
+    def dump(self, path: Path) -> str:
+        """Write the data to ``path`` and return a summary to log."""
+        ...
+
+
+class CProfileHook:
+    """Every call made on the event loop's thread, written as a pstats file."""
+
+    suffix = ".prof"
+
+    def __init__(self, top: int = 20):
+        self.top = top
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path: Path) -> str:
+        self.profile.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(self.profile, stream=summary).sort_stats("cumulative").print_stats(self.top)
+        return summary.getvalue()
+
+
+class StackSampler:
+    """The event loop thread's stack every ``interval`` seconds, written as folded stacks.
+
+    Sampling from another thread costs the loop far less than cProfile's hook on every
+    call. The output is what flamegraph.pl and speedscope read.
+    """
+
+    suffix = ".folded"
+
+    def __init__(self, interval: float = 0.001, top: int = 20):
+        self.interval = interval
+        self.top = top
+        self.stacks: Counter[str] = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.sample, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path: Path) -> str:
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.items()))
+
+        # Innermost frames are where the loop actually spent its time
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return "".join(f"{count / total:6.1%}  {frame}\n" for frame, count in leaves.most_common(self.top))
+
+
+PROFILERS: dict[str, Callable[[], ProfileHook]] = {
+    "cprofile": CProfileHook,
+    "sample": StackSampler,
+}
+
+
+class Profiler:
+    """Profiles the event loop for ``duration`` seconds whenever it is toggled, then dumps it to ``directory``.
+
+    Has to be created and toggled on the event loop's thread.
+    """
+
+    def __init__(self, directory: Path, duration: float = 30.0, kind: str = "cprofile"):
+        self.directory = directory
+        self.duration = duration
+        self.kind = kind
+        self.hook: ProfileHook | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.hook is not None
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self):
+        if self.running:
+            return
+
+        self.hook = PROFILERS[self.kind]()
+        self.hook.start()
+        self._timer = asyncio.get_running_loop().call_later(self.duration, self.stop)
+        logger.info("Profiling with {} for {}s", self.kind, self.duration)
+
+    def stop(self) -> Path | None:
+        """Stop profiling and dump what was collected, returns the file it was written to."""
+        if self.hook is None:
+            return None
+
+        hook, self.hook = self.hook, None
+        if self._timer is not None:
+            self._timer.cancel()
+        hook.stop()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.kind}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}{hook.suffix}"
+        summary = hook.dump(path)
+        logger.info("Wrote profile to {}\n{}", path, summary)
+        return path
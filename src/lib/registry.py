@@ -0,0 +1,78 @@
+import asyncio
+from uuid import UUID
+
+from lib.data import Game, Player
+
+
+class Session:
+    """A player's connection to the game it joined."""
+
+    __slots__ = ("addr", "game_id", "player_id", "writer")
+
+    def __init__(self, addr: tuple, writer: asyncio.StreamWriter, game_id: str, player_id: UUID):
+        self.addr = addr
+        self.writer = writer
+        self.game_id = game_id
+        self.player_id = player_id
+
+
+class Registry:
+    """Games by id, with their players' sessions indexed by player id and by connection address.
+
+    Every index is a plain dict and a game has at most two sessions, so joining,
+    looking up and removing a game with everything that points at it are all O(1).
+    Nothing outlives its game or connection, so the registry doesn't grow with uptime.
+    """
+
+    def __init__(self):
+        self.games: dict[str, Game] = {}
+        self.players: dict[UUID, Session] = {}
+        self.sessions: dict[tuple, Session] = {}
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def add_game(self, game: Game) -> Game:
+        if game.game_id in self.games:
+            raise ValueError(f"Game {game.game_id} already exists")
+
+        self.games[game.game_id] = game
+        return game
+
+    def join(self, game: Game, player: Player) -> Session:
+        """Index a player's connection to a game, bots have no connection and aren't indexed."""
+        if player.addr in self.sessions:
+            raise ValueError(f"{player.addr} already joined a game")
+
+        session = Session(player.addr, player._writer, game.game_id, player.id)
+        self.sessions[player.addr] = self.players[player.id] = session
+        return session
+
+    def session(self, addr: tuple) -> Session | None:
+        return self.sessions.get(addr)
+
+    def game_of(self, addr: tuple) -> Game | None:
+        if (session := self.sessions.get(addr)) is None:
+            return None
+        return self.games.get(session.game_id)
+
+    def leave(self, addr: tuple) -> Session | None:
+        """Forget a connection, its game is left alone."""
+        if (session := self.sessions.pop(addr, None)) is None:
+            return None
+
+        self.players.pop(session.player_id, None)
+        return session
+
+    def remove_game(self, game_id: str) -> Game | None:
+        """Forget a game and the sessions of both its players."""
+        if (game := self.games.pop(game_id, None)) is None:
+            return None
+
+        for player in (game.red_player, game.yellow_player):
+            if player is None or (session := self.players.get(player.id)) is None:
+                continue
+            if session.game_id == game_id:
+                del self.players[player.id]
+                self.sessions.pop(session.addr, None)
+        return game
@@ -0,0 +1,177 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.solver import SearchResult, Solver
+
+# Searches that can run at once, each owns one cancellation flag shared with the workers
+MAX_SEARCHES = 1024
+
+# Worker process state, set up once by _init_worker
+_cancel_flags = None
+_book = None
+_solvers: dict[tuple[int, int], Solver] = {}
+
+
+def _init_worker(cancel_flags, book_path: Path | None):
+    global _cancel_flags, _book
+    _cancel_flags = cancel_flags
+
+    if book_path is not None:
+        from lib.book import OpeningBook
+
+        _book = OpeningBook(book_path)
+
+
+def _worker_solver(rows: int, cols: int) -> Solver:
+    if (rows, cols) not in _solvers:
+        book = _book if _book is not None and (_book.rows, _book.cols) == (rows, cols) else None
+        _solvers[(rows, cols)] = Solver(rows, cols, book=book)
+    return _solvers[(rows, cols)]
+
+
+def _search_child(rows: int, cols: int, current: int, mask: int, slot: int, deadline: float | None) -> tuple[float, int, bool]:
+    """Score one root move from the opponent's point of view, runs inside a worker process.
+
+    ``deadline`` is a :func:`time.monotonic` time, the clock is shared by every process on the machine.
+    """
+    solver = _worker_solver(rows, cols)
+    if not solver.possible(mask):
+        # That move filled the board
+        return 0.0, 0, True
+
+    solver.should_stop = lambda: _cancel_flags[slot]
+    try:
+        time_budget = None if deadline is None else max(0.0, deadline - time.monotonic())
+        result = solver.search_position(current, mask, time_budget)
+    finally:
+        solver.should_stop = None
+    return result.score, result.depth, result.solved
+
+
+class SearchPool:
+    """Runs solver searches on every core without blocking the event loop.
+
+    The moves available at the root are split across a process pool and searched
+    in parallel, all against one deadline so a request takes its time budget however
+    many moves wait for a worker. Every search owns a slot in a
+    shared flag array the workers poll, so cancelling the awaiting task (or calling
+    :meth:`cancel`) stops the workers instead of leaving them searching for a game
+    that no longer exists.
+    """
+
+    def __init__(self, workers: int | None = None, book_path: Path | None = None):
+        context = multiprocessing.get_context("spawn")
+        self._cancel_flags = context.Array("b", MAX_SEARCHES, lock=False)
+        self._free_slots = list(range(MAX_SEARCHES))
+        self._slots: dict[str, int] = {}
+        self._solvers: dict[tuple[int, int], Solver] = {}
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._cancel_flags, book_path),
+        )
+
+    def _solver(self, rows: int, cols: int) -> Solver:
+        # Only used for move generation in this process, the table is kept tiny
+        if (rows, cols) not in self._solvers:
+            self._solvers[(rows, cols)] = Solver(rows, cols, table_size=1)
+        return self._solvers[(rows, cols)]
+
+    def fallback_move(self, board: ConnectFour | BitboardConnectFour, color: ConnectCell) -> int:
+        """Column to play without searching, from move ordering alone, for when the pool can't be used."""
+        solver = self._solver(board.rows, board.cols)
+        column = solver.forced_move(board, color)
+        if column is not None:
+            return column
+        return solver.column_of(solver.root_moves(*solver.position(board, color))[0])
+
+    def cancel(self, key: str):
+        if (slot := self._slots.get(key)) is not None:
+            self._cancel_flags[slot] = 1
+
+    def _release(self, slot: int):
+        self._cancel_flags[slot] = 0
+        self._free_slots.append(slot)
+
+    def _release_when_done(self, slot: int, futures: list[Future]):
+        loop = asyncio.get_running_loop()
+        remaining = len(futures)
+
+        def done(_):
+            nonlocal remaining
+            remaining -= 1
+            if remaining == 0:
+                try:
+                    loop.call_soon_threadsafe(self._release, slot)
+                except RuntimeError:
+                    # The loop that started the search is closed so nothing else can touch the slot
+                    self._release(slot)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    async def search(
+        self,
+        key: str,
+        board: ConnectFour | BitboardConnectFour,
+        color: ConnectCell,
+        time_budget: float | None = None,
+    ) -> SearchResult:
+        """Best move for ``color``, ``key`` identifies the search for :meth:`cancel` (e.g. the game id).
+
+        Wins, forced blocks and lone legal moves are returned straight away without a
+        search, those results have ``depth == 0`` and their ``score`` carries no meaning.
+        """
+        solver = self._solver(board.rows, board.cols)
+        current, mask = solver.position(board, color)
+
+        column = solver.forced_move(board, color)
+        if column is not None:
+            return SearchResult(column, 0.0, 0, False, 0)
+
+        if not self._free_slots:
+            raise RuntimeError("Too many searches running at once")
+
+        slot = self._free_slots.pop()
+        self._slots[key] = slot
+
+        moves = solver.root_moves(current, mask)
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        futures = [
+            self.executor.submit(_search_child, board.rows, board.cols, current ^ mask, mask | move, slot, deadline)
+            for move in moves
+        ]
+        self._release_when_done(slot, futures)
+
+        try:
+            results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        except asyncio.CancelledError:
+            self._cancel_flags[slot] = 1
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            if self._slots.get(key) == slot:
+                del self._slots[key]
+
+        # Moves reached after the deadline have no score, only their place in the move ordering
+        searched = [i for i, (_, depth, solved) in enumerate(results) if depth or solved] or [0]
+        # Children are scored for the opponent, so the best move minimises their score
+        best = min(searched, key=lambda i: results[i][0])
+        score, depth, _ = results[best]
+        solved = all(result[2] for result in results)
+        return SearchResult(solver.column_of(moves[best]), -score, depth + 1, solved, 0)
+
+    def shutdown(self):
+        for slot in self._slots.values():
+            self._cancel_flags[slot] = 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
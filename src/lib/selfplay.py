@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import NamedTuple, Protocol
+
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell
+from lib.solver import Solver
+
+# Slots in a solver strategy's transposition table, small enough to clear before every game
+TABLE_SIZE = 65_537
+
+
+class GameResult(NamedTuple):
+    # Position of the game in the run, its moves only depend on this and the seed
+    index: int
+    # Column of every move, red first
+    moves: bytes
+    # ConnectCell value of the winner, EMPTY for a draw
+    winner: int
+
+
+class Config(NamedTuple):
+    """Everything a worker needs to play any game of a run."""
+
+    seed: int
+    red: str
+    yellow: str
+    rows: int = 6
+    cols: int = 7
+    # Solver search depth in plies
+    depth: int = 6
+    # Opening moves played at random by both sides, so deterministic strategies play different games
+    random_plies: int = 2
+
+
+class Strategy(Protocol):
+    """Picks the moves of one side of self-play games."""
+
+    def new_game(self): ...
+
+    def move(self, board: BitboardConnectFour, color: ConnectCell, rng: random.Random) -> int: ...
+
+
+class RandomStrategy:
+    """Any legal column."""
+
+    def __init__(self, config: Config):
+        pass
+
+    def new_game(self):
+        pass
+
+    def move(self, board: BitboardConnectFour, color: ConnectCell, rng: random.Random) -> int:
+        return rng.choice([col for col in range(board.cols) if board.can_play(col)])
+
+
+class HeuristicStrategy:
+    """Wins and blocks, never hands the opponent a win, otherwise a move making the most threats."""
+
+    def __init__(self, config: Config):
+        self.solver = Solver(config.rows, config.cols, table_size=1)
+
+    def new_game(self):
+        pass
+
+    def move(self, board: BitboardConnectFour, color: ConnectCell, rng: random.Random) -> int:
+        column = self.solver.forced_move(board, color)
+        if column is not None:
+            return column
+
+        current, mask = self.solver.position(board, color)
+        threats = {
+            move: self.solver.winning_cells(current | move, mask).bit_count() for move in self.solver.root_moves(current, mask)
+        }
+        most = max(threats.values())
+        return self.solver.column_of(rng.choice([move for move, count in threats.items() if count == most]))
+
+
+class SolverStrategy:
+    """The solver's best move searched ``depth`` plies deep.
+
+    Searches have no time budget, which would make the moves depend on the machine. The
+    table is cleared before every game, as entries left by other games change depth
+    limited results and a worker plays whichever games it is handed.
+    """
+
+    def __init__(self, config: Config):
+        self.depth = config.depth
+        self.solver = Solver(config.rows, config.cols, table_size=TABLE_SIZE)
+
+    def new_game(self):
+        self.solver.table.clear()
+
+    def move(self, board: BitboardConnectFour, color: ConnectCell, rng: random.Random) -> int:
+        column = self.solver.forced_move(board, color)
+        if column is not None:
+            return column
+        return self.solver.search(board, color, max_depth=self.depth).column
+
+
+STRATEGIES: dict[str, Callable[[Config], Strategy]] = {
+    "random": RandomStrategy,
+    "heuristic": HeuristicStrategy,
+    "solver": SolverStrategy,
+}
+
+
+def play_game(index: int, config: Config, red: Strategy, yellow: Strategy) -> GameResult:
+    # Seeding with a string hashes it the same way in every process
+    rng = random.Random(f"{config.seed}:{index}")
+    board = BitboardConnectFour(config.rows, config.cols)
+    red.new_game()
+    yellow.new_game()
+
+    moves = bytearray()
+    color, strategy = ConnectCell.RED, red
+    while True:
+        if len(moves) < config.random_plies:
+            column = rng.choice([col for col in range(board.cols) if board.can_play(col)])
+        else:
+            column = strategy.move(board, color, rng)
+
+        result = board.drop_piece(column, color)
+        moves.append(column)
+        if result.winner or result.draw:
+            return GameResult(index, bytes(moves), result.winner or ConnectCell.EMPTY)
+
+        color, strategy = (ConnectCell.YELLOW, yellow) if color == ConnectCell.RED else (ConnectCell.RED, red)
+
+
+# Strategies of the worker process, built once for the config they were asked for
+_strategies: dict[Config, tuple[Strategy, Strategy]] = {}
+
+
+def _play_batch(config: Config, start: int, count: int) -> tuple[list[GameResult], float]:
+    """Play games ``start`` to ``start + count``, runs inside a worker process.
+
+    Returns the games and the CPU seconds they took.
+    """
+    if config not in _strategies:
+        _strategies[config] = STRATEGIES[config.red](config), STRATEGIES[config.yellow](config)
+    red, yellow = _strategies[config]
+
+    started = time.process_time()
+    results = [play_game(index, config, red, yellow) for index in range(start, start + count)]
+    return results, time.process_time() - started
+
+
+class SelfPlay:
+    """Plays games headless across a process pool, in batches so a game costs no IPC of its own.
+
+    Results are yielded in order as their batches finish. Only a few batches per worker are
+    in flight at once, so a run of millions of games never holds more than those in memory.
+    Every game seeds its own generator from the run's seed and its index, so a run plays the
+    same games on any number of workers.
+    """
+
+    def __init__(self, config: Config, workers: int | None = None, batch: int = 256):
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.batch = batch
+        self.games = 0
+        # CPU seconds the workers spent playing, games / cpu_seconds is the rate of one core
+        self.cpu_seconds = 0.0
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def run(self, games: int, start: int = 0) -> Iterator[GameResult]:
+        """Games ``start`` to ``start + games``, a run can be split or resumed by its indices."""
+        pending: deque[Future] = deque()
+        end = start + games
+        submitted = start
+        while submitted < end or pending:
+            while submitted < end and len(pending) < 2 * self.workers:
+                count = min(self.batch, end - submitted)
+                pending.append(self.executor.submit(_play_batch, self.config, submitted, count))
+                submitted += count
+
+            results, cpu_seconds = pending.popleft().result()
+            self.games += len(results)
+            self.cpu_seconds += cpu_seconds
+            yield from results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
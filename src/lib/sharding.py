@@ -0,0 +1,281 @@
+import array
+import asyncio
+import bisect
+import hashlib
+import json
+import socket
+import ssl
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from loguru import logger
+
+from lib.packets import Matchmake, Packet
+
+# Every Matchmake is routed to the shard owning this key, so waiting players can be paired with each other
+MATCHMAKING_KEY = "matchmaking"
+# Games paired by the matchmaker live on its shard, packets naming one are routed there too
+MATCH_PREFIX = "match-"
+
+# Connections whose first packet is longer than this are closed before it is routed
+MAX_FIRST_PACKET = 64 * 1024
+
+# Serves a connection, optionally with the first line already read from it
+Serve = Callable[[asyncio.StreamReader, asyncio.StreamWriter, bytes | None], Awaitable[None]]
+
+# Tasks are only weakly referenced by asyncio
+_running: set[asyncio.Task] = set()
+
+
+def _spawn(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
+
+
+class HashRing:
+    """Consistent hashing of keys onto ``nodes`` nodes.
+
+    Every node owns ``replicas`` points on a 64 bit ring and a key belongs to the
+    node owning the first point after the key's hash. The hash doesn't depend on
+    the process, so every shard agrees on where a game lives, and growing the ring
+    only moves the keys the new node takes over.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 128):
+        if nodes < 1:
+            raise ValueError("A hash ring needs at least one node")
+
+        points = sorted((self.hash(f"{node}:{replica}"), node) for node in range(nodes) for replica in range(replicas))
+        self.nodes = nodes
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def node(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, self.hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class PeerWriter:
+    """StreamWriter of a proxied connection that reports the client's address instead of the unix socket's."""
+
+    def __init__(self, writer: asyncio.StreamWriter, peername: tuple):
+        self._writer = writer
+        self._peername = peername
+
+    def get_extra_info(self, name, default=None):
+        if name == "peername":
+            return self._peername
+        return self._writer.get_extra_info(name, default)
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while data := await reader.read(64 * 1024):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, ssl.SSLError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _readable(sock: socket.socket):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(sock, ready.set_result, None)
+    try:
+        await ready
+    finally:
+        loop.remove_reader(sock)
+
+
+async def peek_line(sock: socket.socket) -> bytes:
+    """First line sent on the socket, without taking it out of the socket's buffer.
+
+    Raises ValueError once ``MAX_FIRST_PACKET`` bytes arrived without the line ending.
+    """
+    while True:
+        try:
+            data = sock.recv(MAX_FIRST_PACKET, socket.MSG_PEEK)
+        except BlockingIOError:
+            await _readable(sock)
+            continue
+
+        if not data or b"\n" in data:
+            return data.split(b"\n", 1)[0]
+        if len(data) >= MAX_FIRST_PACKET:
+            raise ValueError(f"First packet is longer than {MAX_FIRST_PACKET} bytes")
+        # Only part of the line arrived, the socket stays readable until it is taken so poll instead
+        await asyncio.sleep(0.005)
+
+
+class ShardRouter:
+    """Accepts connections for one shard of a sharded server and routes them to the shard owning their game.
+
+    Every shard listens on the same port with ``SO_REUSEPORT`` so the kernel spreads
+    new connections across them. The game id in a connection's first packet is hashed
+    onto a :class:`HashRing` to find the shard owning it. Plain TCP sockets are handed
+    to that shard with ``SCM_RIGHTS`` before anything is read from them. TLS can't be
+    moved to another process, so the accepting shard terminates it and proxies the
+    connection to the owner over a unix socket instead.
+
+    A connection is closed if its first packet doesn't arrive within ``first_packet_timeout``
+    seconds (None waits forever), the server's own idle timeout only starts once it is routed.
+    """
+
+    def __init__(self, index: int, count: int, runtime_dir: Path, first_packet_timeout: float | None = 60.0):
+        self.index = index
+        self.count = count
+        self.runtime_dir = runtime_dir
+        self.first_packet_timeout = first_packet_timeout
+        self.ring = HashRing(count)
+
+        self._handoff = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._servers: list[asyncio.Server] = []
+        self._sockets: list[socket.socket] = [self._handoff]
+
+    def handoff_path(self, index: int) -> Path:
+        return self.runtime_dir / f"shard-{index}.fd"
+
+    def proxy_path(self, index: int) -> Path:
+        return self.runtime_dir / f"shard-{index}.sock"
+
+    def shard_of(self, line: bytes) -> int:
+        """Shard owning the game a connection's first packet is about, this shard if it isn't about one."""
+        try:
+            packet = Packet.from_json(line)
+        except ValueError:
+            return self.index
+
+        game_id = MATCHMAKING_KEY if isinstance(packet, Matchmake) else getattr(packet, "game_id", None)
+        if game_id is not None and game_id.startswith(MATCH_PREFIX):
+            game_id = MATCHMAKING_KEY
+        return self.index if game_id is None else self.ring.node(game_id)
+
+    async def serve(
+        self,
+        serve: Serve,
+        host: str,
+        port: int,
+        ssl_context: ssl.SSLContext | None = None,
+        handshaken: Callable[[asyncio.StreamWriter], None] | None = None,
+    ):
+        """Route connections accepted on ``host:port`` until cancelled, ``serve`` handles the ones this shard owns.
+
+        ``handshaken`` is called with every connection that finished its TLS handshake here.
+        """
+        loop = asyncio.get_running_loop()
+
+        # Connections other shards hand off or proxy to this one
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(str(self.handoff_path(self.index)))
+        receiver.setblocking(False)
+        self._sockets.append(receiver)
+        loop.add_reader(receiver, self._receive, receiver, serve)
+
+        async def proxied(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            peername = tuple(json.loads(await reader.readline()))
+            await serve(reader, PeerWriter(writer, peername), None)
+
+        self._servers.append(await asyncio.start_unix_server(proxied, self.proxy_path(self.index)))
+
+        if ssl_context is not None:
+
+            async def accepted(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+                if handshaken is not None:
+                    handshaken(writer)
+                await self.route_stream(serve, reader, writer)
+
+            server = await asyncio.start_server(accepted, host, port, ssl=ssl_context, reuse_port=True, limit=MAX_FIRST_PACKET)
+            self._servers.append(server)
+            logger.info("Shard {} serving on {}", self.index, server.sockets[0].getsockname())
+            try:
+                await server.serve_forever()
+            finally:
+                self.close()
+            return
+
+        listener = socket.create_server((host, port), reuse_port=True)
+        listener.setblocking(False)
+        self._sockets.append(listener)
+        logger.info("Shard {} serving on {}", self.index, listener.getsockname())
+        try:
+            while True:
+                conn, _ = await loop.sock_accept(listener)
+                _spawn(self.route_socket(serve, conn))
+        finally:
+            loop.remove_reader(receiver)
+            self.close()
+
+    def _receive(self, receiver: socket.socket, serve: Serve):
+        try:
+            _, fds, _, _ = socket.recv_fds(receiver, 1, 1)
+        except BlockingIOError:
+            return
+
+        for fd in fds:
+            _spawn(self.serve_socket(serve, socket.socket(fileno=fd)))
+
+    async def serve_socket(self, serve: Serve, conn: socket.socket):
+        reader, writer = await asyncio.open_connection(sock=conn)
+        await serve(reader, writer, None)
+
+    async def route_socket(self, serve: Serve, conn: socket.socket):
+        conn.setblocking(False)
+        try:
+            shard = self.shard_of(await asyncio.wait_for(peek_line(conn), self.first_packet_timeout))
+        except (OSError, TimeoutError, ValueError) as e:
+            logger.debug("Closing a connection before routing it: {}", e or "first packet timed out")
+            conn.close()
+            return
+
+        if shard != self.index:
+            try:
+                # socket.send_fds ignores its address argument, so build the SCM_RIGHTS message here
+                rights = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [conn.fileno()]))]
+                self._handoff.sendmsg([b"\0"], rights, 0, str(self.handoff_path(shard)))
+                conn.close()
+                return
+            except OSError as e:
+                # The owner isn't listening yet, serving here at least keeps the client connected
+                logger.warning("Couldn't hand a connection to shard {}: {}", shard, e)
+
+        await self.serve_socket(serve, conn)
+
+    async def route_stream(self, serve: Serve, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # The reader's limit is MAX_FIRST_PACKET, longer lines overrun it
+            first = await asyncio.wait_for(reader.readuntil(b"\n"), self.first_packet_timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ssl.SSLError, TimeoutError):
+            writer.close()
+            return
+
+        shard = self.shard_of(first)
+        if shard == self.index:
+            return await serve(reader, writer, first)
+
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_unix_connection(self.proxy_path(shard))
+        except OSError as e:
+            logger.warning("Couldn't proxy a connection to shard {}: {}", shard, e)
+            return await serve(reader, writer, first)
+
+        upstream_writer.write(json.dumps(writer.get_extra_info("peername")).encode() + b"\n" + first)
+        await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+
+    def close(self):
+        for server in self._servers:
+            server.close()
+        for sock in self._sockets:
+            sock.close()
+        for path in (self.handoff_path(self.index), self.proxy_path(self.index)):
+            path.unlink(missing_ok=True)
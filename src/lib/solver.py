@@ -0,0 +1,457 @@
+import time
+from array import array
+from typing import NamedTuple
+
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell, ConnectFour
+
+# Exact game theoretic scores are stored multiplied by this so heuristic values from a
+# depth limited search (always strictly between -SCALE and SCALE) can never pass for a win.
+SCALE = 100
+
+# Prime number of slots, roughly 16MB of arrays
+DEFAULT_TABLE_SIZE = 1_048_573
+
+# How many nodes to search between deadline checks
+CHECK_INTERVAL = 4096
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# Set on top of the bound when a depth limit cut the subtree short, so the value is only an estimate
+HEURISTIC = 4
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult(NamedTuple):
+    # Best column for the side to move
+    column: int
+    # Score in solver units: positive wins for the side to move, see Solver.score
+    score: float
+    # Deepest fully completed iteration
+    depth: int
+    # Whether the score is exact rather than a heuristic estimate
+    solved: bool
+    nodes: int
+
+
+class TranspositionTable:
+    """Fixed size hash table of search results indexed by ``key % size``.
+
+    Entries hold a bound (exact, lower or upper), the remaining depth it was searched
+    to and the search generation that wrote it. A slot is overwritten when the new
+    entry was searched at least as deep, or when the old one is left over from a
+    previous search, so expensive results survive while stale ones get recycled.
+
+    Bounds flagged ``HEURISTIC`` depend on the depth limit of the search that wrote them
+    and are only returned within that search. Proven bounds hold in any later one.
+    """
+
+    __slots__ = ("ages", "depths", "flags", "generation", "key_bits", "keys", "size", "values")
+
+    def __init__(self, size: int = DEFAULT_TABLE_SIZE, key_bits: int = 64):
+        self.size = size
+        self.key_bits = key_bits
+        self.generation = 0
+        self.keys = array("Q", bytes(8 * size)) if key_bits <= 64 else [0] * size
+        self.values = array("i", bytes(4 * size))
+        self.depths = array("H", bytes(2 * size))
+        self.flags = array("B", bytes(size))
+        self.ages = array("H", bytes(2 * size))
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFFFF
+
+    def clear(self):
+        self.__init__(self.size, self.key_bits)
+
+    def get(self, key: int) -> tuple[int, int, int] | None:
+        index = key % self.size
+        if self.keys[index] != key:
+            return None
+        if self.flags[index] & HEURISTIC and self.ages[index] != self.generation:
+            return None
+        return self.values[index], self.depths[index], self.flags[index]
+
+    def put(self, key: int, value: int, depth: int, flag: int):
+        index = key % self.size
+        if self.keys[index] != key and self.ages[index] == self.generation and self.depths[index] > depth:
+            return
+
+        self.keys[index] = key
+        self.values[index] = value
+        self.depths[index] = depth
+        self.flags[index] = flag
+        self.ages[index] = self.generation
+
+
+def popcount(value: int) -> int:
+    return value.bit_count()
+
+
+def _winning_cells_function(height: int, board_mask: int):
+    # Shifts are closed over and the directions unrolled, this runs several times per node
+    h1, h2, h3 = height, 2 * height, 3 * height
+    d1, d2, d3 = height - 1, 2 * (height - 1), 3 * (height - 1)
+    a1, a2, a3 = height + 1, 2 * (height + 1), 3 * (height + 1)
+
+    def winning_cells(position: int, mask: int) -> int:
+        result = (position << 1) & (position << 2) & (position << 3)
+
+        pair = (position << h1) & (position << h2)
+        result |= pair & ((position << h3) | (position >> h1))
+        pair = (position >> h1) & (position >> h2)
+        result |= pair & ((position << h1) | (position >> h3))
+
+        pair = (position << d1) & (position << d2)
+        result |= pair & ((position << d3) | (position >> d1))
+        pair = (position >> d1) & (position >> d2)
+        result |= pair & ((position << d1) | (position >> d3))
+
+        pair = (position << a1) & (position << a2)
+        result |= pair & ((position << a3) | (position >> a1))
+        pair = (position >> a1) & (position >> a2)
+        result |= pair & ((position << a1) | (position >> a3))
+
+        return result & (board_mask ^ mask)
+
+    return winning_cells
+
+
+class Solver:
+    """Negamax search with alpha-beta pruning over bitboard positions.
+
+    Positions are ``(current, mask)`` pairs using the same layout as
+    :class:`BitboardConnectFour`: ``current`` holds the stones of the side to move
+    and ``mask`` every stone on the board.
+    """
+
+    def __init__(self, rows: int = 6, cols: int = 7, table_size: int = DEFAULT_TABLE_SIZE, book=None):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.height = rows + 1
+
+        self.column_masks = tuple(((1 << rows) - 1) << (col * self.height) for col in range(cols))
+        self.bottom = sum(1 << (col * self.height) for col in range(cols))
+        self.board_mask = self.bottom * ((1 << rows) - 1)
+
+        # Center columns take part in the most lines so they are searched first
+        self.order = tuple(sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1))))
+
+        self._winning_cells = _winning_cells_function(self.height, self.board_mask)
+
+        self.table = TranspositionTable(table_size, key_bits=self.height * cols)
+        # Optional lib.book.OpeningBook answering positions before any search
+        self.book = book
+        self.nodes = 0
+        self.deadline = None
+        # Optional callable polled with the deadline, returning True aborts the search like a timeout
+        self.should_stop = None
+        self.horizon = False
+
+    def position(self, board: ConnectFour | BitboardConnectFour, color: ConnectCell) -> tuple[int, int]:
+        if isinstance(board, ConnectFour):
+            board = BitboardConnectFour.from_board(board)
+
+        if (board.rows, board.cols) != (self.rows, self.cols):
+            raise ValueError(f"Solver is for {self.rows}x{self.cols} boards, got {board.rows}x{board.cols}")
+
+        current = board.red if color == ConnectCell.RED else board.yellow
+        return current, board.mask
+
+    def winning_cells(self, position: int, mask: int) -> int:
+        """Empty cells that would complete a line for the stones in ``position``."""
+        return self._winning_cells(position, mask)
+
+    def possible(self, mask: int) -> int:
+        return (mask + self.bottom) & self.board_mask
+
+    def column_of(self, move: int) -> int:
+        return (move.bit_length() - 1) // self.height
+
+    def _check_deadline(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+        if self.should_stop is not None and self.should_stop():
+            raise SearchTimeout()
+
+    def _sorted_moves(self, current: int, mask: int, candidates: int) -> list[int]:
+        if not candidates & (candidates - 1):
+            return [candidates]
+
+        # Prefer moves creating the most new threats, ties broken center first
+        winning_cells = self._winning_cells
+        moves = []
+        for col in self.order:
+            move = candidates & self.column_masks[col]
+            if move:
+                moves.append((-winning_cells(current | move, mask).bit_count(), len(moves), move))
+        moves.sort()
+        return [move for _, _, move in moves]
+
+    def _heuristic(self, current: int, mask: int) -> int:
+        threats = popcount(self.winning_cells(current, mask)) - popcount(self.winning_cells(current ^ mask, mask))
+        return max(-SCALE + 1, min(SCALE - 1, 8 * threats))
+
+    def _negamax(self, current: int, mask: int, moves: int, alpha: int, beta: int, depth: int) -> int:
+        """Score a position where the side to move cannot win immediately."""
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_deadline()
+
+        opponent = current ^ mask
+        possible = (mask + self.bottom) & self.board_mask
+        opponent_wins = self._winning_cells(opponent, mask)
+
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                # Two threats to block at once
+                return -((self.size - moves) // 2) * SCALE
+            possible = forced
+
+        # Never play directly below a cell the opponent wins with
+        possible &= ~(opponent_wins >> 1)
+        if not possible:
+            return -((self.size - moves) // 2) * SCALE
+
+        if moves >= self.size - 2:
+            return 0
+
+        lowest = -((self.size - 2 - moves) // 2) * SCALE
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+
+        highest = ((self.size - 1 - moves) // 2) * SCALE
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+
+        if depth <= 0:
+            self.horizon = True
+            return max(lowest, min(highest, self._heuristic(current, mask)))
+
+        key = current + mask + self.bottom
+        entry = self.table.get(key)
+        estimated = False
+        if entry is not None:
+            value, entry_depth, flag = entry
+            # Proven bounds hold whatever depth they were searched to
+            if not flag & HEURISTIC or entry_depth >= depth:
+                if flag & HEURISTIC:
+                    self.horizon = estimated = True
+                    flag ^= HEURISTIC
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value > alpha:
+                    alpha = value
+                elif flag == UPPER and value < beta:
+                    beta = value
+                if alpha >= beta:
+                    return value
+
+        # Track whether this subtree reaches the horizon (or leans on an estimate) for its table entry
+        horizon = self.horizon
+        self.horizon = estimated
+        original_alpha = alpha
+        best = lowest - 1
+        for move in self._sorted_moves(current, mask, possible):
+            score = -self._negamax(opponent, mask | move, moves + 1, -beta, -alpha, depth - 1)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if self.horizon:
+            flag |= HEURISTIC
+        self.table.put(key, best, depth, flag)
+        self.horizon |= horizon
+        return best
+
+    def _candidates(self, current: int, mask: int) -> int:
+        """Moves that don't hand the opponent an immediate win, or every legal move if all of them do."""
+        possible = self.possible(mask)
+        opponent_wins = self.winning_cells(current ^ mask, mask)
+
+        candidates = possible & ~(opponent_wins >> 1)
+        forced = possible & opponent_wins
+        if forced:
+            candidates = forced & ~(opponent_wins >> 1)
+        return candidates or forced or possible
+
+    def root_moves(self, current: int, mask: int) -> list[int]:
+        """Moves worth searching from this position as single bit masks, best first."""
+        return self._sorted_moves(current, mask, self._candidates(current, mask))
+
+    def _root(self, current: int, mask: int, moves: int, depth: int, first: int | None) -> tuple[int, int]:
+        opponent = current ^ mask
+        ordered = self.root_moves(current, mask)
+        if first is not None and first in ordered:
+            ordered.remove(first)
+            ordered.insert(0, first)
+
+        alpha = -(self.size * SCALE)
+        beta = -alpha
+        best_move = ordered[0]
+        for move in ordered:
+            score = -self._negamax(opponent, mask | move, moves + 1, -beta, -alpha, depth - 1)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+
+    def forced_move(self, board: ConnectFour | BitboardConnectFour, color: ConnectCell) -> int | None:
+        """Column of the only move worth playing (a win, a block or the last legal move), if there is one."""
+        current, mask = self.position(board, color)
+        winning = self.winning_cells(current, mask) & self.possible(mask)
+        if winning:
+            return self.column_of(winning & -winning)
+
+        candidates = self._candidates(current, mask)
+        if not candidates & (candidates - 1):
+            return self.column_of(candidates)
+        return None
+
+    def search(
+        self,
+        board: ConnectFour | BitboardConnectFour,
+        color: ConnectCell,
+        time_budget: float | None = None,
+        max_depth: int | None = None,
+    ) -> SearchResult:
+        """Iteratively deepen until the position is solved, ``max_depth`` is reached or time runs out."""
+        current, mask = self.position(board, color)
+        return self.search_position(current, mask, time_budget, max_depth)
+
+    def search_position(
+        self,
+        current: int,
+        mask: int,
+        time_budget: float | None = None,
+        max_depth: int | None = None,
+    ) -> SearchResult:
+        moves = popcount(mask)
+        possible = self.possible(mask)
+        if not possible:
+            raise ValueError("No legal moves left on the board")
+
+        self.nodes = 0
+        self.table.new_search()
+
+        winning = self.winning_cells(current, mask) & possible
+        if winning:
+            move = winning & -winning
+            return SearchResult(self.column_of(move), float((self.size + 1 - moves) // 2), 0, True, 0)
+
+        if self.book is not None and (entry := self.book.lookup_position(current, mask)) is not None:
+            return SearchResult(entry.column, float(entry.score), 0, True, 0)
+
+        candidates = self._candidates(current, mask)
+        remaining = self.size - moves
+        max_depth = remaining if max_depth is None else min(max_depth, remaining)
+        self.deadline = None if time_budget is None else time.monotonic() + time_budget
+
+        best = None
+        try:
+            for depth in range(1, max_depth + 1):
+                self.horizon = False
+                move, value = self._root(current, mask, moves, depth, best and best[0])
+                best = (move, value, depth, not self.horizon)
+                if not self.horizon:
+                    break
+        except SearchTimeout:
+            if best is None:
+                # Not even one ply finished, fall back to move ordering alone
+                move = self._sorted_moves(current, mask, candidates)[0]
+                return SearchResult(self.column_of(move), 0.0, 0, False, self.nodes)
+        finally:
+            self.deadline = None
+
+        move, value, depth, solved = best
+        return SearchResult(self.column_of(move), value / SCALE, depth, solved, self.nodes)
+
+    def solve(self, current: int, mask: int) -> int:
+        """Exact score of the position using null window searches to narrow the bounds."""
+        moves = popcount(mask)
+        if self.winning_cells(current, mask) & self.possible(mask):
+            return (self.size + 1 - moves) // 2
+
+        depth = self.size - moves + 1
+        low = -((self.size - moves) // 2)
+        high = (self.size + 1 - moves) // 2
+        while low < high:
+            middle = low + (high - low) // 2
+            if middle <= 0 and low // 2 < middle:
+                middle = low // 2
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+
+            result = self._negamax(current, mask, moves, middle * SCALE, middle * SCALE + 1, depth)
+            if result <= middle * SCALE:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def score(self, board: ConnectFour | BitboardConnectFour, color: ConnectCell | None = None) -> int:
+        """Exact score for ``color`` (by default the side to move) with perfect play.
+
+        Positive scores are wins, ``(cells + 1) // 2`` minus the number of stones the
+        winner plays, so quicker wins score higher; zero is a draw.
+        """
+        if color is None:
+            color = side_to_move(board)
+
+        self.nodes = 0
+        self.deadline = None
+        self.table.new_search()
+        current, mask = self.position(board, color)
+
+        if self.book is not None and (entry := self.book.lookup_position(current, mask)) is not None:
+            return entry.score
+        return self.solve(current, mask)
+
+
+def side_to_move(board: ConnectFour | BitboardConnectFour) -> ConnectCell:
+    """Color with fewer stones on the board, red when the counts are equal."""
+    if not isinstance(board, BitboardConnectFour):
+        board = BitboardConnectFour.from_board(board)
+    return ConnectCell.YELLOW if popcount(board.red) > popcount(board.yellow) else ConnectCell.RED
+
+
+_solvers: dict[tuple[int, int], Solver] = {}
+
+
+def get_solver(rows: int = 6, cols: int = 7) -> Solver:
+    if (rows, cols) not in _solvers:
+        _solvers[(rows, cols)] = Solver(rows, cols)
+    return _solvers[(rows, cols)]
+
+
+def best_move(board: ConnectFour | BitboardConnectFour, color: ConnectCell, time_budget: float | None = None) -> int:
+    solver = get_solver(board.rows, board.cols)
+
+    # Only the column is wanted, so skip scoring a move that has no alternative
+    column = solver.forced_move(board, color)
+    if column is not None:
+        return column
+    return solver.search(board, color, time_budget).column
+
+
+def score(board: ConnectFour | BitboardConnectFour, color: ConnectCell | None = None) -> int:
+    return get_solver(board.rows, board.cols).score(board, color)
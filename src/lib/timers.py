@@ -0,0 +1,119 @@
+import asyncio
+import inspect
+import math
+from collections.abc import Callable
+
+from loguru import logger
+
+# Slots in a wheel, timers further out than a revolution wait whole revolutions in their slot
+WHEEL_SLOTS = 512
+
+
+class Timer:
+    """A callback waiting in a slot of a :class:`TimerWheel`."""
+
+    __slots__ = ("args", "callback", "rounds", "slot", "wheel")
+
+    def __init__(self, wheel: "TimerWheel", slot: int, rounds: int, callback: Callable, args: tuple):
+        self.wheel = wheel
+        self.slot: int | None = slot
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self):
+        if self.slot is not None:
+            del self.wheel.slots[self.slot][self]
+            self.slot = None
+
+
+class TimerWheel:
+    """Runs every timeout of a process from one task, a tick at a time.
+
+    A timer goes in the slot its deadline falls in modulo the wheel's size, so scheduling and
+    cancelling are a dict insert and delete however many timers there are, and each tick only
+    looks at one slot. Deadlines are rounded up to whole ticks. Callbacks returning a coroutine
+    have it run as a task.
+
+    The task ticking the wheel starts with the first timer scheduled while a loop is running.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        # Insertion ordered dicts used as sets, timers in a slot fire in the order they were scheduled
+        self.slots: list[dict[Timer, None]] = [{} for _ in range(slots)]
+        # Slot of the last tick
+        self.position = 0
+        self._task: asyncio.Task | None = None
+        # Tasks running coroutines returned by callbacks, kept until they finish
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return sum(map(len, self.slots))
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        """Call ``callback(*args)`` after at least ``delay`` seconds."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.position + ticks) % len(self.slots)
+        timer = Timer(self, slot, (ticks - 1) // len(self.slots), callback, args)
+        self.slots[slot][timer] = None
+
+        if self._task is None:
+            try:
+                self._task = asyncio.get_running_loop().create_task(self.run())
+            except RuntimeError:
+                # No loop, whoever made the wheel calls advance
+                pass
+        return timer
+
+    def advance(self):
+        """Move on a tick, firing the timers due."""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        due = []
+        for timer in slot:
+            if timer.rounds:
+                timer.rounds -= 1
+            else:
+                due.append(timer)
+
+        for timer in due:
+            del slot[timer]
+            timer.slot = None
+            self._fire(timer)
+
+    def _fire(self, timer: Timer):
+        try:
+            result = timer.callback(*timer.args)
+        except Exception:
+            logger.exception("Timer {} failed", getattr(timer.callback, "__name__", timer.callback))
+            return
+
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._running.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error("Timer task failed")
+
+    async def run(self):
+        """Tick until cancelled, catching up on the ticks missed while the loop was busy."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(deadline - loop.time())
+            while loop.time() >= deadline:
+                self.advance()
+                deadline += self.tick
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
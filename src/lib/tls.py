@@ -0,0 +1,89 @@
+import asyncio
+import ssl
+import time
+import weakref
+from pathlib import Path
+
+from lib.metrics import Metrics
+
+# TLS 1.2 suites with forward secrecy and AEAD only, every TLS 1.3 suite already is one
+TLS12_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+# Session tickets sent after each handshake, a client only ever keeps its latest one
+TICKETS = 1
+
+
+def server_context(cert: Path, key: Path) -> ssl.SSLContext:
+    """A server context that hands out session tickets, so a client reconnecting skips the certificate exchange."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(TLS12_CIPHERS)
+    context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE
+    context.num_tickets = TICKETS
+    return context
+
+
+class ResumingContext(ssl.SSLContext):
+    """A client context that resumes the session of the last connection it was told to remember.
+
+    asyncio has no way to pass a session to a connection, so the context hands its own to
+    every connection it wraps. TLS 1.3 tickets arrive after the handshake, so a connection
+    is remembered once it is done with rather than straight after connecting. Its transport
+    is gone by then, so it is remembered by the SSLObject it had.
+    """
+
+    session: ssl.SSLSession | None = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session or self.session)
+
+    def remember(self, ssl_object: ssl.SSLObject | None):
+        try:
+            session = ssl_object.session if ssl_object is not None else None
+        except (OSError, ValueError):
+            return
+        if session is not None and session.has_ticket:
+            self.session = session
+
+
+def client_context(cert: Path, resume: bool = True) -> ssl.SSLContext:
+    """A client context trusting ``cert``, resuming sessions unless ``resume`` is False."""
+    context = (ResumingContext if resume else ssl.SSLContext)(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_verify_locations(cert)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(TLS12_CIPHERS)
+    context.check_hostname = False
+    return context
+
+
+class HandshakeMetrics:
+    """Counts full and resumed handshakes and how long they took.
+
+    The context's SNI callback runs on every ClientHello, whether or not it names a server,
+    which marks the start. The end is when asyncio hands the finished connection over.
+    """
+
+    def __init__(self, metrics: Metrics, context: ssl.SSLContext):
+        self.handshakes = metrics.counter(
+            "tls_handshakes", "Finished TLS handshakes by whether they resumed a session", ("resumed",)
+        )
+        self.seconds = {
+            False: metrics.histogram("tls_full_handshake_seconds", "Time from ClientHello to a connection for full handshakes"),
+            True: metrics.histogram("tls_resumed_handshake_seconds", "Time from ClientHello to a connection for resumed ones"),
+        }
+        # ClientHello times of handshakes still going, ones that fail are dropped with their SSLObject
+        self.started: weakref.WeakKeyDictionary[ssl.SSLObject, float] = weakref.WeakKeyDictionary()
+        if metrics.enabled:
+            context.sni_callback = self.hello
+
+    def hello(self, ssl_object: ssl.SSLObject, server_name: str | None, context: ssl.SSLContext):
+        self.started[ssl_object] = time.perf_counter()
+
+    def accepted(self, writer: asyncio.StreamWriter):
+        ssl_object = writer.get_extra_info("ssl_object")
+        if (started := self.started.pop(ssl_object, None)) is None:
+            return
+
+        resumed = ssl_object.session_reused
+        self.handshakes.inc(str(resumed).lower())
+        self.seconds[resumed].observe(time.perf_counter() - started)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+from client_text import ConnectFourClient
+from lib.logs import configure as configure_logging
+from lib.tls import ResumingContext, client_context
+from lib.packets import ConnectionLost, ConnectResponse, Encoding, Error, GameOver, MoveApplied
+from collections import Counter
+import asyncio
+import argparse
+import random
+import resource
+import shlex
+import signal
+import statistics
+import sys
+import ssl
+import time
+import uuid
+from pathlib import Path
+
+# Round trip samples kept for the final percentiles, a long soak test would otherwise keep every move
+RESERVOIR_SIZE = 100_000
+
+
+class Stats:
+    """Counters shared by every simulated client."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.games = 0
+        self.moves = 0
+        self.errors: Counter[str] = Counter()
+        # Move round trips since the last report, and a sample of every round trip so far
+        self.interval: list[float] = []
+        self.reservoir: list[float] = []
+        self.samples = 0
+        # Seconds taken to connect, split by whether the TLS session was resumed
+        self.handshakes: dict[bool, list[float]] = {False: [], True: []}
+
+    def record(self, rtt: float):
+        self.interval.append(rtt)
+        self.samples += 1
+        if len(self.reservoir) < RESERVOIR_SIZE:
+            self.reservoir.append(rtt)
+        elif (index := random.randrange(self.samples)) < RESERVOIR_SIZE:
+            self.reservoir[index] = rtt
+
+    def handshake(self, resumed: bool, seconds: float):
+        samples = self.handshakes[resumed]
+        if len(samples) < RESERVOIR_SIZE:
+            samples.append(seconds)
+
+
+def percentiles(samples: list[float], name: str = "rtt") -> str:
+    if len(samples) < 2:
+        return f"{name} n/a"
+
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    p50, p90, p99 = (cuts[percentile - 1] * 1000 for percentile in (50, 90, 99))
+    return f"{name} p50 {p50:.2f}ms p90 {p90:.2f}ms p99 {p99:.2f}ms max {max(samples) * 1000:.2f}ms"
+
+
+def rss(pid: int) -> int | None:
+    """Resident memory of a process and all its children in bytes, None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            total = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return total + sum(rss(int(child)) or 0 for child in children.read().split())
+    except (OSError, StopIteration):
+        return None
+
+
+class LoadClient(ConnectFourClient):
+    """Headless player that picks random moves and times how long the server takes to apply them."""
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext | None, stats: Stats, **kwargs):
+        super().__init__(host, port, None, **kwargs)
+        # Loading the certificate once per client would dominate connecting thousands of them
+        self.ssl_context = ssl_context
+        self.stats = stats
+        self.sent_at: float | None = None
+        self.finished = False
+
+    async def connect(self):
+        started = time.perf_counter()
+        await super().connect()
+        if self.ssl_object is not None:
+            self.stats.handshake(self.ssl_object.session_reused, time.perf_counter() - started)
+
+    def render(self):
+        pass
+
+    def show(self, message: str):
+        pass
+
+    async def get_move(self):
+        self.sent_at = time.perf_counter()
+        self.stats.moves += 1
+        return random.choice([col for col in range(self.game.board.cols) if self.game.board.can_play(col)])
+
+    async def get_packet(self):
+        packet = await super().get_packet()
+
+        # The opponent can't move before ours is applied, so the next move we hear about is ours
+        if self.sent_at is not None and isinstance(packet, (MoveApplied, GameOver)):
+            self.stats.record(time.perf_counter() - self.sent_at)
+            self.sent_at = None
+
+        if isinstance(packet, GameOver):
+            self.finished = True
+        elif isinstance(packet, Error):
+            self.stats.errors["error packet"] += 1
+        elif isinstance(packet, ConnectionLost):
+            self.stats.errors["connection lost"] += 1
+        return packet
+
+    async def run(self, username: str, game_id: str) -> bool:
+        """Join a game, play it out and return whether it finished."""
+        await self.connect()
+
+        response = await (self.connect_request(username, game_id) if self.bucket is None else self.matchmake(username))
+        if not isinstance(response, ConnectResponse):
+            self.stats.errors["rejected"] += 1
+            return False
+
+        self.player = response.player
+        self.game = response.game
+        if not await self.wait_for_game():
+            self.stats.errors["lost before start"] += 1
+            return False
+
+        await self.game_loop()
+        return self.finished
+
+    def close(self):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.close()
+        # Clients share the context, so the next one to connect resumes this one's session
+        if isinstance(self.ssl_context, ResumingContext):
+            self.ssl_context.remember(self.ssl_object)
+
+
+async def play_game(host: str, port: int, ssl_context: ssl.SSLContext | None, stats: Stats, bot: bool, **kwargs) -> bool:
+    game_id = f"load-{uuid.uuid4().hex[:12]}"
+    clients = [LoadClient(host, port, ssl_context, stats, bot=bot, **kwargs) for _ in range(1 if bot else 2)]
+    try:
+        finished = await asyncio.gather(*(client.run(f"load-{i}", game_id) for i, client in enumerate(clients)))
+    finally:
+        for client in clients:
+            client.close()
+
+    # Matchmade clients may end up in different games, count games by finished players
+    stats.games += sum(finished) / len(clients)
+    return all(finished)
+
+
+async def generate(
+    host: str,
+    port: int,
+    ssl_context: ssl.SSLContext | None,
+    stats: Stats,
+    concurrency: int = 100,
+    games: int | None = None,
+    duration: float | None = None,
+    timeout: float = 60.0,
+    bot: bool = False,
+    **kwargs,
+):
+    """Keep ``concurrency`` games running until ``games`` were started or ``duration`` seconds passed."""
+    deadline = None if duration is None else time.perf_counter() + duration
+    started = 0
+
+    def more() -> bool:
+        nonlocal started
+        if games is not None and started >= games or deadline is not None and time.perf_counter() >= deadline:
+            return False
+        started += 1
+        return True
+
+    async def worker():
+        while more():
+            try:
+                await asyncio.wait_for(play_game(host, port, ssl_context, stats, bot, **kwargs), timeout)
+            except TimeoutError:
+                stats.errors["timeout"] += 1
+            except (OSError, ssl.SSLError, asyncio.IncompleteReadError, ValueError) as e:
+                stats.errors[type(e).__name__] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def report(stats: Stats, server_pid: int | None, final: bool = False):
+    elapsed = time.perf_counter() - stats.started
+    samples = stats.reservoir if final else stats.interval
+    errors = " ".join(f"{kind}={count}" for kind, count in stats.errors.most_common()) or "none"
+    memory = rss(server_pid) if server_pid is not None else None
+
+    fields = [
+        f"{elapsed:7.1f}s games {stats.games:.0f} ({stats.games / elapsed:.1f}/s) moves {stats.moves}",
+        percentiles(samples),
+        f"errors {errors}",
+    ]
+    if memory is not None:
+        fields.append(f"server rss {memory / 2**20:.1f} MiB")
+    if final and any(stats.handshakes.values()):
+        for resumed, name in ((False, "full handshake"), (True, "resumed handshake")):
+            fields.append(f"{len(stats.handshakes[resumed])} {percentiles(stats.handshakes[resumed], name)}")
+    print(*fields, sep=" | ", flush=True)
+    stats.interval.clear()
+
+
+async def wait_for_server(host: str, port: int, process: asyncio.subprocess.Process, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while process.returncode is None and time.perf_counter() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server didn't start")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Play many games against a server at once and report how it copes")
+    parser.add_argument("--host", "-i", default="localhost", help="Server hostname or IP")
+    parser.add_argument("--port", "-p", type=int, default=60000, help="Server port")
+    parser.add_argument("--ssl-cert", type=Path, default=Path("certs/fullchain.pem"), help="SSL certificate path")
+    parser.add_argument("--ssl", action=argparse.BooleanOptionalAction, default=True, help="Options to enable or disable SSL")
+    parser.add_argument(
+        "--tls-resume",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Resume TLS sessions when reconnecting, --no-tls-resume makes every handshake a full one",
+    )
+    parser.add_argument("--concurrency", "-c", type=int, default=100, help="Games played at the same time")
+    parser.add_argument("--games", "-n", type=int, help="Stop after this many games")
+    parser.add_argument("--duration", "-d", type=float, help="Stop after this many seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds a game may take before it counts as an error")
+    parser.add_argument("--bot", action="store_true", help="Play against the server's bot instead of another client")
+    parser.add_argument("--matchmake", metavar="BUCKET", type=int, nargs="?", const=0, help="Find opponents by matchmaking")
+    parser.add_argument(
+        "--binary", action=argparse.BooleanOptionalAction, default=True, help="Ask for the binary protocol instead of JSON"
+    )
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between progress reports")
+    parser.add_argument("--server-pid", type=int, help="Report the resident memory of this server process")
+    parser.add_argument(
+        "--spawn",
+        metavar="ARGS",
+        nargs="?",
+        const="",
+        help="Start server.py with these extra arguments and measure it, pass them as --spawn='--no-bots ...'",
+    )
+    parser.add_argument("--debug", action="store_true", help="Log every client's warnings")
+
+    args = parser.parse_args()
+    if args.games is None and args.duration is None:
+        args.games = args.concurrency
+
+    configure_logging("WARNING" if args.debug else "CRITICAL", queued=True)
+
+    # Every simulated client is a socket, and a server on the same machine needs as many again
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    ssl_context = None
+    if args.ssl:
+        ssl_context = client_context(args.ssl_cert, args.tls_resume)
+
+    process = None
+    server_pid = args.server_pid
+    if args.spawn is not None:
+        command = [sys.executable, str(Path(__file__).with_name("server.py")), "--host", args.host, "--port", str(args.port)]
+        command += ([] if args.ssl else ["--no-ssl"]) + shlex.split(args.spawn)
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        server_pid = process.pid
+        await wait_for_server(args.host, args.port, process)
+
+    stats = Stats()
+
+    async def progress():
+        while True:
+            await asyncio.sleep(args.interval)
+            report(stats, server_pid)
+
+    reporter = asyncio.create_task(progress())
+    try:
+        await generate(
+            args.host,
+            args.port,
+            ssl_context,
+            stats,
+            args.concurrency,
+            args.games,
+            args.duration,
+            args.timeout,
+            args.bot,
+            encoding=Encoding.BINARY if args.binary else Encoding.JSON,
+            bucket=args.matchmake,
+        )
+    finally:
+        reporter.cancel()
+        try:
+            report(stats, server_pid, final=True)
+        finally:
+            if process is not None:
+                # SIGTERM would skip the server's cleanup and leave its search workers behind
+                process.send_signal(signal.SIGINT)
+                await process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from loguru import logger
+
+from lib.connect_four import ConnectCell
+from lib.logs import configure as configure_logging
+from lib.selfplay import STRATEGIES, Config, SelfPlay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between two strategies headless, across every core")
+    parser.add_argument("--games", "-n", type=int, default=10_000, help="Number of games to play")
+    parser.add_argument("--start", type=int, default=0, help="Index of the first game, to split a run or carry one on")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed every game is derived from, the same seed plays the same games"
+    )
+    parser.add_argument("--red", choices=list(STRATEGIES), default="random", help="Strategy of the player moving first")
+    parser.add_argument("--yellow", choices=list(STRATEGIES), default="random", help="Strategy of the player moving second")
+    parser.add_argument("--depth", type=int, default=6, help="Plies the solver strategy searches")
+    parser.add_argument("--random-plies", type=int, default=2, help="Opening moves played at random by both players")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--workers", "-w", type=int, default=None, help="Worker processes, defaults to one per core")
+    parser.add_argument("--batch", type=int, default=256, help="Games a worker plays per task")
+    parser.add_argument(
+        "--output", "-o", type=Path, default=None, help="File to write the games to as JSON lines, stdout by default"
+    )
+    parser.add_argument("--report", type=float, default=5.0, help="Seconds between progress logs")
+    parser.add_argument("--debug", type=str, default="INFO", help="Logging debug level")
+
+    args = parser.parse_args()
+    configure_logging(args.debug)
+
+    config = Config(args.seed, args.red, args.yellow, args.rows, args.cols, args.depth, args.random_plies)
+    selfplay = SelfPlay(config, args.workers, args.batch)
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    winners: Counter[int] = Counter()
+    started = reported = time.monotonic()
+
+    def report():
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Played {} games in {:.1f}s, {:.0f} games/s, {:.0f} games/s per core, red {} yellow {} draws {}",
+            selfplay.games,
+            elapsed,
+            selfplay.games / elapsed,
+            selfplay.games / selfplay.cpu_seconds if selfplay.cpu_seconds else 0,
+            winners[ConnectCell.RED],
+            winners[ConnectCell.YELLOW],
+            winners[ConnectCell.EMPTY],
+        )
+
+    try:
+        for game in selfplay.run(args.games, args.start):
+            winners[game.winner] += 1
+            winner = ConnectCell(game.winner).name if game.winner else None
+            output.write(json.dumps({"game": game.index, "moves": list(game.moves), "winner": winner}) + "\n")
+
+            if time.monotonic() - reported >= args.report:
+                reported = time.monotonic()
+                report()
+    except KeyboardInterrupt:
+        logger.warning("Stopped early")
+    finally:
+        selfplay.shutdown()
+        if output is not sys.stdout:
+            output.close()
+    report()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,454 @@
 #!/usr/bin/env python3
-from lib.packets import Packet, ConnectRequest, ConnectResponse, FoundGame, Error, SyncGame, Move, GameOver, ConnectionLost
+from lib.packets import (
+    Packet,
+    Packets,
+    ConnectRequest,
+    ConnectResponse,
+    FoundGame,
+    Error,
+    SyncGame,
+    Move,
+    GameOver,
+    ConnectionLost,
+    MoveApplied,
+    SyncRequest,
+    Spectate,
+    SpectateResponse,
+    Matchmake,
+    Resume,
+    ResumeResponse,
+    Encoding,
+    Ping,
+)
+from lib.archive import ArchivedGame, ArchiveWriter
+from lib.codec import CODECS, JSON_CODEC, Codec
+from lib.journal import Journal
+from lib.logs import configure as configure_logging, enabled
+from lib.matchmaking import Matchmaker
+from lib.metrics import Metrics
+from lib.outbox import Outbox, SlowClientPolicy
+from lib.profiling import PROFILERS, TRACE, Profiler, SlowPacketTracer
+from lib.registry import Registry
 from lib.data import GameState, Player, Game
 from lib.connect_four import ConnectFour, ConnectCell
+from lib.search_pool import SearchPool
+from lib.sharding import MATCH_PREFIX, ShardRouter
+from lib.timers import Timer, TimerWheel
+from lib.tls import HandshakeMetrics, server_context
+from collections.abc import Callable
 import asyncio
 import argparse
+import hashlib
+import hmac
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
 from loguru import logger
 import uuid
 import random
-import sys
-import ssl
+import secrets
 from pathlib import Path
 
-logger.remove(0)
-logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level> - {message}", level="INFO", colorize=True)
+configure_logging()
+
+# Address of the bot's Player, it has no connection
+BOT_ADDR = ("bot", 0)
+# Pings carry nothing, so every connection is sent the same one
+PING = Ping()
+# Packets a slow connection may lose, the next SyncGame carries everything they do
+UPDATES = frozenset({Packets.MOVE_APPLIED, Packets.SYNC_GAME})
 
 
 class ConnectFourServer:
-    def __init__(self):
-        # Mapping from game id to game
-        self.games: dict[str, Game] = {}
+    def __init__(
+        self,
+        search_pool: SearchPool | None = None,
+        bot_time: float = 2.0,
+        spectator_queue: int = 32,
+        high_water: int = 64 * 1024,
+        slow_policy: SlowClientPolicy = SlowClientPolicy.COALESCE,
+        widen_after: float = 10.0,
+        metrics: Metrics | None = None,
+        tracer: SlowPacketTracer | None = None,
+        journal: Journal | None = None,
+        grace: float = 30.0,
+        secret: bytes | None = None,
+        archive: ArchiveWriter | None = None,
+        idle_timeout: float = 60.0,
+        ping_interval: float = 20.0,
+        turn_timeout: float = 120.0,
+        lobby_timeout: float = 600.0,
+        tick: float = 0.1,
+    ):
+        # Games by id and the sessions of their players by player id and addr
+        self.registry = Registry()
+        self.games = self.registry.games
 
-        # Mapping from addr to game id
-        self.connections: dict[tuple[str, int], str] = {}
+        # Bot searches run in worker processes so they never block the event loop
+        self.search_pool = search_pool
+        self.bot_time = bot_time
+        # Mapping from game id to the task computing the bot's next move
+        self.bot_tasks: dict[str, asyncio.Task] = {}
 
-    @classmethod
-    async def get_packet(cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        try:
-            data = await reader.readline()
-        except ConnectionResetError:
-            logger.error("Connection reset")
-            return None
+        # Mapping from writer to the queue of packets waiting to be sent on it, which also holds its codec
+        self.outboxes: dict[asyncio.StreamWriter, Outbox] = {}
+        # Bytes a connection may have waiting before slow_policy decides what to do with it
+        self.high_water = high_water
+        self.slow_policy = slow_policy
+
+        # Mapping from game id to its SyncGame encoded by each codec, dropped whenever the game changes
+        self.sync_cache: dict[str, dict[Codec, bytes]] = {}
+
+        # Mapping from game id to the writers of everyone watching it
+        self.spectators: dict[str, set[asyncio.StreamWriter]] = {}
+        # Mapping from a spectator's writer to the game id it watches
+        self.spectating: dict[asyncio.StreamWriter, str] = {}
+        # Packets a spectator may fall behind by before it is only sent the latest state
+        self.spectator_queue = spectator_queue
+
+        # Players waiting for a random opponent, keyed by writer
+        self.matchmaker = Matchmaker(widen_after)
+
+        # Log of every started game and move the games are restored from after a restart
+        self.journal = journal
+
+        # Seconds a started game is held for a player whose connection dropped, 0 ends it straight away
+        self.grace = grace
+        # Every timeout below runs off one wheel rather than a task or loop timer each, rounded up to ticks
+        self.timers = TimerWheel(tick)
+        # Mapping from the id of a player without a connection to the timer ending its game once the grace is up
+        self.held: dict[uuid.UUID, Timer] = {}
+        # Resume tokens are signed player ids, nothing is stored and they stay valid across restarts with the secret
+        self.secret = secret or secrets.token_bytes(32)
+        # Mapping from game id to every MoveApplied so far, a resuming client is sent the ones it missed
+        self.history: dict[str, list[MoveApplied]] = {}
+
+        # Every finished game is kept here, with the unix time it started from started_at
+        self.archive = archive
+        self.started_at: dict[str, float] = {}
+
+        # Seconds a connection may send nothing before it is closed, it is sent a Ping every ping_interval of them
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        # Mapping from writer to when a packet last arrived on it and to the timer checking on it
+        self.seen: dict[asyncio.StreamWriter, float] = {}
+        self.idle: dict[asyncio.StreamWriter, Timer] = {}
+        # Seconds a player has for a move before forfeiting, and a lobby has to find a second player
+        self.turn_timeout = turn_timeout
+        self.lobby_timeout = lobby_timeout
+        # Mapping from game id to the timer of its lobby or of the turn being played, 0 turns a timeout off
+        self.game_timers: dict[str, Timer] = {}
+
+        # Disabled metrics hand out no-op metrics, the hot path doesn't check
+        self.metrics = metrics or Metrics(enabled=False)
+        self.packets_received = self.metrics.counter("packets_received", "Packets received by type", ("type",))
+        self.packets_sent = self.metrics.counter("packets_sent", "Packets queued for a connection by type", ("type",))
+        self.bad_packets = self.metrics.counter("bad_packets", "Frames that couldn't be decoded")
+        self.connection_count = self.metrics.gauge("connections", "Open connections")
+        self.metrics.gauge("games", "Games in progress or waiting for a player", function=lambda: len(self.games))
+        self.metrics.gauge("matchmaking_queue", "Players waiting for a random opponent", function=lambda: len(self.matchmaker))
+        self.metrics.gauge("spectators", "Connections spectating a game", function=lambda: len(self.spectating))
+        self.metrics.gauge("bot_searches", "Bot moves being searched", function=lambda: len(self.bot_tasks))
+        self.metrics.gauge("timers", "Timeouts waiting on the timer wheel", function=lambda: len(self.timers))
+        self.bot_failures = self.metrics.counter("bot_failures", "Bot moves played from move ordering after the search failed")
+        self.timeouts = self.metrics.counter("timeouts", "Connections closed and games ended by a timeout", ("kind",))
+        self.parse_seconds = self.metrics.histogram("packet_parse_seconds", "Time spent decoding a packet")
+        self.move_seconds = self.metrics.histogram("handle_move_seconds", "Time spent validating, applying and sending a move")
+        self.send_backlog = self.metrics.histogram(
+            "send_backlog_bytes",
+            "Bytes already waiting on a connection when a packet is queued for it",
+            (0, 256, 1024, 4096, 16384, 65536, 262144),
+        )
+
+        # Logs packets that took too long to handle, a tracer without a threshold traces nothing
+        self.tracer = tracer or SlowPacketTracer()
+        self.slow_packets = self.metrics.counter("slow_packets", "Packets that took longer than the slow packet threshold")
+
+    def outbox(self, writer: asyncio.StreamWriter) -> Outbox:
+        """The connection's outbox, opened on first use."""
+        outbox = self.outboxes.get(writer)
+        if outbox is None:
+            outbox = self.outboxes[writer] = Outbox(writer, high_water=self.high_water, policy=self.slow_policy)
+            outbox.start()
+        return outbox
+
+    def follow(self, writer: asyncio.StreamWriter, game: Game) -> Outbox:
+        """Make the game's state what the connection is sent when it has to catch up."""
+        outbox = self.outbox(writer)
+        outbox.snapshot = lambda codec: self.encoded_sync(game, codec)
+        return outbox
+
+    def close_connection(self, writer: asyncio.StreamWriter):
+        """Flush whatever is waiting to be sent then close the connection."""
+        if writer is None:
+            return
+
+        if (outbox := self.outboxes.pop(writer, None)) is not None:
+            outbox.close()
+        else:
+            writer.close()
+
+    async def get_packet(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: bytes | None = None):
+        """Next packet on the connection, ``data`` is a frame that was already read from it."""
+        codec = self.outbox(writer).codec
+        trace = TRACE.get()
+        if data is None:
+            started = time.perf_counter()
+            try:
+                data = await codec.read_frame(reader)
+            except ConnectionResetError:
+                logger.error("Connection reset")
+                return None
+            if trace is not None:
+                trace.add("read", time.perf_counter() - started)
 
         if data:
+            started = time.perf_counter()
             try:
-                packet = Packet.from_json(data)
-                logger.debug("Recieved packet: {}", packet)
+                packet = codec.decode(data)
+                parsed = time.perf_counter() - started
+                self.parse_seconds.observe(parsed)
+                if trace is not None:
+                    trace.add("parse", parsed)
+                self.packets_received.inc(packet.packet_type.name)
+                if enabled.debug:
+                    logger.debug("Received {packet_type}", packet_type=packet.packet_type.name)
                 return packet
             except Exception as e:
+                self.bad_packets.inc()
                 logger.info("Received bad packet: {}", e)
-                await cls.send(writer, Error(message=str(e)))
+                await self.send(writer, Error(message=str(e)))
                 return False
 
-    @classmethod
     async def send(self, writer: asyncio.StreamWriter, packet: Packet):
-        logger.debug("Sending packet to {}: {}", writer.get_extra_info("peername"), packet)
-        writer.write(packet.to_json().encode() + b"\n")
+        if writer is None:
+            # Bot players have no connection
+            return
+
+        if enabled.debug:
+            logger.debug(
+                "Sending {packet_type} to {addr}", packet_type=packet.packet_type.name, addr=writer.get_extra_info("peername")
+            )
+        outbox = self.outbox(writer)
+        self.packets_sent.inc(packet.packet_type.name)
+        self.send_backlog.observe(outbox.backlog())
+        self.queue(outbox, packet.packet_type in UPDATES, outbox.codec.encode, packet)
+
+    def queue(self, outbox: Outbox, droppable: bool, encode: Callable[..., bytes], *args):
+        """Put ``encode(*args)`` in the outbox, timing both for the packet being traced."""
+        if (trace := TRACE.get()) is None:
+            outbox.put(encode(*args), droppable)
+        else:
+            trace.time("write", outbox.put, trace.time("serialize", encode, *args), droppable)
+
+    def recipients(self, game: Game) -> list[asyncio.StreamWriter]:
+        """Writers of everyone receiving the game's broadcasts, bots have none."""
+        players = (game.red_player, game.yellow_player)
+        return [player._writer for player in players if player is not None and player._writer is not None]
+
+    def fan_out(self, game: Game, packet_type: Packets, encode: Callable[[Codec], bytes]):
+        """Queue the same buffer for the game's players and spectators, encoding at most once per codec in use.
+
+        Outboxes never block, so a recipient that stops reading never holds up the game.
+        """
+        encoded: dict[Codec, bytes] = {}
+
+        def data(codec: Codec) -> bytes:
+            if codec not in encoded:
+                encoded[codec] = encode(codec)
+            return encoded[codec]
+
+        droppable = packet_type in UPDATES
+        recipients = 0
+        for writers in (self.recipients(game), self.spectators.get(game.game_id, ())):
+            for writer in writers:
+                outbox = self.outbox(writer)
+                self.send_backlog.observe(outbox.backlog())
+                self.queue(outbox, droppable, data, outbox.codec)
+                recipients += 1
+        self.packets_sent.inc(packet_type.name, amount=recipients)
 
-    @classmethod
     async def broadcast(self, game: Game, packet: Packet):
-        await self.send(game.red_player._writer, packet)
-        await self.send(game.yellow_player._writer, packet)
-
-    async def remove_game(self, addr):
-        if game_id := self.connections.get(addr):
-            if game := self.games.get(game_id):
-                try:
-                    await self.broadcast(game, ConnectionLost())
-                    await self.close_writer(game.red_player._writer)
-                    await self.close_writer(game.yellow_player._writer)
-                    del self.games[game_id]
-                    logger.info("Removed game {}", game_id)
-                except Exception as e:
-                    logger.debug("Bypassing error while removing game: {}", e)
+        if enabled.debug:
+            logger.debug(
+                "Broadcasting {packet_type} to lobby {game_id}", packet_type=packet.packet_type.name, game_id=game.game_id
+            )
+        self.fan_out(game, packet.packet_type, lambda codec: codec.encode(packet))
 
-            return True
-        return False
+    def encoded_sync(self, game: Game, codec: Codec) -> bytes:
+        """SyncGame for the game's current state, only encoded again after the game changes."""
+        if self.games.get(game.game_id) is not game:
+            # Removed games aren't cached, a slow spectator may still ask for the final state
+            return codec.encode(SyncGame(game=game))
+
+        cached = self.sync_cache.setdefault(game.game_id, {})
+        if codec not in cached:
+            cached[codec] = codec.encode(SyncGame(game=game))
+        return cached[codec]
+
+    async def broadcast_sync(self, game: Game):
+        self.fan_out(game, Packets.SYNC_GAME, lambda codec: self.encoded_sync(game, codec))
+
+    async def remove_game(self, game_id: str) -> bool:
+        """Close every connection to the game and forget everything indexed by it."""
+        if task := self.bot_tasks.pop(game_id, None):
+            task.cancel()
+        self.sync_cache.pop(game_id, None)
+        self.history.pop(game_id, None)
+        self.started_at.pop(game_id, None)
+        if timer := self.game_timers.pop(game_id, None):
+            timer.cancel()
+
+        if (game := self.registry.remove_game(game_id)) is None:
+            return False
+
+        for player in (game.red_player, game.yellow_player):
+            if player is not None and (timer := self.held.pop(player.id, None)):
+                timer.cancel()
+
+        if self.journal is not None and game.turn is not None:
+            self.journal.ended(game_id)
 
-    async def close_writer(self, writer):
         try:
-            writer.close()
-            await writer.wait_closed()
-        except ssl.SSLError:
-            pass
+            await self.broadcast(game, ConnectionLost())
+            for writer in self.recipients(game):
+                self.close_connection(writer)
+            for writer in self.spectators.pop(game_id, ()):
+                self.spectating.pop(writer, None)
+                self.close_connection(writer)
+            logger.info("Removed game {}", game_id)
+        except Exception as e:
+            logger.debug("Bypassing error while removing game: {}", e)
+        return True
 
-    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, first: bytes | None = None):
+        """Serve a connection, ``first`` is its first line when a shard router already read it."""
         addr = writer.get_extra_info("peername")
         logger.info("Connection from {}", addr)
+        self.connection_count.inc()
+        self.watch(writer)
+        try:
+            await self.serve_packets(reader, writer, addr, first)
+        finally:
+            logger.info("Closing connection {}", addr)
+            self.connection_count.dec()
+            self.seen.pop(writer, None)
+            if timer := self.idle.pop(writer, None):
+                timer.cancel()
+            self.registry.leave(addr)
+            self.matchmaker.leave(writer)
+            self.stop_spectating(writer)
+            self.close_connection(writer)
 
+    async def serve_packets(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr: tuple, first: bytes | None = None
+    ):
+        """Handle the connection's packets until it is closed or its game ended."""
         while True:
-            packet = await self.get_packet(reader, writer)
+            trace = self.tracer.start()
+            packet = await self.get_packet(reader, writer, first)
+            first = None
+            self.seen[writer] = time.monotonic()
 
             if packet is None:
                 logger.info("Connection lost {}", addr)
-                await self.close_writer(writer)
-                await self.remove_game(addr)
+                if (session := self.registry.session(addr)) is not None:
+                    await self.drop_player(session.game_id, session.player_id)
                 break
 
-            if not packet:
-                continue
+            ended = False
+            if packet:
+                started = time.perf_counter()
+                ended = await self.handle_packet(writer, packet)
+                if trace is not None:
+                    # Encoding and writing the responses are traced as phases of their own
+                    trace.add("handle", time.perf_counter() - started - trace.phases["serialize"] - trace.phases["write"])
+
+            if self.tracer.finish(trace, addr, packet):
+                self.slow_packets.inc()
+            if ended:
+                break
 
-            if isinstance(packet, ConnectRequest):
-                self.connections[addr] = packet.game_id
+    def watch(self, writer: asyncio.StreamWriter):
+        """Start checking that packets keep arriving on a new connection."""
+        self.seen[writer] = time.monotonic()
+        first_check = self.ping_interval if self.ping_interval > 0 else self.idle_timeout
+        if first_check > 0:
+            self.idle[writer] = self.timers.schedule(first_check, self.check_idle, writer)
 
-                await self.handle_connect_request(writer, packet)
+    def check_idle(self, writer: asyncio.StreamWriter):
+        """Ping a connection that went quiet and close it once it stayed quiet too long.
 
-            if isinstance(packet, SyncGame):
-                await self.handle_sync_game(writer, packet)
+        Packets only record when they arrived, the check reschedules itself from that, so a
+        busy connection costs one timer per check rather than one per packet.
+        """
+        if (seen := self.seen.get(writer)) is None:
+            return
+        idle = time.monotonic() - seen
+
+        if 0 < self.idle_timeout <= idle:
+            logger.info("Closing {}, nothing received for {:.0f}s", writer.get_extra_info("peername"), idle)
+            self.timeouts.inc("idle")
+            self.idle.pop(writer, None)
+            # A half-open connection never takes what is queued, so don't wait to flush it
+            if (outbox := self.outboxes.pop(writer, None)) is not None:
+                outbox.abort()
+            else:
+                writer.close()
+            return
+
+        if 0 < self.ping_interval <= idle:
+            outbox = self.outbox(writer)
+            self.packets_sent.inc(Packets.PING.name)
+            self.queue(outbox, False, outbox.codec.encode, PING)
+            wait = self.ping_interval
+        else:
+            wait = (self.ping_interval if self.ping_interval > 0 else self.idle_timeout) - idle
+        if self.idle_timeout > 0:
+            wait = min(wait, self.idle_timeout - idle)
+        self.idle[writer] = self.timers.schedule(wait, self.check_idle, writer)
 
-            if isinstance(packet, Move):
-                if winner := await self.handle_move(writer, packet):
-                    logger.info("{} won there game in lobby {}", winner, packet.game_id)
-                    await self.remove_game(addr)
-                    break
+    async def handle_packet(self, writer: asyncio.StreamWriter, packet: Packet) -> bool:
+        """Handle one packet, returns True once the connection's game ended."""
+        if isinstance(packet, ConnectRequest):
+            await self.handle_connect_request(writer, packet)
 
-        logger.info("Closing connection {}", addr)
-        await self.close_writer(writer)
+        if isinstance(packet, SyncRequest):
+            await self.handle_sync_request(writer, packet)
+
+        if isinstance(packet, Spectate):
+            await self.handle_spectate(writer, packet)
+
+        if isinstance(packet, Matchmake):
+            await self.handle_matchmake(writer, packet)
+
+        if isinstance(packet, Resume):
+            await self.handle_resume(writer, packet)
+
+        if isinstance(packet, Move):
+            started = time.perf_counter()
+            ended = await self.handle_move(writer, packet)
+            self.move_seconds.observe(time.perf_counter() - started)
+            if ended:
+                await self.remove_game(packet.game_id)
+                return True
+        return False
+
+    def busy(self, writer: asyncio.StreamWriter) -> bool:
+        """Whether the connection is already playing, waiting for a match or spectating."""
+        return (
+            self.registry.session(writer.get_extra_info("peername")) is not None
+            or writer in self.matchmaker
+            or writer in self.spectating
+        )
 
     async def handle_connect_request(self, writer: asyncio.StreamWriter, packet: ConnectRequest):
+        if self.busy(writer):
+            return await self.send(writer, Error(message="Already in a game"))
+
         game = self.games.get(packet.game_id)
         player = Player(
             name=packet.username,
@@ -115,56 +457,550 @@ class ConnectFourServer:
         )
         player._writer = writer
 
-        if game is None:
-            self.games[packet.game_id] = Game(
-                game_id=packet.game_id,
-                red_player=player,
-                yellow_player=None,
-                turn=None,
-                board=ConnectFour(),
+        if packet.bot:
+            if game is not None:
+                return await self.send(writer, Error(message="Game already exists"))
+            if self.search_pool is None:
+                return await self.send(writer, Error(message="Bots are not enabled on this server"))
+
+            bot = Player(name="Bot", id=uuid.uuid4(), addr=BOT_ADDR)
+            game = self.registry.add_game(
+                Game(
+                    game_id=packet.game_id,
+                    red_player=player,
+                    yellow_player=None,
+                    turn=None,
+                    board=ConnectFour(),
+                )
             )
-            response = ConnectResponse(player=player, game=self.games[packet.game_id])
-            await self.send(writer, response)
+            await self.accept(writer, packet, player, game)
+            await self.start_game(game, bot)
+        elif game is None:
+            game = self.registry.add_game(
+                Game(
+                    game_id=packet.game_id,
+                    red_player=player,
+                    yellow_player=None,
+                    turn=None,
+                    board=ConnectFour(),
+                )
+            )
+            await self.accept(writer, packet, player, game)
+            self.set_game_timer(game.game_id, self.lobby_timeout, self.expire_lobby)
         elif game.red_player and not game.yellow_player:
-            response = ConnectResponse(player=player, game=self.games[packet.game_id])
-            await self.send(writer, response)
-            game.yellow_player = player
-            await self.broadcast(game, FoundGame())
-
-            game.turn = random.choice([game.yellow_player.id, game.red_player.id])
-            await self.broadcast(game, SyncGame(game=game))
+            await self.accept(writer, packet, player, game)
+            await self.start_game(game, player)
         else:
             await self.send(writer, Error(message="Game already full"))
 
-    async def handle_sync_game(self, writer: asyncio.StreamWriter, packet: ConnectRequest):
+    async def accept(self, writer: asyncio.StreamWriter, request: ConnectRequest | Matchmake, player: Player, game: Game):
+        """Index the player's connection to the game and send its ConnectResponse."""
+        self.registry.join(game, player)
+        self.confirm(writer, request, player, game)
+
+    def confirm(self, writer: asyncio.StreamWriter, request: ConnectRequest | Matchmake, player: Player, game: Game):
+        """Send the ConnectResponse as JSON then switch the connection to the requested encoding."""
+        response = ConnectResponse(
+            player=player, game=game, encoding=request.encoding, resume_token=self.resume_token(player.id)
+        )
+        self.respond(self.follow(writer, game), response, request.encoding)
+
+    def respond(self, outbox: Outbox, response: Packet, encoding: Encoding):
+        """Queue a response as JSON then switch the connection to ``encoding``."""
+        # Queued matchmaking players may already have switched, the response itself is always JSON
+        self.packets_sent.inc(response.packet_type.name)
+        self.queue(outbox, False, JSON_CODEC.encode, response)
+        outbox.codec = CODECS[encoding]
+
+    def resume_token(self, player_id: uuid.UUID) -> str:
+        signature = hmac.new(self.secret, player_id.bytes, hashlib.sha256).hexdigest()
+        return f"{player_id}.{signature}"
+
+    def check_token(self, token: str) -> uuid.UUID | None:
+        """Id of the player the token was issued to, None when this server didn't sign it."""
+        player_id, _, _ = token.partition(".")
+        try:
+            player_id = uuid.UUID(player_id)
+        except ValueError:
+            return None
+        return player_id if hmac.compare_digest(token, self.resume_token(player_id)) else None
+
+    async def drop_player(self, game_id: str, player_id: uuid.UUID):
+        """Hold a started game for a player whose connection dropped, any other game ends."""
+        game = self.games.get(game_id)
+        if game is None:
+            return
+        if game.turn is None or self.grace <= 0:
+            await self.remove_game(game_id)
+            return
+
+        player = game.red_player if game.red_player.id == player_id else game.yellow_player
+        player._writer = None
+        self.hold(game_id, player_id, self.grace)
+        logger.info("Holding lobby {} for {} for {}s", game_id, player.name, self.grace)
+
+    def hold(self, game_id: str, player_id: uuid.UUID, timeout: float):
+        """End the game unless the player resumes it within ``timeout`` seconds."""
+        self.held[player_id] = self.timers.schedule(timeout, self.expire_hold, game_id, player_id)
+
+    async def expire_hold(self, game_id: str, player_id: uuid.UUID):
+        self.held.pop(player_id, None)
+        logger.info("Player {} didn't resume lobby {}", player_id, game_id)
+        self.timeouts.inc("grace")
+        await self.remove_game(game_id)
+
+    def set_game_timer(self, game_id: str, delay: float, callback: Callable, *args):
+        """Replace the game's timer with ``callback(game_id, *args)`` in ``delay`` seconds, none when it is 0."""
+        if timer := self.game_timers.pop(game_id, None):
+            timer.cancel()
+        if delay > 0:
+            self.game_timers[game_id] = self.timers.schedule(delay, callback, game_id, *args)
+
+    def start_turn(self, game: Game):
+        """Give the player to move turn_timeout seconds, the bot's search is already bounded by bot_time."""
+        self.set_game_timer(game.game_id, 0 if self.is_bot(game, game.turn) else self.turn_timeout, self.expire_turn, game.seq)
+
+    async def expire_turn(self, game_id: str, seq: int):
+        """The player to move forfeits, unless a move was made after all."""
+        game = self.games.get(game_id)
+        if game is None or game.seq != seq or game.state == GameState.FINISHED:
+            return
+
+        self.game_timers.pop(game_id, None)
+        loser, winner = (
+            (game.red_player, game.yellow_player) if game.turn == game.red_player.id else (game.yellow_player, game.red_player)
+        )
+        logger.info("{} ran out of time in lobby {}", loser.name, game_id)
+        self.timeouts.inc("turn")
+        await self.end_game(game, winner)
+        await self.remove_game(game_id)
+
+    async def expire_lobby(self, game_id: str):
+        game = self.games.get(game_id)
+        if game is None or game.turn is not None:
+            return
+
+        self.game_timers.pop(game_id, None)
+        logger.info("Nobody joined lobby {} in time", game_id)
+        self.timeouts.inc("lobby")
+        await self.remove_game(game_id)
+
+    async def handle_resume(self, writer: asyncio.StreamWriter, packet: Resume):
+        addr = writer.get_extra_info("peername")
+        if self.busy(writer):
+            return await self.send(writer, Error(message="Already in a game"))
+
+        player_id = self.check_token(packet.token)
+        game = self.games.get(packet.game_id)
+        players = () if game is None or player_id is None else (game.red_player, game.yellow_player)
+        player = next((player for player in players if player is not None and player.id == player_id), None)
+        # Only a seat held for a dropped player, or still bound to a connection, can change hands
+        if player is None or player.addr == BOT_ADDR or (player.id not in self.held and player.id not in self.registry.players):
+            return await self.send(writer, Error(message="Can't resume that game"))
+
+        if timer := self.held.pop(player.id, None):
+            timer.cancel()
+        if (session := self.registry.players.get(player.id)) is not None:
+            # The old connection hasn't noticed it dropped yet, the token proves this is the same player
+            self.registry.leave(session.addr)
+            self.close_connection(session.writer)
+
+        player.addr = addr
+        player._writer = writer
+        self.registry.join(game, player)
+        outbox = self.follow(writer, game)
+        self.respond(outbox, ResumeResponse(player=player, encoding=packet.encoding), packet.encoding)
+
+        missed = self.missed(game, packet.seq)
+        if missed is None:
+            outbox.resync()
+        for applied in missed or ():
+            await self.send(writer, applied)
+        logger.info("{} resumed lobby {} at move {}", player.name, game.game_id, game.seq)
+
+    def missed(self, game: Game, seq: int | None) -> list[MoveApplied] | None:
+        """Moves made after ``seq``, None when the client has to be sent the whole game instead."""
+        history = self.history.get(game.game_id, [])
+        if seq is None or not game.seq - len(history) <= seq <= game.seq:
+            return None
+        return history[len(history) - (game.seq - seq) :]
+
+    async def handle_matchmake(self, writer: asyncio.StreamWriter, packet: Matchmake):
         addr = writer.get_extra_info("peername")
-        game_id = self.connections.get(addr)
+        if self.busy(writer):
+            return await self.send(writer, Error(message="Already in a game"))
+
+        player = Player(name=packet.username, id=uuid.uuid4(), addr=addr)
+        player._writer = writer
+
+        partner = self.matchmaker.join(writer, packet.bucket, (player, packet))
+        if partner is not None:
+            return await self.pair(partner.value, (player, packet))
+
+        # The connection is read again while it waits, and once paired from another connection's task. The
+        # client sends nothing before its ConnectResponse, so that read has to use the requested encoding already.
+        self.outbox(writer).codec = CODECS[packet.encoding]
+
+    async def pair(self, red: tuple[Player, Matchmake], yellow: tuple[Player, Matchmake]):
+        """Start a game between two players from the matchmaking queue, red waited the longest."""
+        game_id = f"{MATCH_PREFIX}{uuid.uuid4().hex[:12]}"
+        game = Game(
+            game_id=game_id,
+            red_player=red[0],
+            yellow_player=None,
+            turn=None,
+            board=ConnectFour(),
+        )
+
+        # Both players join before the game exists, so a failure can't leave a half started game behind
+        players = (red, yellow)
+        for index, (player, _) in enumerate(players):
+            try:
+                self.registry.join(game, player)
+            except ValueError as e:
+                logger.warning("Couldn't match {} with {}: {}", red[0].name, yellow[0].name, e)
+                for joined, _ in players[:index]:
+                    self.registry.leave(joined.addr)
+                for failed, _ in players:
+                    await self.send(failed._writer, Error(message="Couldn't start the match"))
+                return
+
+        self.registry.add_game(game)
+        for player, request in players:
+            self.confirm(player._writer, request, player, game)
+
+        logger.info("Matched {} with {} in lobby {}", red[0].name, yellow[0].name, game_id)
+        await self.start_game(game, yellow[0])
+
+    async def widen_matches(self):
+        """Pair players that waited too long for someone in their own bucket, runs as long as the server does."""
+        while True:
+            await asyncio.sleep(min(1.0, self.matchmaker.widen_after))
+            for red, yellow in self.matchmaker.widen():
+                await self.pair(red.value, yellow.value)
+
+    async def snapshot_games(self, interval: float):
+        """Snapshot every game each ``interval`` seconds something was journaled in, runs as long as the server does."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.journal.records:
+                await self.journal.snapshot(list(self.games.values()))
+
+    async def flush_archive(self, interval: float):
+        """Write the archived games buffered so far each ``interval`` seconds, runs as long as the server does."""
+        while True:
+            await asyncio.sleep(interval)
+            self.archive.flush()
+
+    async def start_game(self, game: Game, yellow_player: Player):
+        game.yellow_player = yellow_player
+        await self.broadcast(game, FoundGame())
+
+        game.turn = random.choice([game.yellow_player.id, game.red_player.id])
+        self.started_at[game.game_id] = time.time()
+        self.sync_cache.pop(game.game_id, None)
+        if self.journal is not None:
+            self.journal.started(game)
+        self.start_turn(game)
+        await self.broadcast_sync(game)
+        self.schedule_bot_move(game)
+
+    def restore(self, games: list[Game], timeout: float):
+        """Add games recovered from the journal, held for ``timeout`` seconds until their players resume them."""
+        restored = 0
+        for game in games:
+            if self.search_pool is None and BOT_ADDR in (game.red_player.addr, game.yellow_player.addr):
+                logger.warning("Not restoring lobby {}, bots are disabled", game.game_id)
+                continue
+
+            self.registry.add_game(game)
+            for player in (game.red_player, game.yellow_player):
+                if player.addr != BOT_ADDR:
+                    self.hold(game.game_id, player.id, timeout)
+            self.start_turn(game)
+            self.schedule_bot_move(game)
+            restored += 1
+        logger.info("Restored {} games", restored)
+
+    def is_bot(self, game: Game, player_id) -> bool:
+        player = game.red_player if player_id == game.red_player.id else game.yellow_player
+        return player is not None and player.addr == BOT_ADDR
+
+    def schedule_bot_move(self, game: Game):
+        if self.is_bot(game, game.turn):
+            self.bot_tasks[game.game_id] = asyncio.create_task(self.play_bot_move(game))
+
+    async def play_bot_move(self, game: Game):
+        color = ConnectCell.RED if game.turn == game.red_player.id else ConnectCell.YELLOW
+        try:
+            result = await self.search_pool.search(game.game_id, game.board, color, self.bot_time)
+        except Exception:
+            # Bot turns have no timer, so the bot has to move regardless or the game never goes on
+            logger.exception("Bot search in lobby {} failed, playing from move ordering", game.game_id)
+            self.bot_failures.inc()
+            column = self.search_pool.fallback_move(game.board, color)
+        else:
+            column = result.column
+            logger.debug("Bot in lobby {} plays {} after searching {} plies", game.game_id, column, result.depth)
+
+        self.bot_tasks.pop(game.game_id, None)
+        if await self.apply_move(game, column):
+            await self.remove_game(game.game_id)
+
+    async def handle_spectate(self, writer: asyncio.StreamWriter, packet: Spectate):
+        game = self.games.get(packet.game_id)
+        if game is None:
+            return await self.send(writer, Error(message="Game does not exist"))
+
+        if self.busy(writer):
+            return await self.send(writer, Error(message="Already in a game"))
+
+        # Like ConnectResponse the response is JSON and everything after it uses the requested encoding
+        await self.send(writer, SpectateResponse(game=game, encoding=packet.encoding))
+
+        outbox = self.follow(writer, game)
+        outbox.codec = CODECS[packet.encoding]
+        # However far behind players may fall, spectators are only ever sent the latest state
+        outbox.limit = self.spectator_queue
+        outbox.policy = SlowClientPolicy.COALESCE
+
+        self.spectators.setdefault(game.game_id, set()).add(writer)
+        self.spectating[writer] = game.game_id
+        logger.info("{} is spectating lobby {}", writer.get_extra_info("peername"), game.game_id)
 
-        if game_id is None:
+    def stop_spectating(self, writer: asyncio.StreamWriter):
+        if (game_id := self.spectating.pop(writer, None)) is None:
+            return
+
+        watchers = self.spectators.get(game_id, set())
+        watchers.discard(writer)
+        if not watchers:
+            self.spectators.pop(game_id, None)
+
+    async def handle_sync_request(self, writer: asyncio.StreamWriter, packet: SyncRequest):
+        session = self.registry.session(writer.get_extra_info("peername"))
+        game_id = self.spectating.get(writer) if session is None else session.game_id
+
+        if game_id is None or game_id != packet.game_id or game_id not in self.games:
             return await self.send(writer, Error(message="Not Registered"))
 
-        await self.send(SyncGame(game=self.games[game_id]))
+        # The state goes through the outbox so it stays in order with the moves queued before it
+        self.follow(writer, self.games[game_id]).resync()
+
+    async def handle_move(self, writer, packet: Move) -> bool:
+        # Only the connection's session is consulted, the packet's player is whatever the client claims
+        session = self.registry.session(writer.get_extra_info("peername"))
+        if session is None or session.game_id != packet.game_id:
+            await self.send(writer, Error(message="Not Registered"))
+            return False
+
+        game = self.games[session.game_id]
+        if session.player_id != game.turn:
+            await self.send(writer, Error(message="It is not your turn"))
+            return False
+
+        if not 0 <= packet.index < game.board.cols:
+            await self.send(writer, Error(message=f"Column {packet.index} is not on the board"))
+            return False
 
-    async def handle_move(self, writer, packet: Move):
-        game = self.games[packet.game_id]
+        if not game.board.can_play(packet.index):
+            await self.send(writer, Error(message=f"Column {packet.index} is full"))
+            return False
+
+        return await self.apply_move(game, packet.index)
+
+    async def apply_move(self, game: Game, index: int) -> bool:
+        """Drop the current player's piece in a column already checked to be playable, returns True when the game ended."""
+        color, result = game.play(index)
+        self.sync_cache.pop(game.game_id, None)
+        if self.journal is not None:
+            self.journal.moved(game, index)
+
+        if result.winner or result.draw:
+            player = None
+            if result.winner:
+                player = game.red_player if result.winner == ConnectCell.RED else game.yellow_player
+                logger.info("{} won their game in lobby {}", player.name, game.game_id)
+            else:
+                logger.info("Game in lobby {} ended in a draw", game.game_id)
+
+            await self.end_game(game, player, index)
+            return True
 
-        if game.turn == game.red_player.id:
-            game.turn = game.yellow_player.id
-            color = ConnectCell.RED
+        # Clients apply the move to their copy of the board and ask for a SyncGame if they missed one
+        applied = MoveApplied(game_id=game.game_id, index=index, row=result.row, color=color, turn=game.turn, seq=game.seq)
+        self.history.setdefault(game.game_id, []).append(applied)
+        await self.broadcast(game, applied)
+        self.start_turn(game)
+        self.schedule_bot_move(game)
+        return False
+
+    async def end_game(self, game: Game, winner: Player | None, last: int | None = None):
+        """Tell everyone the game is over, ``last`` is the column of the move that ended it if one did."""
+        game.state = GameState.FINISHED
+        if self.archive is not None:
+            self.archive_game(game, winner, last)
+        await self.broadcast(game, GameOver(game=game, winner=winner))
+
+    def archive_game(self, game: Game, winner: Player | None, last: int | None = None):
+        history = self.history.get(game.game_id, [])
+        moves = [applied.index for applied in history] + ([] if last is None else [last])
+        started = self.started_at.get(game.game_id)
+        # Restored games have lost their moves from before the restart
+        if started is None or len(moves) != game.seq:
+            logger.debug("Not archiving game {}, its history is incomplete", game.game_id)
+            return
+
+        # Colors alternate, so whoever is to move now moved first after an even number of moves
+        to_move = ConnectCell.RED if game.turn == game.red_player.id else ConnectCell.YELLOW
+        first = to_move if game.seq % 2 == 0 else (ConnectCell.YELLOW if to_move == ConnectCell.RED else ConnectCell.RED)
+        if winner is None:
+            winner_color = ConnectCell.EMPTY
         else:
-            color = ConnectCell.YELLOW
-            game.turn = game.red_player.id
+            winner_color = ConnectCell.RED if winner.id == game.red_player.id else ConnectCell.YELLOW
+
+        self.archive.append(
+            ArchivedGame(
+                game.game_id,
+                game.red_player.id,
+                game.red_player.name,
+                game.yellow_player.id,
+                game.yellow_player.name,
+                winner_color,
+                first,
+                game.board.rows,
+                game.board.cols,
+                int(started),
+                int(time.time()),
+                bytes(moves),
+            )
+        )
+
 
-        game.board.drop_piece(packet.index, color)
+async def serve(args: argparse.Namespace, router: ShardRouter | None = None):
+    search_workers = args.search_workers
+    if router is not None:
+        # Every shard has its own pool, split the cores between them
+        search_workers = max(1, (search_workers or os.cpu_count() or 1) // router.count)
 
-        if winner := game.board.check_win():
-            player = game.red_player if winner == ConnectCell.RED else game.yellow_player
-            game.state = GameState.FINISHED
-            await self.broadcast(game, GameOver(game=game, winner=player))
-            return player
+    search_pool = SearchPool(search_workers, args.book) if args.bots else None
+    metrics = Metrics(enabled=args.metrics_port is not None)
+    tracer = SlowPacketTracer(args.slow_packet)
+    journal = None
+    if args.journal is not None:
+        # Every shard restores and journals the games it owns on its own
+        journal = Journal(args.journal / f"shard-{router.index}" if router is not None else args.journal)
+    archive = None
+    if args.archive is not None:
+        archive = ArchiveWriter(args.archive / f"shard-{router.index}" if router is not None else args.archive)
+    connect_four = ConnectFourServer(
+        search_pool,
+        args.bot_time,
+        args.spectator_queue,
+        args.high_water,
+        args.slow_clients,
+        args.widen_after,
+        metrics,
+        tracer,
+        journal,
+        args.grace,
+        journal.secret() if journal is not None else None,
+        archive,
+        args.idle_timeout,
+        args.ping_interval,
+        args.turn_timeout,
+        args.lobby_timeout,
+    )
+    tasks = [asyncio.create_task(connect_four.widen_matches())]
+    if archive is not None:
+        tasks.append(asyncio.create_task(connect_four.flush_archive(args.archive_interval)))
 
-        await self.broadcast(game, SyncGame(game=game))
-        return None
+    if journal is not None:
+        connect_four.restore(journal.recover(), args.rejoin_timeout)
+        # Compacts whatever the last run left behind, a torn segment included
+        await journal.snapshot(list(connect_four.games.values()))
+        journal.start()
+        tasks.append(asyncio.create_task(connect_four.snapshot_games(args.snapshot_interval)))
+
+    # kill -USR1 <pid> profiles the process for --profile-seconds, sending it again stops early
+    profiler = Profiler(args.profile_dir, args.profile_seconds, args.profiler)
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, profiler.toggle)
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        # Every shard has its own metrics on the next port up
+        metrics_server = await metrics.serve(args.metrics_host, args.metrics_port + (router.index if router else 0))
+
+    ssl_context = handshakes = None
+    if args.ssl:
+        ssl_context = server_context(args.ssl_cert, args.ssl_key)
+        handshakes = HandshakeMetrics(metrics, ssl_context)
+
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if handshakes is not None:
+            handshakes.accepted(writer)
+        await connect_four.handle_client(reader, writer)
+
+    try:
+        if router is not None:
+            await router.serve(
+                connect_four.handle_client, args.host, args.port, ssl_context, handshakes.accepted if handshakes else None
+            )
+            return
+
+        server = await asyncio.start_server(handle_client, args.host, args.port, ssl=ssl_context)
+        logger.info("Serving on {}", server.sockets[0].getsockname())
+
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if journal is not None:
+            await journal.close()
+        connect_four.timers.close()
+        if archive is not None:
+            await asyncio.to_thread(archive.close)
+        profiler.stop()
+        if metrics_server is not None:
+            metrics_server.close()
+        if search_pool is not None:
+            search_pool.shutdown()
+
+
+def run_shard(args: argparse.Namespace, index: int, runtime_dir: Path):
+    # Shards are spawned, only the module level defaults were applied
+    configure_logging(args.debug, args.log_queue, args.log_json)
+    try:
+        first_packet_timeout = args.idle_timeout if args.idle_timeout > 0 else None
+        asyncio.run(serve(args, ShardRouter(index, args.shards, runtime_dir, first_packet_timeout)))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_sharded(args: argparse.Namespace):
+    """Run a shard per process, connections are routed to the shard owning their game."""
+    runtime_dir = Path(tempfile.mkdtemp(prefix="connect-four-"))
+    context = multiprocessing.get_context("spawn")
+    shards = [context.Process(target=run_shard, args=(args, index, runtime_dir)) for index in range(args.shards)]
+
+    for shard in shards:
+        shard.start()
+
+    if hasattr(signal, "SIGUSR1"):
+        # Profiling the parent shows nothing, profile every shard instead
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGUSR1, lambda: [os.kill(shard.pid, signal.SIGUSR1) for shard in shards if shard.is_alive()]
+        )
+
+    try:
+        await asyncio.to_thread(lambda: [shard.join() for shard in shards])
+    finally:
+        for shard in shards:
+            shard.terminate()
+        shutil.rmtree(runtime_dir, ignore_errors=True)
 
 
 async def main():
@@ -175,23 +1011,99 @@ async def main():
     parser.add_argument("--ssl-cert", type=Path, default=Path("certs/fullchain.pem"), help="Path to ssl certificate")
     parser.add_argument("--ssl-key", type=Path, default=Path("certs/privkey.pem"), help="Path to SSL private key")
     parser.add_argument("--ssl", action=argparse.BooleanOptionalAction, default=True, help="Options to enable or disable SSL")
+    parser.add_argument("--bots", action=argparse.BooleanOptionalAction, default=True, help="Allow games against a bot")
+    parser.add_argument(
+        "--search-workers", type=int, default=None, help="Processes searching bot moves, defaults to every core"
+    )
+    parser.add_argument("--bot-time", type=float, default=2.0, help="Seconds the bot may think per move")
+    parser.add_argument("--book", type=Path, default=None, help="Opening book used by the bot")
+    parser.add_argument("--high-water", type=int, default=64 * 1024, help="Bytes a connection may have waiting to be sent")
+    parser.add_argument(
+        "--slow-clients",
+        type=SlowClientPolicy,
+        choices=list(SlowClientPolicy),
+        default=SlowClientPolicy.COALESCE,
+        help="What to do with a player that falls --high-water bytes behind",
+    )
+    parser.add_argument(
+        "--spectator-queue",
+        type=int,
+        default=32,
+        help="Packets a spectator may fall behind by before it is only sent the latest state",
+    )
 
-    args = parser.parse_args()
-
-    connect_four = ConnectFourServer()
+    parser.add_argument(
+        "--widen-after",
+        type=float,
+        default=10.0,
+        help="Seconds a matchmaking player waits before neighbouring rating buckets are searched too",
+    )
+    parser.add_argument(
+        "--shards", type=int, default=1, help="Processes serving games, each game lives in the one its id hashes to"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port, metrics are off without it"
+    )
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Address the metrics are served on")
+    parser.add_argument(
+        "--slow-packet",
+        type=float,
+        default=None,
+        help="Log every packet that took longer than this many seconds to handle, with the time of each phase",
+    )
+    parser.add_argument(
+        "--profiler", choices=list(PROFILERS), default="cprofile", help="How the server is profiled after a SIGUSR1"
+    )
+    parser.add_argument("--profile-seconds", type=float, default=30.0, help="Seconds a SIGUSR1 profiles the server for")
+    parser.add_argument("--profile-dir", type=Path, default=Path("profiles"), help="Directory profiles are written to")
 
-    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    ssl_context.load_cert_chain(args.ssl_cert, args.ssl_key)
+    parser.add_argument(
+        "--journal", type=Path, default=None, help="Directory games are journaled to and restored from after a restart"
+    )
+    parser.add_argument(
+        "--snapshot-interval", type=float, default=60.0, help="Seconds between snapshots that compact the journal"
+    )
+    parser.add_argument(
+        "--rejoin-timeout",
+        type=float,
+        default=300.0,
+        help="Seconds players of restored games have to resume them before they are removed",
+    )
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=30.0,
+        help="Seconds a started game is held for a player whose connection dropped, 0 ends it straight away",
+    )
+    parser.add_argument("--archive", type=Path, default=None, help="Directory every finished game is archived to for analysis")
+    parser.add_argument("--archive-interval", type=float, default=60.0, help="Seconds archived games are buffered for at most")
+    parser.add_argument(
+        "--idle-timeout", type=float, default=60.0, help="Seconds a connection may send nothing before it is closed, 0 never"
+    )
+    parser.add_argument(
+        "--ping-interval", type=float, default=20.0, help="Seconds of silence after which a connection is sent a PING"
+    )
+    parser.add_argument(
+        "--turn-timeout", type=float, default=120.0, help="Seconds a player has for a move before forfeiting, 0 forever"
+    )
+    parser.add_argument(
+        "--lobby-timeout", type=float, default=600.0, help="Seconds a lobby waits for a second player, 0 forever"
+    )
+    parser.add_argument(
+        "--log-queue",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Write logs from a background thread so slow output never blocks the event loop",
+    )
+    parser.add_argument("--log-json", action="store_true", help="Log every record as a line of JSON with its fields")
 
-    server_args = {}
-    if args.ssl:
-        server_args["ssl"] = ssl_context
-
-    server = await asyncio.start_server(connect_four.handle_client, args.host, args.port, **server_args)
-    logger.info("Serving on {}", server.sockets[0].getsockname())
+    args = parser.parse_args()
+    configure_logging(args.debug, args.log_queue, args.log_json)
 
-    async with server:
-        await server.serve_forever()
+    if args.shards > 1:
+        await serve_sharded(args)
+    else:
+        await serve(args)
 
 
 if __name__ == "__main__":
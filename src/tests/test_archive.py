@@ -0,0 +1,141 @@
+import asyncio
+import random
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+from lib.archive import FILE_HEADER, ArchivedGame, ArchiveReader, ArchiveWriter, pack_moves, unpack_moves
+from lib.connect_four import ConnectCell
+from lib.packets import ConnectRequest, Move
+from server import ConnectFourServer
+from tests.test_server import FakeWriter
+
+PLAYERS = [f"player {i}" for i in range(9)] + ["yellow ✓"]
+
+
+def random_games(count: int, start: int = 0) -> list[ArchivedGame]:
+    rng = random.Random(count)
+    games = []
+    for i in range(start, start + count):
+        # Like the server's, ids are new for every game and only the names repeat
+        red, yellow = rng.sample(PLAYERS, 2)
+        moves = bytes(rng.randrange(7) for _ in range(rng.randrange(7, 43)))
+        winner = rng.choice(list(ConnectCell))
+        first = rng.choice([ConnectCell.RED, ConnectCell.YELLOW])
+        games.append(ArchivedGame(f"game-{i}", uuid.uuid4(), red, uuid.uuid4(), yellow, winner, first, 6, 7, i, i + 60, moves))
+    return games
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, games: list[ArchivedGame], **kwargs):
+        writer = ArchiveWriter(self.path, **kwargs)
+        for game in games:
+            writer.append(game)
+        writer.close()
+
+    def test_moves(self):
+        for moves in (b"", b"\x03", b"\x00\x0f\x01", bytes(range(16))):
+            with self.subTest(moves=moves):
+                packed = pack_moves(moves)
+                self.assertEqual(len(packed), (len(moves) + 1) // 2)
+                self.assertEqual(unpack_moves(packed, len(moves)), moves)
+
+    def test_round_trip(self):
+        games = random_games(100)
+        self.write(games, chunk_games=16)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 100)
+            self.assertEqual(list(reader.games()), games)
+
+    def test_appends_and_segments(self):
+        """Test that reopening appends, and a full segment starts the next one."""
+        first, second = random_games(50), random_games(50, start=50)
+        self.write(first, chunk_games=10, segment_bytes=1024)
+        self.write(second, chunk_games=10, segment_bytes=1024)
+        self.assertGreater(len(list(self.path.glob("*.c4a"))), 1)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(list(reader.games()), first + second)
+
+    def test_reopened_full_segment(self):
+        """Test that a segment already full when the writer opens it isn't written to again."""
+        games = random_games(2)
+        for game in games:
+            self.write([game], segment_bytes=FILE_HEADER.size + 1)
+        self.assertEqual(len(list(self.path.glob("*.c4a"))), 2)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(list(reader.games()), games)
+
+    def test_queries(self):
+        games = random_games(200)
+        self.write(games, chunk_games=8)
+        player = PLAYERS[0]
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(
+                list(reader.games(player=player)), [game for game in games if player in (game.red_name, game.yellow_name)]
+            )
+            self.assertEqual(list(reader.games(since=100, until=119)), [game for game in games if 100 <= game.ended <= 119])
+            self.assertEqual(list(reader.games(player="nobody")), [])
+
+    def test_torn_chunk(self):
+        """Test that a chunk cut short by a crash is ignored, and dropped when the archive is written again."""
+        games = random_games(30)
+        self.write(games[:20], chunk_games=10)
+        data, index = self.path / "games-00000000.c4a", self.path / "games-00000000.idx"
+        with open(data, "ab") as file:
+            file.write(b"torn")
+        with open(index, "ab") as file:
+            file.write(b"\x01" * 10)
+
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(list(reader.games()), games[:20])
+
+        self.write(games[20:], chunk_games=10)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(list(reader.games()), games)
+
+    def test_not_an_archive(self):
+        (self.path / "games-00000000.c4a").write_bytes(b"\0" * FILE_HEADER.size)
+        with self.assertRaises(ValueError):
+            ArchiveWriter(self.path)
+
+
+class TestServerArchive(unittest.IsolatedAsyncioTestCase):
+    async def test_finished_game(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = ArchiveWriter(Path(directory))
+            server = ConnectFourServer(archive=archive)
+            red_writer = FakeWriter(("127.0.0.1", 1))
+            yellow_writer = FakeWriter(("127.0.0.1", 2))
+            await server.handle_connect_request(red_writer, ConnectRequest(game_id="test", username="red"))
+            await server.handle_connect_request(yellow_writer, ConnectRequest(game_id="test", username="yellow"))
+
+            game = server.games["test"]
+            red, yellow = game.red_player, game.yellow_player
+            writers = {red.id: red_writer, yellow.id: yellow_writer}
+            first = ConnectCell.RED if game.turn == red.id else ConnectCell.YELLOW
+            # Whoever moves first wins down column 0
+            columns = [0, 1, 0, 1, 0, 1, 0]
+            for column in columns:
+                player = red if game.turn == red.id else yellow
+                await server.handle_move(writers[game.turn], Move(game_id="test", index=column, player=player))
+            archive.close()
+
+            with ArchiveReader(Path(directory)) as reader:
+                (archived,) = reader.games()
+            self.assertEqual(archived.moves, bytes(columns))
+            self.assertEqual(archived.first, first)
+            self.assertEqual(archived.winner, first)
+            self.assertEqual((archived.red_id, archived.red_name), (red.id, "red"))
+            self.assertEqual((archived.yellow_id, archived.yellow_name), (yellow.id, "yellow"))
+            self.assertLessEqual(archived.started, archived.ended)
+            with ArchiveReader(Path(directory)) as reader:
+                self.assertEqual(list(reader.games(player="red")), [archived])
+            await asyncio.sleep(0)
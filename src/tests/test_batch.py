@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.bench_board import random_boards
+from lib.batch import BoardBatch
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell, ConnectFour
+
+
+class TestBoardBatch(unittest.TestCase):
+    def setUp(self):
+        self.boards = random_boards(500)
+        self.batch = BoardBatch.from_boards(self.boards)
+
+    def test_round_trip(self):
+        """Test that boards come back out of a batch cell for cell."""
+        cells = self.batch.cells()
+        self.assertEqual(cells.shape, (500, 7, 6))
+        self.assertEqual(cells.tolist(), [board.board for board in self.boards])
+        self.assertEqual(self.batch.board(7).board, self.boards[7].board)
+        self.assertEqual(BoardBatch.from_cells(cells).red.tolist(), self.batch.red.tolist())
+
+        bitboards = [BitboardConnectFour.from_board(board) for board in self.boards]
+        self.assertEqual(BoardBatch.from_boards(bitboards).yellow.tolist(), self.batch.yellow.tolist())
+        self.assertEqual(self.batch.bitboard(3).cells(), self.boards[3].board)
+
+    def test_winners(self):
+        expected = [BitboardConnectFour.from_board(board).check_win() or ConnectCell.EMPTY for board in self.boards]
+        self.assertEqual(self.batch.winners().tolist(), expected)
+        self.assertIn(ConnectCell.RED, expected)
+        self.assertIn(ConnectCell.YELLOW, expected)
+
+    def test_legal_moves(self):
+        expected = [[board.can_play(col) for col in range(board.cols)] for board in self.boards]
+        self.assertEqual(self.batch.legal_moves().tolist(), expected)
+        self.assertEqual(self.batch.moves().tolist(), [board.moves for board in self.boards])
+
+    def test_drop(self):
+        """Test that a batch drop matches drop_piece on every board, full columns included."""
+        rng = np.random.default_rng(0)
+        cols = rng.integers(0, 7, len(self.boards))
+        colors = rng.choice([ConnectCell.RED, ConnectCell.YELLOW], len(self.boards))
+        results = self.batch.drop(cols, colors)
+
+        for i, board in enumerate(self.boards):
+            result = board.drop_piece(int(cols[i]), ConnectCell(colors[i]))
+            if result is None:
+                self.assertEqual(results.row[i], -1)
+                continue
+            self.assertEqual(results.row[i], result.row)
+            self.assertEqual(results.winner[i], result.winner or ConnectCell.EMPTY)
+            self.assertEqual(results.draw[i], result.draw)
+        self.assertEqual(self.batch.cells().tolist(), [board.board for board in self.boards])
+
+    def test_draw(self):
+        board = ConnectFour()
+        for col in range(6):
+            for row in range(6):
+                board.set_piece(row, col, ConnectCell.RED if (row // 2 + col) % 2 == 0 else ConnectCell.YELLOW)
+        for row in range(5):
+            board.set_piece(row, 6, ConnectCell.YELLOW if row % 2 else ConnectCell.RED)
+
+        results = BoardBatch.from_boards([board]).drop([6], ConnectCell.YELLOW)
+        self.assertEqual(results.row.tolist(), [5])
+        self.assertEqual(results.winner.tolist(), [ConnectCell.EMPTY])
+        self.assertTrue(results.draw[0])
+
+    def test_slices_are_views(self):
+        """Test that dropping into a slice of a batch changes the batch it was cut from."""
+        batch = BoardBatch.empty(10)
+        batch[2:4].drop([3, 3], ConnectCell.RED)
+        self.assertEqual(batch.moves().tolist(), [0, 0, 1, 1, 0, 0, 0, 0, 0, 0])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            BoardBatch.empty(1, rows=9, cols=7)
+        with self.assertRaises(ValueError):
+            BoardBatch.from_boards([ConnectFour(), ConnectFour(rows=5)])
+        with self.assertRaises(IndexError):
+            BoardBatch.empty(1).drop([7], ConnectCell.RED)
+        with self.assertRaises(ValueError):
+            BoardBatch.empty(1).drop([0], ConnectCell.EMPTY)
@@ -0,0 +1,21 @@
+import unittest
+
+from benchmarks.__main__ import discover
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_benchmarks_run(self):
+        """Test that every benchmark still runs, timing them is left to python -m benchmarks."""
+        benchmarks = list(discover(None))
+        self.assertIn("server.TimeHandleMove.time_handle_move(BINARY)", [name for name, *_ in benchmarks])
+
+        for name, cls, method, param in benchmarks:
+            with self.subTest(name):
+                args = () if param is None else (param,)
+                benchmark = cls()
+                if hasattr(benchmark, "setup"):
+                    benchmark.setup(*args)
+                getattr(benchmark, method)(*args)
+                getattr(benchmark, method)(*args)
+                if hasattr(benchmark, "teardown"):
+                    benchmark.teardown(*args)
@@ -0,0 +1,107 @@
+import unittest
+
+from lib.bitboard import BitboardConnectFour
+from lib.connect_four import ConnectCell, ConnectFour
+
+
+class TestBitboardConnectFour(unittest.TestCase):
+    def setUp(self):
+        self.game = BitboardConnectFour(rows=6, cols=7)
+
+    def test_initial_board_empty(self):
+        """Test that the board starts with all cells empty."""
+        for row in range(self.game.rows):
+            for col in range(self.game.cols):
+                self.assertEqual(self.game.get_piece(row, col), ConnectCell.EMPTY)
+
+    def test_drop_piece(self):
+        """Test dropping pieces stacks them from the bottom of the column."""
+        self.assertTrue(self.game.drop_piece(3, ConnectCell.RED))
+        self.assertTrue(self.game.drop_piece(3, ConnectCell.YELLOW))
+        self.assertEqual(self.game.get_piece(0, 3), ConnectCell.RED)
+        self.assertEqual(self.game.get_piece(1, 3), ConnectCell.YELLOW)
+
+    def test_drop_piece_in_full_column(self):
+        """Test dropping pieces in a column until full."""
+        for _ in range(self.game.rows):
+            self.assertTrue(self.game.drop_piece(2, ConnectCell.RED))
+
+        self.assertFalse(self.game.can_play(2))
+        self.assertFalse(self.game.drop_piece(2, ConnectCell.YELLOW))
+
+    def test_check_win_horizontal(self):
+        for col in range(4):
+            self.game.set_piece(0, col, ConnectCell.YELLOW)
+        self.assertEqual(self.game.check_win(), ConnectCell.YELLOW)
+
+    def test_check_win_vertical(self):
+        for row in range(2, 6):
+            self.game.set_piece(row, 6, ConnectCell.RED)
+        self.assertEqual(self.game.check_win(), ConnectCell.RED)
+
+    def test_check_win_diagonals(self):
+        for i in range(4):
+            self.game.set_piece(i, i + 3, ConnectCell.RED)
+        self.assertEqual(self.game.check_win(), ConnectCell.RED)
+
+        self.game = BitboardConnectFour()
+        for i in range(4):
+            self.game.set_piece(5 - i, i, ConnectCell.YELLOW)
+        self.assertEqual(self.game.check_win(), ConnectCell.YELLOW)
+
+    def test_no_wrap_between_columns(self):
+        """Test that four pieces split across the top and bottom of adjacent columns don't win."""
+        self.game.set_piece(4, 0, ConnectCell.RED)
+        self.game.set_piece(5, 0, ConnectCell.RED)
+        self.game.set_piece(0, 1, ConnectCell.RED)
+        self.game.set_piece(1, 1, ConnectCell.RED)
+        self.assertIsNone(self.game.check_win())
+
+    def test_mixed_colors_no_winner(self):
+        for col in range(4):
+            self.game.set_piece(0, col, ConnectCell.RED if col % 2 else ConnectCell.YELLOW)
+        self.assertIsNone(self.game.check_win())
+
+    def test_invalid_index(self):
+        with self.assertRaises(IndexError):
+            self.game.get_piece(6, 0)
+
+        with self.assertRaises(IndexError):
+            self.game.set_piece(0, 7, ConnectCell.RED)
+
+    def test_drop_piece_invalid_column(self):
+        """Test that columns off either side of the board are rejected instead of wrapping."""
+        for col in (-1, 7):
+            with self.assertRaisesRegex(IndexError, f"col index {col}"):
+                self.game.drop_piece(col, ConnectCell.RED)
+            with self.assertRaisesRegex(IndexError, f"col index {col}"):
+                self.game.can_play(col)
+        self.assertEqual(self.game.mask, 0)
+
+    def test_drop_empty_piece(self):
+        with self.assertRaises(ValueError):
+            self.game.drop_piece(0, ConnectCell.EMPTY)
+        self.assertEqual(self.game.yellow, 0)
+
+    def test_round_trip(self):
+        """Test conversion to and from the pydantic board and its JSON shape."""
+        board = ConnectFour()
+        board.drop_piece(3, ConnectCell.RED)
+        board.drop_piece(3, ConnectCell.YELLOW)
+        board.drop_piece(0, ConnectCell.RED)
+
+        bitboard = BitboardConnectFour.from_board(board)
+        self.assertEqual(bitboard.to_board(), board)
+        self.assertEqual(ConnectFour.model_validate_json(bitboard.to_json()), board)
+        self.assertEqual(BitboardConnectFour.from_json(board.model_dump_json()).cells(), board.board)
+
+    def test_drop_piece_result(self):
+        """Test that drop_piece matches the landing row and result of the pydantic board."""
+        board = ConnectFour()
+        moves = [3, 3, 4, 4, 5, 5, 2]
+        for i, col in enumerate(moves):
+            color = ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW
+            self.assertEqual(self.game.drop_piece(col, color), board.drop_piece(col, color))
+
+        self.assertEqual(self.game.moves, len(moves))
+        self.assertEqual(board.check_win(), ConnectCell.RED)
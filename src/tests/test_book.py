@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from lib.book import HEADER, RECORD, BookGeometry, OpeningBook, generate_book, write_book
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.solver import Solver
+
+
+class TestOpeningBook(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.directory.name) / "small.book"
+        cls.solver = Solver(rows=4, cols=4, table_size=100_003)
+        cls.count = write_book(cls.path, 4, 4, generate_book(cls.solver, depth=3))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.book = OpeningBook(self.path)
+
+    def tearDown(self):
+        self.book.close()
+
+    def test_file_layout(self):
+        """Test that the file is a header followed by fixed width records sorted by key."""
+        self.assertEqual(self.path.stat().st_size, HEADER.size + self.count * RECORD.size)
+        self.assertEqual(len(self.book), self.count)
+
+        keys = [RECORD.unpack_from(self.path.read_bytes(), HEADER.size + i * RECORD.size)[0] for i in range(self.count)]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_mirror_positions_folded(self):
+        """Test that positions and their mirror images share a single record."""
+        geometry = BookGeometry(4, 4)
+        keys = set()
+        positions = [(0, 0)]
+        for _ in range(4):
+            children = []
+            for current, mask in positions:
+                keys.add(geometry.canonical(current, mask)[0])
+                for col in range(4):
+                    move = (mask + geometry.bottom) & geometry.column_masks[col]
+                    children.append((current ^ mask, mask | move))
+            positions = children
+
+        self.assertEqual(self.count, len(keys))
+        self.assertLess(self.count, 1 + 4 + 16 + 64)
+
+    def test_lookup_matches_solver(self):
+        board = ConnectFour(rows=4, cols=4)
+        board.drop_piece(0, ConnectCell.RED)
+
+        entry = self.book.lookup(board, ConnectCell.YELLOW)
+        self.assertEqual(entry.score, Solver(rows=4, cols=4).score(board, ConnectCell.YELLOW))
+
+        mirrored = ConnectFour(rows=4, cols=4)
+        mirrored.drop_piece(3, ConnectCell.RED)
+
+        mirrored_entry = self.book.lookup(mirrored, ConnectCell.YELLOW)
+        self.assertEqual(mirrored_entry.score, entry.score)
+        self.assertEqual(mirrored_entry.column, 3 - entry.column)
+
+    def test_lookup_missing(self):
+        board = ConnectFour(rows=4, cols=4)
+        for col in range(4):
+            board.drop_piece(col, ConnectCell.RED if col % 2 else ConnectCell.YELLOW)
+
+        self.assertIsNone(self.book.lookup(board, ConnectCell.RED))
+        self.assertIsNone(self.book.lookup(ConnectFour(), ConnectCell.RED))
+
+    def test_solver_uses_book(self):
+        solver = Solver(rows=4, cols=4, table_size=1009, book=self.book)
+        result = solver.search(ConnectFour(rows=4, cols=4), ConnectCell.RED)
+        self.assertTrue(result.solved)
+        self.assertEqual(result.nodes, 0)
+
+    def test_reused_solver(self):
+        """Test that a solver left with estimates from a depth limited search still writes exact scores."""
+        solver = Solver(rows=4, cols=4, table_size=100_003)
+        solver.search(ConnectFour(rows=4, cols=4), ConnectCell.RED, max_depth=3)
+        expected = {key: entry.score for key, entry in generate_book(Solver(rows=4, cols=4, table_size=100_003), depth=2)}
+        self.assertEqual({key: entry.score for key, entry in generate_book(solver, depth=2)}, expected)
+
+    def test_invalid_file(self):
+        path = Path(self.directory.name) / "invalid.book"
+        path.write_bytes(b"not a book at all")
+        with self.assertRaises(ValueError):
+            OpeningBook(path)
+
+    def test_oversized_board(self):
+        with self.assertRaises(ValueError):
+            BookGeometry(rows=8, cols=8)
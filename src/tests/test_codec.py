@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+import uuid
+
+from lib.codec import BINARY_CODEC, JSON_CODEC, LENGTH
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.data import Game, GameState, Player
+from lib.packets import (
+    ConnectionLost,
+    ConnectRequest,
+    ConnectResponse,
+    Encoding,
+    Error,
+    GameOver,
+    Move,
+    MoveApplied,
+    SyncGame,
+    SyncRequest,
+)
+
+
+def make_game() -> Game:
+    red = Player(name="red", id=uuid.uuid4(), addr=("127.0.0.1", 5000))
+    yellow = Player(name="yéllow", id=uuid.uuid4(), addr=("::1", 5001, 0, 0))
+    game = Game(game_id="lobby", red_player=red, yellow_player=yellow, turn=red.id, board=ConnectFour())
+    for i, col in enumerate((3, 3, 4, 2, 6)):
+        game.board.drop_piece(col, ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW)
+    return game
+
+
+class TestBinaryCodec(unittest.TestCase):
+    def round_trip(self, packet):
+        data = BINARY_CODEC.encode(packet)
+        (length,) = LENGTH.unpack_from(data)
+        self.assertEqual(length, len(data) - LENGTH.size)
+
+        decoded = BINARY_CODEC.decode(data[LENGTH.size :])
+        self.assertEqual(decoded.model_dump(), packet.model_dump())
+        self.assertIs(type(decoded), type(packet))
+        return decoded
+
+    def test_round_trip(self):
+        game = make_game()
+        packets = [
+            ConnectRequest(game_id="lobby", username="name", bot=True, encoding=Encoding.BINARY),
+            ConnectResponse(player=game.red_player, game=game, encoding=Encoding.BINARY),
+            SyncGame(game=game),
+            Move(game_id="lobby", index=3, player=game.yellow_player),
+            MoveApplied(game_id="lobby", index=3, row=1, color=ConnectCell.YELLOW, turn=game.red_player.id, seq=9),
+            SyncRequest(game_id="lobby"),
+            GameOver(game=game, winner=None),
+            GameOver(game=game, winner=game.red_player),
+            Error(message="bad"),
+            ConnectionLost(),
+        ]
+        for packet in packets:
+            with self.subTest(packet=type(packet).__name__):
+                self.round_trip(packet)
+
+    def test_board_state(self):
+        """Test that the decoded board keeps its cells and move count."""
+        game = make_game()
+        game.yellow_player = None
+        game.turn = None
+        game.state = GameState.FINISHED
+
+        board = self.round_trip(SyncGame(game=game)).game.board
+        self.assertEqual(board.moves, 5)
+        self.assertEqual(board.get_piece(1, 3), ConnectCell.YELLOW)
+        self.assertTrue(board.can_play(3))
+
+    def test_smaller_than_json(self):
+        packet = SyncGame(game=make_game())
+        self.assertLess(len(BINARY_CODEC.encode(packet)) * 3, len(JSON_CODEC.encode(packet)))
+
+    def test_invalid_frames(self):
+        payload = BINARY_CODEC.encode(Move(game_id="lobby", index=3, player=make_game().red_player))[LENGTH.size :]
+        for data in (payload[:-1], payload + b"\x00", b"\x7f", b"", bytes([4]) + b"\xff" * 4):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    BINARY_CODEC.decode(data)
+
+    def test_read_frame(self):
+        async def read(data: bytes) -> list[bytes]:
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return [await BINARY_CODEC.read_frame(reader) for _ in range(3)]
+
+        first = BINARY_CODEC.encode(Error(message="one"))
+        second = BINARY_CODEC.encode(ConnectionLost())
+        frames = asyncio.run(read(first + second + second[:1]))
+        self.assertEqual(frames, [first[LENGTH.size :], second[LENGTH.size :], b""])
@@ -133,3 +133,47 @@ class TestConnectFour(unittest.TestCase):
 
         # Attempting to drop in a full column should return False
         self.assertFalse(self.game.drop_piece(column, ConnectCell.YELLOW))
+
+    def test_drop_piece_result(self):
+        """Test that drop_piece reports the landing row and an incremental win."""
+        result = self.game.drop_piece(4, ConnectCell.RED)
+        self.assertEqual(result.row, 0)
+        self.assertIsNone(result.winner)
+        self.assertFalse(result.draw)
+
+        for col in range(3):
+            self.game.drop_piece(col, ConnectCell.RED)
+        self.game.drop_piece(0, ConnectCell.YELLOW)
+
+        result = self.game.drop_piece(3, ConnectCell.RED)
+        self.assertEqual(result.row, 0)
+        self.assertEqual(result.winner, ConnectCell.RED)
+        self.assertEqual(self.game.moves, 6)
+
+    def test_drop_piece_draw(self):
+        """Test that filling the board without a line is reported as a draw."""
+        game = ConnectFour(rows=2, cols=2)
+        colors = [ConnectCell.RED, ConnectCell.YELLOW, ConnectCell.YELLOW, ConnectCell.RED]
+        results = [game.drop_piece(i % 2, color) for i, color in enumerate(colors)]
+
+        self.assertFalse(any(result.draw for result in results[:-1]))
+        self.assertTrue(results[-1].draw)
+
+    def test_moves_tracking(self):
+        """Test that the move count follows set_piece and survives JSON conversion."""
+        self.game.set_piece(0, 0, ConnectCell.RED)
+        self.game.set_piece(0, 0, ConnectCell.YELLOW)
+        self.game.set_piece(0, 1, ConnectCell.RED)
+        self.assertEqual(self.game.moves, 2)
+
+        self.game.set_piece(0, 1, ConnectCell.EMPTY)
+        self.assertEqual(self.game.moves, 1)
+        self.assertEqual(ConnectFour.model_validate_json(to_json(self.game)).moves, 1)
+
+    def test_diagonal_mixed_colors(self):
+        """Test that diagonals of mixed colors are not reported as a win."""
+        self.game.set_piece(0, 0, ConnectCell.RED)
+        self.game.set_piece(1, 1, ConnectCell.YELLOW)
+        self.game.set_piece(2, 2, ConnectCell.RED)
+        self.game.set_piece(3, 3, ConnectCell.RED)
+        self.assertIsNone(self.game.check_win())
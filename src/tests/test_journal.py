@@ -0,0 +1,171 @@
+import asyncio
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.data import Game, Player
+from lib.journal import Journal
+from lib.packets import ConnectRequest, Error, Move, MoveApplied, Resume, ResumeResponse, SyncGame
+from server import ConnectFourServer
+from tests.test_server import FakeWriter
+
+
+def new_game(game_id: str) -> Game:
+    red = Player(name="red", id=uuid.uuid4(), addr=("127.0.0.1", 1))
+    yellow = Player(name="yellow", id=uuid.uuid4(), addr=("127.0.0.1", 2))
+    return Game(game_id=game_id, red_player=red, yellow_player=yellow, turn=red.id, board=ConnectFour())
+
+
+class TestJournal(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def open(self) -> tuple[Journal, dict[str, Game]]:
+        journal = Journal(self.path)
+        games = {game.game_id: game for game in journal.recover()}
+        journal.start()
+        return journal, games
+
+    def play(self, journal: Journal, game: Game, *columns: int):
+        for column in columns:
+            game.play(column)
+            journal.moved(game, column)
+
+    async def test_recover(self):
+        journal, games = await self.open()
+        self.assertEqual(games, {})
+
+        first, second, finished = new_game("first"), new_game("second"), new_game("finished")
+        for game in (first, second, finished):
+            journal.started(game)
+        self.play(journal, first, 3, 3, 4)
+        self.play(journal, finished, 0, 1, 0, 1, 0, 1, 0)
+        journal.ended("second")
+        await journal.close()
+
+        _, games = await self.open()
+        self.assertEqual(list(games), ["first"])
+        self.assertEqual(games["first"].seq, 3)
+        self.assertEqual(games["first"].board.board, first.board.board)
+        self.assertEqual(games["first"].turn, first.yellow_player.id)
+
+    async def test_snapshot(self):
+        journal, _ = await self.open()
+        game = new_game("test")
+        journal.started(game)
+        self.play(journal, game, 3, 3)
+        await journal.snapshot([game])
+        self.assertEqual([path.name for path in self.path.iterdir()], ["snapshot"])
+
+        self.play(journal, game, 2)
+        await journal.close()
+
+        journal, games = await self.open()
+        self.assertEqual(games["test"].seq, 3)
+        self.assertEqual(games["test"].board.get_piece(0, 2), ConnectCell.RED)
+        await journal.close()
+
+    async def test_snapshot_after_segment(self):
+        """Test that moves journaled before a game was encoded into a snapshot aren't played twice."""
+        journal, _ = await self.open()
+        game = new_game("test")
+        journal.started(game)
+        task = asyncio.create_task(journal.snapshot([]))
+        self.play(journal, game, 3)
+        await task
+        await journal.snapshot([game])
+        self.play(journal, game, 4)
+        await journal.close()
+
+        _, games = await self.open()
+        self.assertEqual(games["test"].seq, 2)
+        self.assertEqual(games["test"].board.moves, 2)
+
+    async def test_torn_record(self):
+        journal, _ = await self.open()
+        game = new_game("test")
+        journal.started(game)
+        self.play(journal, game, 3, 4)
+        await journal.close()
+
+        (segment,) = self.path.glob("journal-*.log")
+        segment.write_bytes(segment.read_bytes()[:-3])
+
+        journal, games = await self.open()
+        self.assertEqual(games["test"].seq, 1)
+        # Appends go to a new segment instead of after the torn record
+        self.play(journal, games["test"], 5)
+        await journal.close()
+        _, games = await self.open()
+        self.assertEqual(games["test"].seq, 2)
+
+
+class TestRestore(unittest.IsolatedAsyncioTestCase):
+    async def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = Journal(Path(directory))
+            journal.recover()
+            server = ConnectFourServer(journal=journal, secret=journal.secret())
+            red_writer = FakeWriter(("127.0.0.1", 1))
+            yellow_writer = FakeWriter(("127.0.0.1", 2))
+            await server.handle_connect_request(red_writer, ConnectRequest(game_id="test", username="red"))
+            await server.handle_connect_request(yellow_writer, ConnectRequest(game_id="test", username="yellow"))
+
+            game = server.games["test"]
+            writer = red_writer if game.turn == game.red_player.id else yellow_writer
+            await server.handle_move(writer, Move(game_id="test", index=3, player=game.red_player))
+            await asyncio.sleep(0)
+            token = writer.packets()[0].resume_token
+            await journal.close()
+
+            # A new server after the restart, the secret is read back so the token is still valid
+            journal = Journal(Path(directory))
+            server = ConnectFourServer(journal=journal, secret=journal.secret(), tick=0.01)
+            server.restore(journal.recover(), 0.05)
+            restored = server.games["test"]
+            self.assertEqual(restored.seq, 1)
+
+            stranger = FakeWriter(("127.0.0.1", 3))
+            player_id = token.partition(".")[0]
+            await server.handle_resume(stranger, Resume(game_id="test", token=f"{player_id}.{'0' * 64}"))
+            self.assertIsInstance(stranger.packets()[0], Error)
+
+            resumed = FakeWriter(("127.0.0.1", 4))
+            await server.handle_resume(resumed, Resume(game_id="test", token=token))
+            await asyncio.sleep(0)
+            response, sync = resumed.packets()
+            self.assertIsInstance(response, ResumeResponse)
+            self.assertEqual(str(response.player.id), player_id)
+            self.assertIsInstance(sync, SyncGame)
+            self.assertEqual(sync.game.seq, 1)
+
+            # The opponent didn't resume in time, so the game ends
+            await asyncio.sleep(0.1)
+            self.assertNotIn("test", server.games)
+            await journal.close()
+
+    async def test_resume_moves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = Journal(Path(directory))
+            game = new_game("test")
+            server = ConnectFourServer(journal=journal, tick=0.01)
+            server.restore([game], 0.05)
+
+            writers = {}
+            for player, port in ((game.red_player, 5), (game.yellow_player, 6)):
+                writers[player.id] = FakeWriter(("127.0.0.1", port))
+                await server.handle_resume(
+                    writers[player.id], Resume(game_id="test", token=server.resume_token(player.id), seq=0)
+                )
+
+            await server.handle_move(writers[game.red_player.id], Move(game_id="test", index=3, player=game.red_player))
+            await asyncio.sleep(0.1)
+            self.assertIsInstance(writers[game.yellow_player.id].packets()[-1], MoveApplied)
+            self.assertIn("test", server.games)
+            await journal.close()
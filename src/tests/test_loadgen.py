@@ -0,0 +1,33 @@
+import asyncio
+import unittest
+
+from lib.packets import Encoding
+from loadgen import Stats, generate
+from server import ConnectFourServer
+
+
+class TestLoadgen(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ConnectFourServer()
+        self.listener = await asyncio.start_server(self.server.handle_client, "127.0.0.1", 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def test_games_played(self):
+        for encoding in Encoding:
+            for bucket in (None, 0):
+                with self.subTest(encoding=encoding, bucket=bucket):
+                    stats = Stats()
+                    await generate("127.0.0.1", self.port, None, stats, 3, 6, timeout=10, encoding=encoding, bucket=bucket)
+
+                    self.assertEqual(stats.games, 6)
+                    self.assertEqual(stats.errors, {})
+                    # Every move is answered by its MoveApplied or the GameOver
+                    self.assertEqual(stats.samples, stats.moves)
+
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.server.games, {})
+        self.assertEqual(self.server.registry.sessions, {})
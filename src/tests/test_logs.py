@@ -0,0 +1,40 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+from loguru import logger
+
+from lib.logs import QueuedSink, configure, enabled
+
+
+class TestLogs(unittest.TestCase):
+    def tearDown(self):
+        configure()
+
+    def test_levels(self):
+        configure("debug")
+        self.assertTrue(enabled.debug)
+        configure("INFO")
+        self.assertFalse(enabled.debug)
+        configure(5)
+        self.assertTrue(enabled.debug)
+
+    def test_queued_sink(self):
+        stream = io.StringIO()
+        sink = QueuedSink(stream)
+        for i in range(1000):
+            sink.write(f"{i}\n")
+        sink.stop()
+        self.assertEqual(stream.getvalue().splitlines(), [str(i) for i in range(1000)])
+
+    def test_queued_json(self):
+        stderr = io.StringIO()
+        with mock.patch("sys.stderr", stderr):
+            configure("DEBUG", queued=True, json=True)
+            logger.debug("Received {packet_type}", packet_type="MOVE")
+            logger.remove()
+
+        record = json.loads(stderr.getvalue())["record"]
+        self.assertEqual(record["message"], "Received MOVE")
+        self.assertEqual(record["extra"], {"packet_type": "MOVE"})
@@ -0,0 +1,51 @@
+import unittest
+
+from lib.matchmaking import Matchmaker
+
+
+class TestMatchmaker(unittest.TestCase):
+    def setUp(self):
+        self.matchmaker = Matchmaker(widen_after=10)
+
+    def test_pairs_in_order(self):
+        self.assertIsNone(self.matchmaker.join("a", now=0))
+        self.assertIsNone(self.matchmaker.join("b", bucket=1, now=1))
+        self.assertEqual(self.matchmaker.join("c", now=2).key, "a")
+        self.assertEqual(len(self.matchmaker), 1)
+        self.assertNotIn("a", self.matchmaker)
+        self.assertIn("b", self.matchmaker)
+
+    def test_burst(self):
+        """Test that a burst of joins pairs everyone in arrival order."""
+        partners = [self.matchmaker.join(i, bucket=i % 3, now=0) for i in range(3000)]
+        pairs = [(partner.key, i) for i, partner in enumerate(partners) if partner is not None]
+
+        self.assertEqual(len(pairs), 1500)
+        self.assertEqual(pairs[:3], [(0, 3), (1, 4), (2, 5)])
+        self.assertEqual(len(self.matchmaker), 0)
+        self.assertEqual(self.matchmaker.queues, {})
+
+    def test_leave(self):
+        self.matchmaker.join("a", now=0)
+        self.matchmaker.join("b", bucket=1, now=0)
+        self.assertEqual(self.matchmaker.leave("a").key, "a")
+        self.assertIsNone(self.matchmaker.leave("a"))
+        self.assertNotIn(0, self.matchmaker.queues)
+        self.assertIsNone(self.matchmaker.join("c", now=1))
+
+    def test_join_twice(self):
+        self.matchmaker.join("a")
+        with self.assertRaises(ValueError):
+            self.matchmaker.join("a", bucket=2)
+
+    def test_widen(self):
+        for key, bucket, now in (("a", 0, 0), ("b", 2, 5), ("c", 5, 5)):
+            self.matchmaker.join(key, bucket, now=now)
+
+        self.assertEqual(self.matchmaker.widen(now=9), [])
+        # a reaches bucket 1 only, nobody is waiting there
+        self.assertEqual(self.matchmaker.widen(now=10), [])
+
+        pairs = self.matchmaker.widen(now=20)
+        self.assertEqual([(first.key, second.key) for first, second in pairs], [("a", "b")])
+        self.assertEqual(list(self.matchmaker.tickets), ["c"])
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from lib.metrics import NULL_METRIC, Metrics
+from lib.packets import ConnectRequest, Move
+from server import ConnectFourServer
+from tests.test_server import FakeWriter
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        metrics = Metrics()
+        packets = metrics.counter("packets", "Packets by type", ("type",))
+        connections = metrics.gauge("connections", "Open connections")
+        games = metrics.gauge("games", "Games", function=lambda: 3)
+        latency = metrics.histogram("latency_seconds", "Latency", (0.1, 1))
+
+        packets.inc("MOVE")
+        packets.inc("MOVE", amount=2)
+        connections.inc()
+        connections.inc()
+        connections.dec()
+        for value in (0.05, 0.1, 0.5, 2):
+            latency.observe(value)
+
+        lines = metrics.render().splitlines()
+        self.assertIn("# TYPE connectfour_packets_total counter", lines)
+        self.assertIn('connectfour_packets_total{type="MOVE"} 3', lines)
+        self.assertIn("connectfour_connections 1", lines)
+        self.assertIn("connectfour_games 3", lines)
+        self.assertIn('connectfour_latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('connectfour_latency_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('connectfour_latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("connectfour_latency_seconds_count 4", lines)
+        self.assertIn("connectfour_latency_seconds_sum 2.65", lines)
+        games.function = lambda: 4
+        self.assertIn("connectfour_games 4", metrics.render().splitlines())
+
+    def test_disabled(self):
+        metrics = Metrics(enabled=False)
+        counter = metrics.counter("packets", "Packets")
+        self.assertIs(counter, NULL_METRIC)
+        counter.inc()
+        metrics.histogram("latency_seconds", "Latency").observe(1)
+        self.assertEqual(metrics.render(), "\n")
+
+
+class TestScrape(unittest.IsolatedAsyncioTestCase):
+    async def get(self, port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_server_metrics(self):
+        metrics = Metrics()
+        server = ConnectFourServer(metrics=metrics, grace=0)
+        red_writer = FakeWriter(("127.0.0.1", 1))
+        yellow_writer = FakeWriter(("127.0.0.1", 2))
+        await server.handle_connect_request(red_writer, ConnectRequest(game_id="test", username="red"))
+        await server.handle_connect_request(yellow_writer, ConnectRequest(game_id="test", username="yellow"))
+
+        game = server.games["test"]
+        writer = red_writer if game.turn == game.red_player.id else yellow_writer
+        player = game.red_player if writer is red_writer else game.yellow_player
+        reader = asyncio.StreamReader()
+        reader.feed_data(Move(game_id="test", index=3, player=player).to_json().encode() + b"\n")
+        reader.feed_eof()
+        await server.serve_packets(reader, writer, writer.addr)
+
+        http = await metrics.serve("127.0.0.1", 0)
+        port = http.sockets[0].getsockname()[1]
+        try:
+            response = await self.get(port, "/metrics")
+            self.assertIn(b"404 Not Found", await self.get(port, "/other"))
+        finally:
+            http.close()
+
+        headers, body = response.split(b"\r\n\r\n", 1)
+        self.assertIn(b"200 OK", headers)
+        lines = body.decode().splitlines()
+        self.assertIn('connectfour_packets_received_total{type="MOVE"} 1', lines)
+        self.assertIn('connectfour_packets_sent_total{type="CONNECT_RESPONSE"} 2', lines)
+        self.assertIn('connectfour_packets_sent_total{type="MOVE_APPLIED"} 2', lines)
+        self.assertIn('connectfour_packets_sent_total{type="CONNECT_LOST"} 2', lines)
+        self.assertIn("connectfour_bad_packets_total 0", lines)
+        self.assertIn("connectfour_games 0", lines)
+        self.assertIn("connectfour_handle_move_seconds_count 1", lines)
@@ -0,0 +1,165 @@
+import asyncio
+import unittest
+
+from lib.codec import JSON_CODEC
+from lib.outbox import Outbox, SlowClientPolicy
+
+
+class SlowWriter:
+    """Writer whose drain blocks until the test lets it through."""
+
+    def __init__(self):
+        self.written: list[bytes] = []
+        self.flowing = asyncio.Event()
+        self.closed = False
+
+    def write(self, data: bytes):
+        self.written.append(data)
+
+    async def drain(self):
+        await self.flowing.wait()
+
+    def close(self):
+        self.closed = True
+
+    def get_extra_info(self, name):
+        return None
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.writer = SlowWriter()
+        self.outbox = Outbox(self.writer, JSON_CODEC, lambda codec: b"snapshot", limit=3)
+        self.outbox.start()
+
+    async def asyncTearDown(self):
+        self.outbox.cancel()
+
+    def stall(self, outbox: Outbox):
+        """Leave the outbox stuck draining its first packet."""
+        outbox.start()
+        outbox.put(b"first")
+
+    async def test_writes_in_order(self):
+        self.writer.flowing.set()
+        for data in (b"a", b"b", b"c"):
+            self.outbox.put(data)
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.writer.written, [b"a", b"b", b"c"])
+
+    async def test_coalesces_slow_connection(self):
+        """Test that a full queue is replaced by the latest state instead of growing."""
+        self.outbox.put(b"first")
+        await asyncio.sleep(0)
+        self.assertEqual(self.writer.written, [b"first"])
+
+        # The writer is stuck draining "first", so these pile up
+        for i in range(10):
+            self.outbox.put(str(i).encode(), droppable=True)
+        self.assertLessEqual(len(self.outbox.queue), 3)
+        self.assertEqual(self.outbox.coalesced, 3)
+
+        self.writer.flowing.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.writer.written, [b"first", b"snapshot"])
+
+    async def test_control_packets_kept(self):
+        """Test that falling behind only throws away updates, everything else keeps its place around the snapshot."""
+        for policy in (SlowClientPolicy.COALESCE, SlowClientPolicy.DROP):
+            with self.subTest(policy=policy):
+                writer = SlowWriter()
+                outbox = Outbox(writer, JSON_CODEC, lambda codec: b"snapshot", limit=2, policy=policy)
+                self.stall(outbox)
+                await asyncio.sleep(0)
+
+                outbox.put(b"found")
+                for i in range(4):
+                    outbox.put(str(i).encode(), droppable=True)
+                outbox.put(b"over")
+                outbox.put(b"error")
+
+                writer.flowing.set()
+                await asyncio.sleep(0.01)
+                if policy == SlowClientPolicy.COALESCE:
+                    self.assertEqual(writer.written, [b"first", b"found", b"snapshot", b"over", b"error"])
+                else:
+                    self.assertEqual(writer.written, [b"first", b"found", b"over", b"error"])
+                outbox.cancel()
+
+    async def test_close_flushes(self):
+        self.outbox.put(b"last")
+        self.outbox.close()
+        self.outbox.put(b"ignored")
+        self.writer.flowing.set()
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.writer.written, [b"last"])
+        self.assertTrue(self.writer.closed)
+
+    async def test_drop_policy(self):
+        outbox = Outbox(self.writer, JSON_CODEC, limit=2, policy=SlowClientPolicy.DROP)
+        self.stall(outbox)
+        await asyncio.sleep(0)
+
+        for i in range(5):
+            outbox.put(str(i).encode(), droppable=True)
+        self.assertEqual(outbox.dropped, 1)
+        self.assertEqual(outbox.coalesced, 0)
+
+        self.writer.flowing.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.writer.written, [b"first", b"3", b"4"])
+        outbox.cancel()
+
+    async def test_coalesce_without_snapshot_drops(self):
+        outbox = Outbox(self.writer, JSON_CODEC, limit=1)
+        self.stall(outbox)
+        await asyncio.sleep(0)
+
+        outbox.put(b"a", droppable=True)
+        outbox.put(b"b", droppable=True)
+        self.assertEqual(outbox.dropped, 1)
+        self.assertFalse(outbox.stale)
+        outbox.cancel()
+
+    async def test_high_water_bytes(self):
+        outbox = Outbox(self.writer, JSON_CODEC, high_water=10, policy=SlowClientPolicy.DROP)
+        self.stall(outbox)
+        await asyncio.sleep(0)
+
+        for _ in range(4):
+            outbox.put(b"1234", droppable=True)
+        self.assertLess(outbox.queued_bytes, 10)
+        self.assertEqual(outbox.dropped, 1)
+        outbox.cancel()
+
+
+class TestOutboxSocket(unittest.IsolatedAsyncioTestCase):
+    async def test_disconnects_stalled_client(self):
+        """Test that a client that never reads is cut off instead of buffering without bound."""
+        outboxes = []
+
+        async def handle(reader, writer):
+            outboxes.append(Outbox(writer, JSON_CODEC, high_water=64 * 1024, policy=SlowClientPolicy.DISCONNECT))
+            outboxes[-1].start()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        while not outboxes:
+            await asyncio.sleep(0.01)
+        outbox = outboxes[0]
+
+        chunk = b"x" * 1024
+        for _ in range(10_000):
+            outbox.put(chunk)
+            if outbox.closing:
+                break
+            await asyncio.sleep(0)
+
+        self.assertTrue(outbox.closing)
+        self.assertLess(outbox.queued_bytes + outbox._buffered(), 10 * 1024 * 1024)
+
+        writer.close()
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,88 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from loguru import logger
+
+from lib.metrics import Metrics
+from lib.packets import ConnectRequest, Move
+from lib.profiling import PHASES, Profiler, SlowPacketTracer
+from server import ConnectFourServer
+from tests.test_server import FakeWriter
+
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSlowPacketTracer(unittest.IsolatedAsyncioTestCase):
+    async def play(self, tracer: SlowPacketTracer, metrics: Metrics) -> list[str]:
+        server = ConnectFourServer(metrics=metrics, tracer=tracer)
+        red_writer = FakeWriter(("127.0.0.1", 1))
+        yellow_writer = FakeWriter(("127.0.0.1", 2))
+        await server.handle_connect_request(red_writer, ConnectRequest(game_id="test", username="red"))
+        await server.handle_connect_request(yellow_writer, ConnectRequest(game_id="test", username="yellow"))
+
+        game = server.games["test"]
+        writer = red_writer if game.turn == game.red_player.id else yellow_writer
+        player = game.red_player if writer is red_writer else game.yellow_player
+        reader = asyncio.StreamReader()
+        reader.feed_data(Move(game_id="test", index=3, player=player).to_json().encode() + b"\n")
+        reader.feed_data(b"not a packet\n")
+        reader.feed_eof()
+
+        messages = []
+        sink = logger.add(messages.append, level="WARNING", format="{message}")
+        try:
+            await server.serve_packets(reader, writer, writer.addr)
+        finally:
+            logger.remove(sink)
+        return messages
+
+    async def test_logs_slow_packets(self):
+        metrics = Metrics()
+        messages = await self.play(SlowPacketTracer(0), metrics)
+
+        self.assertEqual(len(messages), 2)
+        self.assertIn("Slow MOVE from ('127.0.0.1',", messages[0])
+        self.assertIn("Slow bad packet", messages[1])
+        for phase in PHASES:
+            self.assertIn(f"{phase} ", messages[0])
+        self.assertIn("connectfour_slow_packets_total 2", metrics.render().splitlines())
+
+    async def test_fast_packets(self):
+        metrics = Metrics()
+        self.assertEqual(await self.play(SlowPacketTracer(60), metrics), [])
+        self.assertIn("connectfour_slow_packets_total 0", metrics.render().splitlines())
+        self.assertEqual(await self.play(SlowPacketTracer(), Metrics()), [])
+
+
+class TestProfiler(unittest.IsolatedAsyncioTestCase):
+    async def test_window(self):
+        for kind, suffix in (("cprofile", ".prof"), ("sample", ".folded")):
+            with self.subTest(kind), tempfile.TemporaryDirectory() as directory:
+                profiler = Profiler(Path(directory) / "profiles", duration=0.05, kind=kind)
+                profiler.toggle()
+                self.assertTrue(profiler.running)
+
+                busy(0.02)
+                await asyncio.sleep(0.1)
+                self.assertFalse(profiler.running)
+
+                (path,) = Path(directory, "profiles").iterdir()
+                self.assertEqual(path.suffix, suffix)
+                if kind == "sample":
+                    self.assertIn("busy (test_profiling.py", path.read_text())
+
+    async def test_toggle_stops_early(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler(Path(directory), duration=60)
+            profiler.toggle()
+            profiler.toggle()
+            self.assertFalse(profiler.running)
+            self.assertEqual(len(list(Path(directory).iterdir())), 1)
+            self.assertIsNone(profiler.stop())
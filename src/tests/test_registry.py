@@ -0,0 +1,51 @@
+import unittest
+import uuid
+
+from lib.connect_four import ConnectFour
+from lib.data import Game, Player
+from lib.registry import Registry
+
+
+def make_player(port: int) -> Player:
+    return Player(name=f"player-{port}", id=uuid.uuid4(), addr=("127.0.0.1", port))
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.red = make_player(1)
+        self.yellow = make_player(2)
+        self.game = Game(game_id="test", red_player=self.red, yellow_player=self.yellow, turn=None, board=ConnectFour())
+        self.registry.add_game(self.game)
+        self.registry.join(self.game, self.red)
+        self.registry.join(self.game, self.yellow)
+
+    def test_lookups(self):
+        self.assertIs(self.registry.game_of(self.red.addr), self.game)
+        self.assertEqual(self.registry.players[self.yellow.id].addr, self.yellow.addr)
+        self.assertIsNone(self.registry.game_of(("127.0.0.1", 3)))
+        self.assertEqual(len(self.registry), 1)
+
+    def test_duplicates_rejected(self):
+        with self.assertRaises(ValueError):
+            self.registry.add_game(self.game)
+        with self.assertRaises(ValueError):
+            self.registry.join(self.game, self.red)
+
+    def test_remove_game(self):
+        self.assertIs(self.registry.remove_game("test"), self.game)
+        self.assertIsNone(self.registry.remove_game("test"))
+        self.assertEqual((self.registry.games, self.registry.players, self.registry.sessions), ({}, {}, {}))
+
+    def test_leave(self):
+        self.assertEqual(self.registry.leave(self.red.addr).player_id, self.red.id)
+        self.assertIsNone(self.registry.leave(self.red.addr))
+        self.assertNotIn(self.red.id, self.registry.players)
+        self.assertIn("test", self.registry.games)
+
+        # The address is free to join another game
+        other = Game(game_id="other", red_player=self.red, yellow_player=None, turn=None, board=ConnectFour())
+        self.registry.add_game(other)
+        self.registry.join(other, self.red)
+        self.registry.remove_game("test")
+        self.assertIs(self.registry.game_of(self.red.addr), other)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+import unittest
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.search_pool import MAX_SEARCHES, SearchPool
+
+
+def play(moves: str) -> ConnectFour:
+    board = ConnectFour()
+    for i, col in enumerate(moves):
+        board.drop_piece(int(col) - 1, ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW)
+    return board
+
+
+class TestSearchPool(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SearchPool(workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    async def test_forced_move_skips_workers(self):
+        result = await self.pool.search("forced", play("12131"), ConnectCell.YELLOW, time_budget=5)
+        self.assertEqual(result.column, 0)
+        self.assertEqual(result.depth, 0)
+
+    async def test_search_splits_root_moves(self):
+        """Test that an endgame is solved exactly by combining the per move results."""
+        board = play("7422341735647741166133573473242566")
+        result = await self.pool.search("endgame", board, ConnectCell.RED, time_budget=10)
+        self.assertTrue(result.solved)
+        self.assertEqual(result.score, 1)
+
+    async def test_time_budget(self):
+        start = time.monotonic()
+        result = await self.pool.search("budget", play(""), ConnectCell.RED, time_budget=0.5)
+        self.assertIn(result.column, range(7))
+        self.assertFalse(result.solved)
+        self.assertLess(time.monotonic() - start, 10)
+
+    async def test_budget_covers_every_move(self):
+        """Test that moves waiting for a worker share the request's budget instead of getting their own."""
+        pool = SearchPool(workers=1)
+        try:
+            # Start the worker before timing
+            await pool.search("warmup", play("12131"), ConnectCell.YELLOW, time_budget=0.1)
+            await pool.search("warmup", play("4"), ConnectCell.YELLOW, time_budget=0.1)
+
+            start = time.monotonic()
+            result = await pool.search("single", play(""), ConnectCell.RED, time_budget=0.5)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertIn(result.column, range(7))
+        finally:
+            pool.shutdown()
+
+    def test_fallback_move(self):
+        self.assertEqual(self.pool.fallback_move(play("12131"), ConnectCell.YELLOW), 0)
+        self.assertEqual(self.pool.fallback_move(play(""), ConnectCell.RED), 3)
+
+    async def test_cancel_stops_workers(self):
+        """Test that cancelling the awaiting task frees the workers and the search slot."""
+        task = asyncio.create_task(self.pool.search("cancelled", play(""), ConnectCell.RED, time_budget=60))
+        await asyncio.sleep(1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        start = time.monotonic()
+        while len(self.pool._free_slots) < MAX_SEARCHES and time.monotonic() - start < 10:
+            await asyncio.sleep(0.05)
+
+        self.assertEqual(len(self.pool._free_slots), MAX_SEARCHES)
+        self.assertLess(time.monotonic() - start, 10)
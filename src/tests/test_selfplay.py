@@ -0,0 +1,57 @@
+import unittest
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.selfplay import STRATEGIES, Config, SelfPlay, play_game
+
+
+def replay(moves: bytes) -> tuple[ConnectFour, ConnectCell]:
+    board = ConnectFour()
+    for i, col in enumerate(moves):
+        result = board.drop_piece(col, ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW)
+    return board, result.winner or ConnectCell.EMPTY
+
+
+class TestPlayGame(unittest.TestCase):
+    def test_games_end_legally(self):
+        """Test that every strategy plays legal moves until a win or a draw, and nothing after."""
+        for name in STRATEGIES:
+            config = Config(seed=1, red=name, yellow="random", depth=2)
+            red, yellow = STRATEGIES[name](config), STRATEGIES["random"](config)
+            for index in range(20):
+                with self.subTest(name, index=index):
+                    game = play_game(index, config, red, yellow)
+                    board, winner = replay(game.moves)
+                    self.assertEqual(game.winner, winner)
+                    self.assertTrue(winner or board.moves == board.rows * board.cols)
+
+    def test_seeded(self):
+        config = Config(seed=1, red="heuristic", yellow="heuristic")
+        strategies = STRATEGIES["heuristic"](config), STRATEGIES["heuristic"](config)
+        games = [play_game(index, config, *strategies) for index in range(10)]
+        self.assertEqual(games, [play_game(index, config, *strategies) for index in range(10)])
+
+        other = Config(seed=2, red="heuristic", yellow="heuristic")
+        self.assertNotEqual(games, [play_game(index, other, *strategies) for index in range(10)])
+
+    def test_heuristic_takes_wins(self):
+        """Test that the heuristic beats random far more often than it loses."""
+        config = Config(seed=0, red="heuristic", yellow="random")
+        strategies = STRATEGIES["heuristic"](config), STRATEGIES["random"](config)
+        winners = [play_game(index, config, *strategies).winner for index in range(50)]
+        self.assertGreater(winners.count(ConnectCell.RED), 45)
+
+
+class TestSelfPlay(unittest.TestCase):
+    def test_same_games_on_any_pool(self):
+        """Test that the pool plays the same games in order, however they are split into batches."""
+        config = Config(seed=7, red="solver", yellow="heuristic", depth=2)
+        strategies = STRATEGIES["solver"](config), STRATEGIES["heuristic"](config)
+        expected = [play_game(index, config, *strategies) for index in range(5, 35)]
+
+        selfplay = SelfPlay(config, workers=2, batch=7)
+        try:
+            self.assertEqual(list(selfplay.run(30, start=5)), expected)
+        finally:
+            selfplay.shutdown()
+        self.assertEqual(selfplay.games, 30)
+        self.assertGreater(selfplay.cpu_seconds, 0)
@@ -0,0 +1,608 @@
+import asyncio
+import unittest
+import uuid
+from unittest import mock
+
+from lib.codec import BINARY_CODEC, JSON_CODEC, LENGTH
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.data import Game, Player
+from lib.packets import (
+    ConnectionLost,
+    ConnectRequest,
+    ConnectResponse,
+    Encoding,
+    Error,
+    FoundGame,
+    GameOver,
+    Matchmake,
+    Move,
+    MoveApplied,
+    Packet,
+    Ping,
+    Pong,
+    Resume,
+    ResumeResponse,
+    Spectate,
+    SpectateResponse,
+    SyncGame,
+    SyncRequest,
+)
+from lib.search_pool import SearchPool
+from server import ConnectFourServer
+
+
+class FakeWriter:
+    """Stand in for asyncio.StreamWriter that records everything written to it."""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.data = b""
+
+    def write(self, data: bytes):
+        self.data += data
+
+    def get_extra_info(self, name):
+        return self.addr if name == "peername" else None
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def drain(self):
+        pass
+
+    def packets(self) -> list[Packet]:
+        return [Packet.from_json(line) for line in self.data.splitlines()]
+
+
+class TestHandleMove(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = ConnectFourServer()
+        self.red_writer = FakeWriter(("127.0.0.1", 1))
+        self.yellow_writer = FakeWriter(("127.0.0.1", 2))
+
+        red = Player(name="red", id=uuid.uuid4(), addr=self.red_writer.addr)
+        red._writer = self.red_writer
+        yellow = Player(name="yellow", id=uuid.uuid4(), addr=self.yellow_writer.addr)
+        yellow._writer = self.yellow_writer
+
+        self.game = Game(game_id="test", red_player=red, yellow_player=yellow, turn=red.id, board=ConnectFour())
+        self.server.registry.add_game(self.game)
+        self.server.registry.join(self.game, red)
+        self.server.registry.join(self.game, yellow)
+
+    def move(self, index: int) -> Move:
+        return Move(game_id="test", index=index, player=self.game.red_player)
+
+    async def test_move_broadcasts_delta(self):
+        self.assertFalse(await self.server.handle_move(self.red_writer, self.move(3)))
+        self.assertEqual(self.game.turn, self.game.yellow_player.id)
+        self.assertEqual(self.game.board.get_piece(0, 3), ConnectCell.RED)
+        self.assertEqual(self.game.seq, 1)
+
+        expected = MoveApplied(game_id="test", index=3, row=0, color=ConnectCell.RED, turn=self.game.turn, seq=1)
+        for writer in (self.red_writer, self.yellow_writer):
+            self.assertEqual(writer.packets(), [expected])
+
+    async def test_sync_request(self):
+        """Test that a registered player can ask for the full state after missing a move."""
+        await self.server.handle_move(self.red_writer, self.move(3))
+
+        await self.server.handle_sync_request(self.red_writer, SyncRequest(game_id="test"))
+        await asyncio.sleep(0)
+        packet = self.red_writer.packets()[-1]
+        self.assertIsInstance(packet, SyncGame)
+        self.assertEqual(packet.game.seq, 1)
+
+        stranger = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_sync_request(stranger, SyncRequest(game_id="test"))
+        self.assertIsInstance(stranger.packets()[-1], Error)
+
+    async def test_broadcast_encodes_once(self):
+        with mock.patch.object(JSON_CODEC, "encode", wraps=JSON_CODEC.encode) as encode:
+            await self.server.handle_move(self.red_writer, self.move(3))
+
+        encode.assert_called_once()
+        self.assertEqual(self.red_writer.data, self.yellow_writer.data)
+
+    async def test_sync_cache(self):
+        """Test that sync requests reuse the encoded state until the next move."""
+        request = SyncRequest(game_id="test")
+
+        with mock.patch.object(JSON_CODEC, "encode", wraps=JSON_CODEC.encode) as encode:
+            for _ in range(2):
+                await self.server.handle_sync_request(self.red_writer, request)
+                await asyncio.sleep(0)
+            self.assertEqual(encode.call_count, 1)
+            self.assertEqual(len(self.red_writer.packets()), 2)
+
+            await self.server.handle_move(self.red_writer, self.move(3))
+            await self.server.handle_sync_request(self.red_writer, request)
+            await asyncio.sleep(0)
+            self.assertEqual(encode.call_count, 3)
+
+        self.assertEqual(self.red_writer.packets()[-1].game.board.get_piece(0, 3), ConnectCell.RED)
+
+    async def test_unregistered_move_rejected(self):
+        stranger = FakeWriter(("127.0.0.1", 3))
+        self.assertFalse(await self.server.handle_move(stranger, self.move(3)))
+        self.assertIsInstance(stranger.packets()[-1], Error)
+        self.assertFalse(
+            await self.server.handle_move(self.red_writer, Move(game_id="other", index=3, player=self.game.red_player))
+        )
+        self.assertIsInstance(self.red_writer.packets()[-1], Error)
+        self.assertEqual(self.game.seq, 0)
+
+    async def test_wrong_turn_rejected(self):
+        self.assertFalse(await self.server.handle_move(self.yellow_writer, self.move(3)))
+        self.assertEqual(self.game.turn, self.game.red_player.id)
+        self.assertIsInstance(self.yellow_writer.packets()[-1], Error)
+
+    async def test_off_board_column_rejected(self):
+        """Test that a column off the board is an error and doesn't flip the turn."""
+        for index in (-1, 7):
+            self.assertFalse(await self.server.handle_move(self.red_writer, self.move(index)))
+
+        self.assertEqual(self.game.turn, self.game.red_player.id)
+        self.assertEqual(self.game.board.moves, 0)
+        self.assertTrue(all(isinstance(packet, Error) for packet in self.red_writer.packets()))
+        self.assertEqual(self.yellow_writer.data, b"")
+
+    async def test_full_column_rejected(self):
+        """Test that a move into a full column is an error and doesn't flip the turn."""
+        for row in range(self.game.board.rows):
+            self.game.board.set_piece(row, 0, ConnectCell.YELLOW if row % 2 else ConnectCell.RED)
+
+        self.assertFalse(await self.server.handle_move(self.red_writer, self.move(0)))
+        self.assertEqual(self.game.turn, self.game.red_player.id)
+        self.assertIsInstance(self.red_writer.packets()[-1], Error)
+        self.assertEqual(self.yellow_writer.data, b"")
+
+    async def test_draw_broadcasts_game_over(self):
+        """Test that filling the last cell without a line ends the game with no winner."""
+        self.game.board = ConnectFour(rows=2, cols=2)
+        self.game.board.set_piece(0, 0, ConnectCell.RED)
+        self.game.board.set_piece(1, 0, ConnectCell.YELLOW)
+        self.game.board.set_piece(0, 1, ConnectCell.YELLOW)
+
+        self.assertTrue(await self.server.handle_move(self.red_writer, self.move(1)))
+
+        for writer in (self.red_writer, self.yellow_writer):
+            packet = writer.packets()[-1]
+            self.assertIsInstance(packet, GameOver)
+            self.assertIsNone(packet.winner)
+
+
+class StalledWriter(FakeWriter):
+    """Spectator that never reads, so every drain blocks."""
+
+    async def drain(self):
+        await asyncio.Event().wait()
+
+
+class TestSpectate(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ConnectFourServer(spectator_queue=4)
+        self.red_writer = FakeWriter(("127.0.0.1", 1))
+        self.yellow_writer = FakeWriter(("127.0.0.1", 2))
+        for writer, name in ((self.red_writer, "red"), (self.yellow_writer, "yellow")):
+            await self.server.handle_connect_request(writer, ConnectRequest(game_id="test", username=name))
+        self.game = self.server.games["test"]
+
+    async def play(self, moves: list[int]):
+        for index in moves:
+            writer = self.red_writer if self.game.turn == self.game.red_player.id else self.yellow_writer
+            player = self.game.red_player if writer is self.red_writer else self.game.yellow_player
+            await self.server.handle_move(writer, Move(game_id="test", index=index, player=player))
+
+    async def test_spectator_receives_moves(self):
+        writer = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_spectate(writer, Spectate(game_id="test"))
+        await self.play([3, 4])
+        await asyncio.sleep(0)
+
+        packets = writer.packets()
+        self.assertIsInstance(packets[0], SpectateResponse)
+        self.assertEqual([packet.seq for packet in packets[1:]], [1, 2])
+        self.assertEqual(packets[-1], self.red_writer.packets()[-1])
+
+    async def test_stalled_spectator_is_coalesced(self):
+        """Test that a spectator that stops reading doesn't block moves or buffer every packet."""
+        writer = StalledWriter(("127.0.0.1", 3))
+        await self.server.handle_spectate(writer, Spectate(game_id="test"))
+        await asyncio.sleep(0)
+
+        await asyncio.wait_for(self.play([0, 1, 2, 3, 4, 5, 6, 0, 1, 2, 3, 4]), 1)
+        outbox = self.server.outboxes[writer]
+        self.assertLessEqual(len(outbox.queue), 4)
+        self.assertGreater(outbox.coalesced, 0)
+
+        self.server.stop_spectating(writer)
+        self.assertNotIn("test", self.server.spectators)
+
+    async def test_spectate_missing_game(self):
+        writer = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_spectate(writer, Spectate(game_id="missing"))
+        self.assertIsInstance(writer.packets()[-1], Error)
+
+    async def test_spectators_closed_with_game(self):
+        writer = FakeWriter(("127.0.0.1", 3))
+        writer.closed = False
+        writer.close = lambda: setattr(writer, "closed", True)
+        await self.server.handle_spectate(writer, Spectate(game_id="test"))
+
+        await self.server.remove_game("test")
+        await asyncio.sleep(0)
+        self.assertIsInstance(writer.packets()[-1], ConnectionLost)
+        self.assertTrue(writer.closed)
+
+
+class TestEncoding(unittest.IsolatedAsyncioTestCase):
+    async def test_binary_negotiated(self):
+        """Test that the ConnectResponse is JSON and everything after it uses the binary codec."""
+        server = ConnectFourServer()
+        red_writer = FakeWriter(("127.0.0.1", 1))
+        yellow_writer = FakeWriter(("127.0.0.1", 2))
+
+        await server.handle_connect_request(red_writer, ConnectRequest(game_id="test", username="red"))
+        request = ConnectRequest(game_id="test", username="yellow", encoding=Encoding.BINARY)
+        await server.handle_connect_request(yellow_writer, request)
+
+        self.assertIsInstance(red_writer.packets()[-1], SyncGame)
+
+        line, data = yellow_writer.data.split(b"\n", 1)
+        self.assertEqual(Packet.from_json(line).encoding, Encoding.BINARY)
+
+        packets = []
+        while data:
+            (length,) = LENGTH.unpack_from(data)
+            packets.append(BINARY_CODEC.decode(data[LENGTH.size : LENGTH.size + length]))
+            data = data[LENGTH.size + length :]
+
+        self.assertIsInstance(packets[0], FoundGame)
+        self.assertIsInstance(packets[1], SyncGame)
+        self.assertEqual(packets[1].game.turn, server.games["test"].turn)
+
+
+class TestBotGame(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SearchPool(workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    async def asyncSetUp(self):
+        self.server = ConnectFourServer(self.pool, bot_time=0.2)
+        self.writer = FakeWriter(("127.0.0.1", 1))
+        await self.server.handle_connect_request(self.writer, ConnectRequest(game_id="bot", username="human", bot=True))
+        self.game = self.server.games["bot"]
+
+    async def test_bot_replies_to_moves(self):
+        packets = self.writer.packets()
+        self.assertIsInstance(packets[0], ConnectResponse)
+        self.assertIsInstance(packets[1], FoundGame)
+        self.assertEqual(self.game.yellow_player.name, "Bot")
+
+        if self.game.turn == self.game.red_player.id:
+            await self.server.handle_move(self.writer, Move(game_id="bot", index=3, player=self.game.red_player))
+
+        await asyncio.wait_for(self.server.bot_tasks["bot"], 30)
+        self.assertEqual(self.game.turn, self.game.red_player.id)
+        self.assertIsInstance(self.writer.packets()[-1], MoveApplied)
+
+    async def test_remove_game_cancels_search(self):
+        if started := self.server.bot_tasks.pop("bot", None):
+            started.cancel()
+
+        self.game.turn = self.game.yellow_player.id
+        self.server.bot_time = 60
+        self.server.schedule_bot_move(self.game)
+        task = self.server.bot_tasks["bot"]
+
+        await self.server.remove_game("bot")
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertNotIn("bot", self.server.games)
+        self.assertIsInstance(self.writer.packets()[-1], ConnectionLost)
+
+    async def test_search_failure_falls_back(self):
+        """Test that the bot still moves when the pool fails, since nothing times out a bot's turn."""
+        if started := self.server.bot_tasks.pop("bot", None):
+            started.cancel()
+
+        self.game.turn = self.game.yellow_player.id
+        with mock.patch.object(self.pool, "search", side_effect=RuntimeError("Too many searches running at once")):
+            self.server.schedule_bot_move(self.game)
+            await self.server.bot_tasks["bot"]
+
+        self.assertNotIn("bot", self.server.bot_tasks)
+        self.assertEqual(self.game.turn, self.game.red_player.id)
+        self.assertIsInstance(self.writer.packets()[-1], MoveApplied)
+
+    async def test_bots_disabled(self):
+        server = ConnectFourServer()
+        await server.handle_connect_request(self.writer, ConnectRequest(game_id="other", username="human", bot=True))
+        self.assertIsInstance(self.writer.packets()[-1], Error)
+
+
+class TestMatchmaking(unittest.IsolatedAsyncioTestCase):
+    async def test_players_paired(self):
+        server = ConnectFourServer()
+        red_writer = FakeWriter(("127.0.0.1", 1))
+        yellow_writer = FakeWriter(("127.0.0.1", 2))
+
+        await server.handle_matchmake(red_writer, Matchmake(username="red"))
+        self.assertEqual(red_writer.data, b"")
+        await server.handle_matchmake(red_writer, Matchmake(username="red"))
+        self.assertIsInstance(red_writer.packets()[-1], Error)
+
+        await server.handle_matchmake(yellow_writer, Matchmake(username="yellow"))
+        (game,) = server.games.values()
+        self.assertEqual(game.red_player.name, "red")
+        self.assertEqual(game.yellow_player.name, "yellow")
+        self.assertEqual(server.registry.game_of(red_writer.addr), game)
+        self.assertEqual(server.registry.game_of(yellow_writer.addr), game)
+        self.assertEqual(len(server.matchmaker), 0)
+
+        packets = yellow_writer.packets()
+        self.assertIsInstance(packets[0], ConnectResponse)
+        self.assertIsInstance(packets[1], FoundGame)
+        self.assertIsInstance(red_writer.packets()[-1], SyncGame)
+
+    async def test_queued_player_switches_encoding(self):
+        """Test that a player paired while its connection is being read sends its moves in the requested encoding."""
+        server = ConnectFourServer()
+        reader = asyncio.StreamReader()
+        reader.feed_data(JSON_CODEC.encode(Matchmake(username="red", encoding=Encoding.BINARY)))
+        red_writer = FakeWriter(("127.0.0.1", 1))
+        task = asyncio.create_task(server.handle_client(reader, red_writer))
+        await asyncio.sleep(0)
+
+        await server.handle_matchmake(FakeWriter(("127.0.0.1", 2)), Matchmake(username="yellow"))
+        (game,) = server.games.values()
+        self.assertEqual(Packet.from_json(red_writer.data.split(b"\n", 1)[0]).encoding, Encoding.BINARY)
+
+        game.turn = game.red_player.id
+        reader.feed_data(BINARY_CODEC.encode(Move(game_id=game.game_id, index=3, player=game.red_player)))
+        await asyncio.sleep(0.01)
+        self.assertEqual(game.seq, 1)
+
+        reader.feed_eof()
+        await task
+
+    async def test_queued_player_cant_join_lobby(self):
+        """Test that a player waiting for a match can't also join or watch a lobby, which would break its pairing."""
+        server = ConnectFourServer()
+        queued, host = FakeWriter(("127.0.0.1", 1)), FakeWriter(("127.0.0.1", 2))
+        await server.handle_connect_request(host, ConnectRequest(game_id="lobby", username="host"))
+        await server.handle_matchmake(queued, Matchmake(username="queued"))
+
+        await server.handle_connect_request(queued, ConnectRequest(game_id="lobby", username="queued"))
+        self.assertIsInstance(queued.packets()[-1], Error)
+        await server.handle_spectate(queued, Spectate(game_id="lobby"))
+        self.assertIsInstance(queued.packets()[-1], Error)
+        self.assertIsNone(server.games["lobby"].yellow_player)
+
+        partner = FakeWriter(("127.0.0.1", 3))
+        await server.handle_matchmake(partner, Matchmake(username="partner"))
+        self.assertIsInstance(partner.packets()[1], FoundGame)
+
+    async def test_failed_pairing_rolls_back(self):
+        server = ConnectFourServer()
+        red, yellow = FakeWriter(("127.0.0.1", 1)), FakeWriter(("127.0.0.1", 2))
+        await server.handle_matchmake(red, Matchmake(username="red"))
+        # Already in a game the queue doesn't know about
+        await server.handle_connect_request(yellow, ConnectRequest(game_id="lobby", username="yellow"))
+        yellow_player = Player(name="yellow", id=uuid.uuid4(), addr=yellow.addr)
+        yellow_player._writer = yellow
+
+        ticket = server.matchmaker.leave(red)
+        await server.pair(ticket.value, (yellow_player, Matchmake(username="yellow")))
+
+        self.assertEqual(list(server.games), ["lobby"])
+        self.assertIsNone(server.registry.session(red.addr))
+        self.assertIsInstance(red.packets()[-1], Error)
+
+    async def test_widened_match(self):
+        server = ConnectFourServer(widen_after=0.01)
+        writers = [FakeWriter(("127.0.0.1", port)) for port in (1, 2)]
+        for bucket, writer in enumerate(writers):
+            await server.handle_matchmake(writer, Matchmake(username="player", bucket=bucket))
+        self.assertEqual(server.games, {})
+
+        task = asyncio.create_task(server.widen_matches())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        self.assertEqual(len(server.games), 1)
+        self.assertIsInstance(writers[0].packets()[-1], SyncGame)
+
+
+class TestRegistryCleanup(unittest.IsolatedAsyncioTestCase):
+    async def connect(self, server: ConnectFourServer, port: int, packets: list[Packet]) -> FakeWriter:
+        """Serve a connection that sends ``packets`` then disconnects."""
+        reader = asyncio.StreamReader()
+        for packet in packets:
+            reader.feed_data(JSON_CODEC.encode(packet))
+        reader.feed_eof()
+
+        writer = FakeWriter(("127.0.0.1", port))
+        await server.handle_client(reader, writer)
+        return writer
+
+    async def test_connections_forgotten(self):
+        """Test that nothing about a connection is kept once it and its game are gone."""
+        server = ConnectFourServer()
+        for port in range(100):
+            await self.connect(server, port, [ConnectRequest(game_id=f"lobby-{port}", username="name")])
+            await self.connect(server, port + 1000, [Matchmake(username="name")])
+        await asyncio.sleep(0)
+
+        self.assertEqual(server.games, {})
+        self.assertEqual(server.registry.sessions, {})
+        self.assertEqual(server.registry.players, {})
+        self.assertEqual(server.outboxes, {})
+        self.assertEqual(len(server.matchmaker), 0)
+
+    async def test_rejected_join_keeps_game(self):
+        """Test that a connection turned away from a full game can't end it by disconnecting."""
+        server = ConnectFourServer()
+        for port, name in ((1, "red"), (2, "yellow")):
+            await server.handle_connect_request(FakeWriter(("127.0.0.1", port)), ConnectRequest(game_id="test", username=name))
+
+        writer = await self.connect(server, 3, [ConnectRequest(game_id="test", username="late")])
+        self.assertIsInstance(writer.packets()[-1], Error)
+        self.assertIn("test", server.games)
+        self.assertEqual(len(server.registry.sessions), 2)
+
+
+class TestResume(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ConnectFourServer(grace=0.05, tick=0.01)
+        self.red_writer = FakeWriter(("127.0.0.1", 1))
+        self.yellow_writer = FakeWriter(("127.0.0.1", 2))
+        await self.server.handle_connect_request(self.red_writer, ConnectRequest(game_id="test", username="red"))
+        await self.server.handle_connect_request(self.yellow_writer, ConnectRequest(game_id="test", username="yellow"))
+        await asyncio.sleep(0)
+
+        self.game = self.server.games["test"]
+        if self.game.turn != self.game.red_player.id:
+            self.red_writer, self.yellow_writer = self.yellow_writer, self.red_writer
+        self.red = self.game.red_player if self.red_writer.addr == self.game.red_player.addr else self.game.yellow_player
+        self.yellow = self.game.yellow_player if self.red is self.game.red_player else self.game.red_player
+        self.token = self.red_writer.packets()[0].resume_token
+
+    async def drop(self, writer: FakeWriter):
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+        await self.server.serve_packets(reader, writer, writer.addr)
+        self.server.registry.leave(writer.addr)
+
+    async def test_missed_moves_sent(self):
+        """Test that a player resuming within the grace period is sent only the moves it missed."""
+        await self.server.handle_move(self.red_writer, Move(game_id="test", index=3, player=self.red))
+        await self.drop(self.red_writer)
+        self.assertIn(self.red.id, self.server.held)
+
+        await self.server.handle_move(self.yellow_writer, Move(game_id="test", index=4, player=self.yellow))
+        writer = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_resume(writer, Resume(game_id="test", token=self.token, seq=1))
+        await asyncio.sleep(0.1)
+
+        response, applied = writer.packets()
+        self.assertIsInstance(response, ResumeResponse)
+        self.assertEqual(response.player.id, self.red.id)
+        self.assertEqual((applied.index, applied.seq), (4, 2))
+        self.assertEqual(self.server.held, {})
+        self.assertIn("test", self.server.games)
+
+        await self.server.handle_move(writer, Move(game_id="test", index=3, player=self.red))
+        self.assertEqual(self.game.seq, 3)
+
+    async def test_resync_without_seq(self):
+        await self.drop(self.red_writer)
+        writer = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_resume(writer, Resume(game_id="test", token=self.token, encoding=Encoding.BINARY))
+        await asyncio.sleep(0)
+
+        response = Packet.from_json(writer.data[: writer.data.index(b"\n")])
+        self.assertIsInstance(response, ResumeResponse)
+        frame = writer.data[writer.data.index(b"\n") + 1 :]
+        self.assertIsInstance(BINARY_CODEC.decode(frame[LENGTH.size :]), SyncGame)
+
+    async def test_grace_expires(self):
+        await self.drop(self.red_writer)
+        await asyncio.sleep(0.1)
+        self.assertNotIn("test", self.server.games)
+        self.assertIsInstance(self.yellow_writer.packets()[-1], ConnectionLost)
+
+    async def test_bad_token_rejected(self):
+        await self.drop(self.red_writer)
+        forged = f"{self.red.id}.{'0' * 64}"
+        for token in (forged, self.token.replace(str(self.red.id), str(self.yellow.id)), "junk"):
+            writer = FakeWriter(("127.0.0.1", 3))
+            await self.server.handle_resume(writer, Resume(game_id="test", token=token))
+            self.assertIsInstance(writer.packets()[-1], Error)
+        self.assertIn(self.red.id, self.server.held)
+
+    async def test_player_ids_alone_rejected(self):
+        """Test that the player ids every SyncGame carries aren't enough to take over a seat."""
+        await self.drop(self.red_writer)
+        writer = FakeWriter(("127.0.0.1", 3))
+        request = JSON_CODEC.encode(ConnectRequest(game_id="test", username="thief"))
+        request = request.replace(b'"username"', f'"player_id": "{self.red.id}", "username"'.encode())
+        await self.server.handle_connect_request(writer, Packet.from_json(request))
+        self.assertIsInstance(writer.packets()[-1], Error)
+
+        # Nor is a valid token once the seat is neither held nor connected
+        self.server.held.pop(self.red.id).cancel()
+        await self.server.handle_resume(writer, Resume(game_id="test", token=self.token))
+        self.assertIsInstance(writer.packets()[-1], Error)
+        self.assertEqual(self.red.addr, self.red_writer.addr)
+
+    async def test_takes_over_live_connection(self):
+        """Test that a resume replaces a connection the server hasn't noticed dropping yet."""
+        writer = FakeWriter(("127.0.0.1", 3))
+        await self.server.handle_resume(writer, Resume(game_id="test", token=self.token, seq=0))
+        self.assertNotIn(self.red_writer.addr, self.server.registry.sessions)
+        self.assertEqual(self.server.registry.players[self.red.id].writer, writer)
+
+        await self.server.handle_move(self.yellow_writer, Move(game_id="test", index=3, player=self.yellow))
+        await self.server.handle_move(writer, Move(game_id="test", index=3, player=self.red))
+        self.assertEqual(self.game.seq, 1)
+
+
+class TestTimeouts(unittest.IsolatedAsyncioTestCase):
+    async def start(self, server: ConnectFourServer) -> tuple[FakeWriter, FakeWriter]:
+        writers = FakeWriter(("127.0.0.1", 1)), FakeWriter(("127.0.0.1", 2))
+        for writer, name in zip(writers, ("red", "yellow")):
+            await server.handle_connect_request(writer, ConnectRequest(game_id="test", username=name))
+        return writers
+
+    async def test_turn_forfeited(self):
+        server = ConnectFourServer(turn_timeout=0.05, tick=0.01)
+        writers = await self.start(server)
+        game = server.games["test"]
+        mover = game.red_player if game.turn == game.red_player.id else game.yellow_player
+        await server.handle_move(mover._writer, Move(game_id="test", index=3, player=mover))
+
+        # The move restarted the clock, the opponent runs out of time now
+        await asyncio.sleep(0.03)
+        self.assertIn("test", server.games)
+        await asyncio.sleep(0.1)
+        self.assertNotIn("test", server.games)
+        for writer in writers:
+            game_over = next(packet for packet in writer.packets() if isinstance(packet, GameOver))
+            self.assertEqual(game_over.winner.id, mover.id)
+
+    async def test_lobby_expires(self):
+        server = ConnectFourServer(lobby_timeout=0.05, tick=0.01)
+        await server.handle_connect_request(FakeWriter(("127.0.0.1", 3)), ConnectRequest(game_id="empty", username="red"))
+        await self.start(server)
+        await asyncio.sleep(0.1)
+        self.assertNotIn("empty", server.games)
+        # Started games are timed by their turns instead
+        self.assertIn("test", server.games)
+        self.assertEqual(len(server.timers), 1)
+
+    async def test_idle_connection_closed(self):
+        """Test that a silent connection is pinged, kept while it answers and closed once it stops."""
+        server = ConnectFourServer(idle_timeout=0.15, ping_interval=0.05, tick=0.01)
+        listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        try:
+            for _ in range(4):
+                packet = Packet.from_json(await asyncio.wait_for(reader.readline(), 1))
+                self.assertIsInstance(packet, Ping)
+                writer.write(Pong().to_json().encode() + b"\n")
+
+            # Pinged until the timeout, then the connection is closed
+            rest = await asyncio.wait_for(reader.read(), 1)
+            self.assertTrue(all(isinstance(Packet.from_json(line), Ping) for line in rest.splitlines()))
+        finally:
+            writer.close()
+            listener.close()
@@ -0,0 +1,130 @@
+import asyncio
+import socket
+import ssl
+import tempfile
+import unittest
+from pathlib import Path
+
+from lib.packets import ConnectRequest, ConnectResponse, Matchmake, Packet, Resume
+from lib.sharding import MATCHMAKING_KEY, MAX_FIRST_PACKET, HashRing, ShardRouter
+from lib.tls import client_context, server_context
+from server import ConnectFourServer
+
+CERTS = Path(__file__).parents[2] / "certs"
+
+
+class TestHashRing(unittest.TestCase):
+    def test_deterministic(self):
+        self.assertEqual(
+            [HashRing(4).node(f"game-{i}") for i in range(100)],
+            [HashRing(4).node(f"game-{i}") for i in range(100)],
+        )
+
+    def test_balanced(self):
+        counts = [0] * 4
+        ring = HashRing(4)
+        for i in range(10_000):
+            counts[ring.node(f"game-{i}")] += 1
+
+        for count in counts:
+            self.assertGreater(count, 1500)
+            self.assertLess(count, 3500)
+
+    def test_growing_only_moves_keys_to_new_node(self):
+        """Test that adding a shard only moves the games it takes over."""
+        before, after = HashRing(4), HashRing(5)
+        moved = 0
+        for i in range(10_000):
+            key = f"game-{i}"
+            if before.node(key) != after.node(key):
+                self.assertEqual(after.node(key), 4)
+                moved += 1
+
+        self.assertLess(moved, 3500)
+
+    def test_needs_a_node(self):
+        with self.assertRaises(ValueError):
+            HashRing(0)
+
+
+class TestShardOf(unittest.TestCase):
+    def test_matched_games_routed_to_matchmaker(self):
+        """Test that resuming a matched game reaches the shard that paired it."""
+        runtime_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(runtime_dir.cleanup)
+        router = ShardRouter(0, 8, Path(runtime_dir.name))
+        self.addCleanup(router.close)
+        matchmaker = router.ring.node(MATCHMAKING_KEY)
+        self.assertEqual(router.shard_of(Matchmake(username="name").to_json().encode()), matchmaker)
+        for i in range(20):
+            resume = Resume(game_id=f"match-{i}", token="token")
+            self.assertEqual(router.shard_of(resume.to_json().encode()), matchmaker)
+
+
+class TestShardRouter(unittest.IsolatedAsyncioTestCase):
+    SHARDS = 2
+
+    def ssl_contexts(self) -> tuple[ssl.SSLContext | None, ssl.SSLContext | None]:
+        return None, None
+
+    async def asyncSetUp(self):
+        probe = socket.create_server(("127.0.0.1", 0), reuse_port=True)
+        self.port = probe.getsockname()[1]
+        probe.close()
+
+        self.runtime_dir = tempfile.TemporaryDirectory()
+        server_context, self.client_context = self.ssl_contexts()
+
+        self.servers = [ConnectFourServer() for _ in range(self.SHARDS)]
+        self.tasks = []
+        for index, server in enumerate(self.servers):
+            router = ShardRouter(index, self.SHARDS, Path(self.runtime_dir.name), first_packet_timeout=0.5)
+            serve = router.serve(server.handle_client, "127.0.0.1", self.port, server_context)
+            self.tasks.append(asyncio.create_task(serve))
+        await asyncio.sleep(0.2)
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.runtime_dir.cleanup()
+
+    async def connect(self, game_id: str) -> tuple[ConnectResponse, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port, ssl=self.client_context)
+        writer.write(ConnectRequest(game_id=game_id, username="player").to_json().encode() + b"\n")
+        return Packet.from_json(await asyncio.wait_for(reader.readline(), 5)), writer
+
+    async def test_games_land_on_their_shard(self):
+        ring = HashRing(self.SHARDS)
+        writers = []
+        for i in range(20):
+            game_id = f"game-{i}"
+            response, writer = await self.connect(game_id)
+            writers.append(writer)
+            self.assertIsInstance(response, ConnectResponse)
+
+            owner = self.servers[ring.node(game_id)]
+            self.assertIn(game_id, owner.games)
+            # The player's address is the client's even when the connection was proxied
+            self.assertEqual(owner.games[game_id].red_player.addr, writer.get_extra_info("sockname"))
+
+        self.assertTrue(all(server.games for server in self.servers))
+        for writer in writers:
+            writer.close()
+
+    async def test_first_packet_timeout(self):
+        """Test that connections sending nothing, or never finishing their first line, are closed before routing."""
+        for first in (b"", b'{"packet_type": 1, "game_id": "slow"', b"x" * (MAX_FIRST_PACKET + 1)):
+            with self.subTest(first=first):
+                reader, writer = await asyncio.open_connection("127.0.0.1", self.port, ssl=self.client_context)
+                writer.write(first)
+                try:
+                    self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+                except (ConnectionError, ssl.SSLError):
+                    pass
+                writer.close()
+
+
+class TestShardRouterTLS(TestShardRouter):
+    def ssl_contexts(self):
+        return server_context(CERTS / "fullchain.pem", CERTS / "privkey.pem"), client_context(CERTS / "fullchain.pem")
@@ -0,0 +1,131 @@
+import time
+import unittest
+from unittest import mock
+
+from lib.connect_four import ConnectCell, ConnectFour
+from lib.solver import HEURISTIC, LOWER, Solver, TranspositionTable, best_move, score, side_to_move
+
+
+def play(moves: str, rows: int = 6, cols: int = 7) -> ConnectFour:
+    """Build a board from a string of 1-indexed columns, red moving first."""
+    board = ConnectFour(rows=rows, cols=cols)
+    for i, col in enumerate(moves):
+        board.drop_piece(int(col) - 1, ConnectCell.RED if i % 2 == 0 else ConnectCell.YELLOW)
+    return board
+
+
+class TestSolver(unittest.TestCase):
+    def setUp(self):
+        self.solver = Solver(table_size=100_003)
+
+    def test_known_scores(self):
+        """Test endgame positions with published perfect play scores."""
+        positions = {
+            "2252576253462244111563365343671351441": -1,
+            "7422341735647741166133573473242566": 1,
+            "23163416124767223154467471272416755633": 0,
+            "65214673556155731566316327373221417": -1,
+        }
+        for moves, expected in positions.items():
+            with self.subTest(moves=moves):
+                self.assertEqual(self.solver.score(play(moves)), expected)
+
+    def test_side_to_move(self):
+        self.assertEqual(side_to_move(play("")), ConnectCell.RED)
+        self.assertEqual(side_to_move(play("4")), ConnectCell.YELLOW)
+
+    def test_immediate_win(self):
+        """Test that an open three is completed straight away."""
+        board = play("112233")
+        result = self.solver.search(board, ConnectCell.RED)
+        self.assertEqual(result.column, 3)
+        self.assertTrue(result.solved)
+        self.assertEqual(score(board), 18)
+
+    def test_blocks_threat(self):
+        """Test that the only non-losing move is played when the opponent threatens to win."""
+        board = play("12131")
+        self.assertEqual(best_move(board, ConnectCell.YELLOW), 0)
+
+    def test_time_budget(self):
+        """Test that a search of the empty board stops close to its budget with a heuristic answer."""
+        start = time.monotonic()
+        result = self.solver.search(play(""), ConnectCell.RED, time_budget=0.2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(result.solved)
+        self.assertIn(result.column, range(7))
+
+    def test_forced_move_is_scored(self):
+        """Test that a forced move still gets a real score instead of a placeholder."""
+        # Red threatens to win in column 1 and yellow can only block
+        board = play("12131")
+        result = self.solver.search(board, ConnectCell.YELLOW, time_budget=0.5)
+        self.assertEqual(result.column, 0)
+        self.assertGreater(result.depth, 0)
+
+    def test_timeout_fallback_avoids_losing_moves(self):
+        """Test that running out of time before one ply never plays under an opponent's winning cell."""
+        board = ConnectFour()
+        for col, color in enumerate([ConnectCell.YELLOW, ConnectCell.RED, ConnectCell.YELLOW]):
+            board.set_piece(0, col, color)
+            board.set_piece(1, col, ConnectCell.RED)
+
+        # Center first ordering would pick column 3, letting red complete row 1 on top of it
+        with mock.patch("lib.solver.CHECK_INTERVAL", 1):
+            result = self.solver.search(board, ConnectCell.YELLOW, time_budget=0)
+
+        self.assertEqual(result.depth, 0)
+        self.assertNotEqual(result.column, 3)
+
+    def test_stale_estimates(self):
+        """Test that estimates left in the table by a shallower search never pass for a solved result."""
+        self.solver.search(play(""), ConnectCell.RED, max_depth=4)
+        result = self.solver.search(play("4"), ConnectCell.YELLOW, time_budget=0.5)
+        self.assertFalse(result.solved)
+
+        # Proven results carry over instead
+        board = play("2252576253462244111")
+        self.assertEqual(self.solver.score(board), 2)
+        result = self.solver.search(board, ConnectCell.YELLOW)
+        self.assertTrue(result.solved)
+        self.assertEqual(result.score, 2)
+
+    def test_small_board(self):
+        """Test that boards of other sizes are searched with their own solver."""
+        board = play("", rows=4, cols=5)
+        self.assertEqual(score(board), 0)
+
+    def test_wrong_board_size(self):
+        with self.assertRaises(ValueError):
+            self.solver.score(play("", rows=5, cols=5))
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_replacement_policy(self):
+        table = TranspositionTable(size=7)
+        table.put(3, 10, depth=5, flag=0)
+        self.assertEqual(table.get(3), (10, 5, 0))
+
+        # Shallower entry colliding in the same search is rejected
+        table.put(10, 20, depth=2, flag=0)
+        self.assertEqual(table.get(3), (10, 5, 0))
+        self.assertIsNone(table.get(10))
+
+        # Same key is always refreshed
+        table.put(3, 11, depth=1, flag=1)
+        self.assertEqual(table.get(3), (11, 1, 1))
+
+        # Entries from earlier searches give way
+        table.put(3, 12, depth=9, flag=0)
+        table.new_search()
+        table.put(10, 20, depth=1, flag=0)
+        self.assertIsNone(table.get(3))
+        self.assertEqual(table.get(10), (20, 1, 0))
+
+        # Estimates only last for the search that made them, proven bounds stay
+        table.put(10, 21, depth=1, flag=HEURISTIC | LOWER)
+        table.put(5, 30, depth=1, flag=LOWER)
+        self.assertEqual(table.get(10), (21, 1, HEURISTIC | LOWER))
+        table.new_search()
+        self.assertIsNone(table.get(10))
+        self.assertEqual(table.get(5), (30, 1, LOWER))
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+
+from lib.timers import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_fires_on_its_tick(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+        for delay in (0.5, 1, 2.5, 20):
+            wheel.schedule(delay, fired.append, delay)
+        self.assertEqual(len(wheel), 4)
+
+        # Deadlines round up to whole ticks, 20 is more than two revolutions out
+        ticks = {}
+        for tick in range(1, 25):
+            wheel.advance()
+            for delay in fired:
+                ticks.setdefault(delay, tick)
+        self.assertEqual(ticks, {0.5: 1, 1: 1, 2.5: 3, 20: 20})
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+        timer = wheel.schedule(3, fired.append, "cancelled")
+        wheel.schedule(3, fired.append, "kept")
+        timer.cancel()
+        timer.cancel()
+        self.assertFalse(timer.active)
+
+        for _ in range(3):
+            wheel.advance()
+        self.assertEqual(fired, ["kept"])
+
+    def test_failing_callback(self):
+        """Test that a callback raising doesn't stop the others in its slot."""
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+        wheel.schedule(1, lambda: 1 / 0)
+        wheel.schedule(1, fired.append, "after")
+        wheel.advance()
+        self.assertEqual(fired, ["after"])
+
+
+class TestTimerWheelLoop(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_coroutines(self):
+        wheel = TimerWheel(tick=0.01)
+        fired = asyncio.Event()
+
+        async def callback():
+            fired.set()
+
+        wheel.schedule(0.02, callback)
+        await asyncio.wait_for(fired.wait(), 1)
+        wheel.close()
+
+    async def test_catches_up(self):
+        """Test that ticks missed while the loop was blocked are all run."""
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+        for delay in (0.01, 0.03, 0.05):
+            wheel.schedule(delay, fired.append, delay)
+        await asyncio.sleep(0)
+        # Blocks the loop for several ticks
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 0.06
+        while loop.time() < deadline:
+            pass
+        await asyncio.sleep(0.02)
+        self.assertEqual(fired, [0.01, 0.03, 0.05])
+        wheel.close()
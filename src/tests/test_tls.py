@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from lib.metrics import Metrics
+from lib.tls import HandshakeMetrics, ResumingContext, client_context, server_context
+from tests.test_sharding import CERTS
+
+
+class TestResumption(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.metrics = Metrics()
+        context = server_context(CERTS / "fullchain.pem", CERTS / "privkey.pem")
+        self.handshakes = HandshakeMetrics(self.metrics, context)
+
+        async def accepted(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            self.handshakes.accepted(writer)
+            writer.write(b"hello\n")
+            await reader.read()
+            writer.close()
+
+        self.server = await asyncio.start_server(accepted, "127.0.0.1", 0, ssl=context)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+
+    async def connect(self, context: ResumingContext) -> bool:
+        """Connect, read the greeting and hang up, returns whether the session was resumed."""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port, ssl=context)
+        ssl_object = writer.get_extra_info("ssl_object")
+        # Tickets are sent after the handshake, reading makes sure it arrived
+        await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+        context.remember(ssl_object)
+        return ssl_object.session_reused
+
+    async def test_resumes(self):
+        context = client_context(CERTS / "fullchain.pem")
+        self.assertEqual([await self.connect(context) for _ in range(3)], [False, True, True])
+        await asyncio.sleep(0)
+
+        lines = self.metrics.render().splitlines()
+        self.assertIn('connectfour_tls_handshakes_total{resumed="false"} 1', lines)
+        self.assertIn('connectfour_tls_handshakes_total{resumed="true"} 2', lines)
+        self.assertIn("connectfour_tls_resumed_handshake_seconds_count 2", lines)
+        self.assertEqual(len(self.handshakes.started), 0)
+
+    async def test_no_resume(self):
+        context = client_context(CERTS / "fullchain.pem", resume=False)
+        self.assertNotIsInstance(context, ResumingContext)
+        for _ in range(2):
+            _, writer = await asyncio.open_connection("127.0.0.1", self.port, ssl=context)
+            self.assertFalse(writer.get_extra_info("ssl_object").session_reused)
+            writer.close()
+            await writer.wait_closed()